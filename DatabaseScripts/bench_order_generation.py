@@ -0,0 +1,70 @@
+# benchmark: original per-order loop vs. batched NumPy order generator in csvPopulator.py
+# both sides produce full orders.csv / joint_order_items.csv rows in memory (no disk I/O)
+#
+# The engines don't draw the same order mix: the NumPy one follows demand_model.py (more drinks per
+# order, add-ons as their own lines), the loop keeps the original 1-3 drinks. So they are compared
+# on rows written (orders + order items) per second, not on orders per second.
+
+import argparse
+import random
+import time
+
+import csvPopulator as gen
+
+
+def bench(label, fn, num_orders):
+    """Run fn, print its throughput and return its rows (orders + order items) per second."""
+    t0 = time.perf_counter()
+    orders, items = fn()
+    elapsed = time.perf_counter() - t0
+    rows = num_orders + len(items)
+    print(f"{label:<8} {num_orders:>12,} orders {len(items):>12,} items "
+          f"{elapsed:>8.2f}s {num_orders / elapsed:>14,.0f} orders/sec {rows / elapsed:>14,.0f} rows/sec")
+    return rows / elapsed
+
+
+def run_numpy_arrays(start_date, end_date, peaks, menu_item_id_map, num_orders, chunk_size, seed):
+    # generation only, rows stay as NumPy arrays
+    chunks = list(gen.generate_order_chunks(start_date, end_date, peaks, menu_item_id_map,
+                                            num_orders, chunk_size, seed))
+    return chunks, range(sum(len(c.item_menu_ids) for c in chunks))
+
+
+def run_numpy(start_date, end_date, peaks, menu_item_id_map, num_orders, chunk_size, seed):
+    orders = []
+    items = []
+    for chunk in gen.generate_order_chunks(start_date, end_date, peaks, menu_item_id_map,
+                                           num_orders, chunk_size, seed):
+        order_rows, item_rows = gen.order_chunk_rows(chunk)
+        orders.extend(order_rows)
+        items.extend(item_rows)
+    return orders, items
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare order generation throughput.")
+    parser.add_argument("--orders", type=int, nargs="+", default=[20_000, 200_000, 1_000_000])
+    parser.add_argument("--chunk-size", type=int, default=gen.CHUNK_SIZE)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-loop-above", type=int, default=1_000_000,
+                        help="don't run the slow loop for sizes above this")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    *_, menu_item_id_map = gen.generate_static_tables()
+    start_date, end_date = gen.date_window()
+    peaks = gen.pick_peaks(start_date, end_date)
+
+    for n in args.orders:
+        bench("arrays", lambda: run_numpy_arrays(start_date, end_date, peaks, menu_item_id_map,
+                                                 n, args.chunk_size, args.seed), n)
+        numpy_rate = bench("numpy", lambda: run_numpy(start_date, end_date, peaks, menu_item_id_map,
+                                                      n, args.chunk_size, args.seed), n)
+        if n <= args.skip_loop_above:
+            loop_rate = bench("loop", lambda: gen.generate_orders_loop(start_date, end_date, peaks,
+                                                                       menu_item_id_map, n), n)
+            print(f"speedup  {numpy_rate / loop_rate:.1f}x rows/sec\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+# benchmark harness for the verification, required and special queries in required_queries.py
+#
+#   python benchmark_queries.py [connection flags] run --repeat 20 --output before
+#   python benchmark_queries.py compare before.json after.json
+
+import argparse
+import json
+import math
+import statistics
+import sys
+import time
+
+import psycopg2
+
+import database
+from required_queries import QUERY_GROUPS, add_query_args, check_rollup_range, query_overrides, query_params
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def plan_node_types(plan):
+    """All node types in an EXPLAIN (FORMAT JSON) plan tree, depth first."""
+    types = [plan["Node Type"]]
+    for child in plan.get("Plans", []):
+        types.extend(plan_node_types(child))
+    return types
+
+
+def explain(cur, query, overrides):
+    database.execute_query(cur, query, overrides, prefix="EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ")
+    result = cur.fetchone()[0][0]
+    plan = result["Plan"]
+    return {
+        "planning_ms": result.get("Planning Time"),
+        "execution_ms": result.get("Execution Time"),
+        "shared_hit_blocks": plan.get("Shared Hit Blocks"),
+        "shared_read_blocks": plan.get("Shared Read Blocks"),
+        "node_types": plan_node_types(plan),
+        "plan": result,
+    }
+
+
+def benchmark_query(conn, query, warmup, repeat, overrides=None):
+    """Run the prepared query warmup + repeat times, then capture its EXPLAIN ANALYZE plan."""
+    cur = conn.cursor()
+    for _ in range(warmup):
+        database.execute_query(cur, query, overrides)
+        cur.fetchall()
+
+    timings = []
+    rows = 0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        database.execute_query(cur, query, overrides)
+        rows = len(cur.fetchall())
+        timings.append((time.perf_counter() - t0) * 1000)
+
+    result = {
+        "rows": rows,
+        "p50_ms": percentile(timings, 50),
+        "p95_ms": percentile(timings, 95),
+        "max_ms": max(timings),
+        "mean_ms": statistics.fmean(timings),
+        "timings_ms": timings,
+    }
+    result.update(explain(cur, query, overrides))
+    cur.close()
+    return result
+
+
+def run_benchmark(conn, warmup, repeat, overrides=None):
+    results = []
+    for group, queries in QUERY_GROUPS:
+        for query in queries:
+            params = {name: str(value) for name, value in query_params(query, overrides).items()}
+            entry = {"group": group, "name": query.name, "sql": query.sql, "params": params}
+            try:
+                entry.update(benchmark_query(conn, query, warmup, repeat, overrides))
+                print(f"{entry['p50_ms']:>10.2f} ms p50 {entry['p95_ms']:>10.2f} ms p95  {query.name}")
+            except psycopg2.Error as e:
+                conn.rollback()
+                entry["error"] = str(e).strip()
+                print(f"{'ERROR':>28}  {query.name}: {entry['error']}")
+            results.append(entry)
+    return results
+
+
+# ----------------------------
+# Reports
+# ----------------------------
+def markdown_report(report):
+    lines = [
+        f"# Query benchmark ({report['created']}, {report['repeat']} runs after {report['warmup']} warmup)",
+        "",
+        "| group | query | p50 ms | p95 ms | max ms | rows | plan nodes |",
+        "|---|---|---:|---:|---:|---:|---|",
+    ]
+    for q in report["queries"]:
+        if "error" in q:
+            lines.append(f"| {q['group']} | {q['name']} | | | | | ERROR: {q['error']} |")
+            continue
+        nodes = ", ".join(dict.fromkeys(q["node_types"]))
+        lines.append(f"| {q['group']} | {q['name']} | {q['p50_ms']:.2f} | {q['p95_ms']:.2f} "
+                     f"| {q['max_ms']:.2f} | {q['rows']} | {nodes} |")
+    return "\n".join(lines) + "\n"
+
+
+def write_report(report, output):
+    with open(output + ".json", "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    with open(output + ".md", "w", encoding="utf-8") as f:
+        f.write(markdown_report(report))
+    print(f"Report written to {output}.json and {output}.md")
+
+
+def compare_reports(before, after, threshold):
+    """Markdown table of p50/p95 changes per query, plus the names of regressed queries."""
+    old = {q["name"]: q for q in before["queries"] if "error" not in q}
+    lines = [
+        "| query | p50 before | p50 after | change | p95 before | p95 after | change | plan changed |",
+        "|---|---:|---:|---:|---:|---:|---:|---|",
+    ]
+    regressions = []
+    for q in after["queries"]:
+        prev = old.get(q["name"])
+        if prev is None or "error" in q:
+            continue
+        p50_change = q["p50_ms"] / prev["p50_ms"] - 1 if prev["p50_ms"] else 0.0
+        p95_change = q["p95_ms"] / prev["p95_ms"] - 1 if prev["p95_ms"] else 0.0
+        plan_changed = "yes" if q["node_types"] != prev["node_types"] else ""
+        flag = ""
+        if p50_change > threshold:
+            regressions.append(q["name"])
+            flag = " ⚠"
+        lines.append(f"| {q['name']}{flag} | {prev['p50_ms']:.2f} | {q['p50_ms']:.2f} | {p50_change:+.0%} "
+                     f"| {prev['p95_ms']:.2f} | {q['p95_ms']:.2f} | {p95_change:+.0%} | {plan_changed} |")
+    return "\n".join(lines) + "\n", regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the queries in required_queries.py.")
+    database.add_connection_args(parser)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run_parser = subparsers.add_parser("run", help="run every query and write a JSON + Markdown report")
+    run_parser.add_argument("--warmup", type=int, default=2)
+    run_parser.add_argument("--repeat", type=int, default=10)
+    run_parser.add_argument("--output", default="query_benchmark", help="report path without extension")
+    add_query_args(run_parser)
+    compare_parser = subparsers.add_parser("compare", help="compare two JSON reports")
+    compare_parser.add_argument("before")
+    compare_parser.add_argument("after")
+    compare_parser.add_argument("--threshold", type=float, default=0.10,
+                                help="p50 slowdown (fraction) counted as a regression")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        with open(args.before, encoding="utf-8") as f:
+            before = json.load(f)
+        with open(args.after, encoding="utf-8") as f:
+            after = json.load(f)
+        table, regressions = compare_reports(before, after, args.threshold)
+        print(table)
+        if regressions:
+            print(f"{len(regressions)} regressed above {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+        return
+
+    check_rollup_range(run_parser, args)
+    conn = database.connect(args)
+    conn.set_session(readonly=True, autocommit=True)
+    report = {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "warmup": args.warmup,
+        "repeat": args.repeat,
+        "queries": run_benchmark(conn, args.warmup, args.repeat, query_overrides(args)),
+    }
+    conn.close()
+    write_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
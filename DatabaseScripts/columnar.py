@@ -0,0 +1,277 @@
+# typed columnar copy of the csvPopulator.py output: one raw little-endian NumPy file per table
+# column plus manifest.json. Columns open memory-mapped (zero-copy), so millions of orders load in
+# milliseconds instead of being re-parsed from text.
+#
+#   INT -> int32, NUMERIC(p,s) -> int64 fixed point (value * 10**s, i.e. cents), timestamp -> int64
+#   seconds since the epoch, bool -> bool, VARCHAR(n) -> fixed-width <Un (small tables only)
+#
+#   python columnar.py to-columnar --data-dir . --out columnar     CSV (plain/.gz/.zst) -> columnar
+#   python columnar.py to-csv --columnar-dir columnar --out csv     columnar -> CSV, same text as csvPopulator.py
+#   python csvPopulator.py --columnar columnar                      generate straight into the columnar form
+
+import argparse
+import csv
+import json
+import os
+import time
+
+import numpy as np
+
+from data_files import CSV_HEADERS, LOAD_ORDER
+from validate_data import load_table, parse_schema
+
+MANIFEST = "manifest.json"
+FORMAT_VERSION = 1
+
+TRUE_VALUES = ["True", "true", "t", "1"]
+
+# ----------------------------
+# Column types
+# ----------------------------
+def column_spec(table, column, column_type):
+    """Manifest entry for one column, from its create_tables.sql type."""
+    kind, size, _ = column_type
+    spec = {"name": column, "file": f"{table}.{column}.bin", "kind": kind}
+    if kind == "int":
+        spec["dtype"] = "<i4"
+    elif kind == "numeric":
+        spec["dtype"] = "<i8"
+        spec["scale"] = size[1]
+    elif kind == "timestamp":
+        spec["dtype"] = "<i8"
+        spec["unit"] = "s"
+    elif kind == "bool":
+        spec["dtype"] = "|b1"
+    else:
+        spec["dtype"] = f"<U{size}"
+    return spec
+
+
+def encode(spec, values):
+    """values (as generated or as validate_data.load_table returns them) in the column's stored dtype.
+
+    NUMERIC accepts floats (scaled here) or integers already in fixed point;
+    timestamps accept datetime64 or epoch seconds; bools accept bools or
+    their CSV text.
+    """
+    values = np.asarray(values)
+    kind = spec["kind"]
+    if kind == "numeric" and values.dtype.kind == "f":
+        values = np.rint(values * 10 ** spec["scale"])
+    elif kind == "timestamp" and values.dtype.kind == "M":
+        values = values.astype("datetime64[s]").astype(np.int64)
+    elif kind == "bool" and values.dtype.kind == "U":
+        values = np.isin(values, TRUE_VALUES)
+    elif kind == "varchar":
+        values = values.astype(str)
+        if len(values) and np.char.str_len(values).max() > int(spec["dtype"][2:]):
+            raise ValueError(f"{spec['file']}: value longer than VARCHAR({spec['dtype'][2:]})")
+    elif kind == "int" and len(values) and (values.min() < -2 ** 31 or values.max() > 2 ** 31 - 1):
+        raise ValueError(f"{spec['file']}: value out of int32 range")
+    return values.astype(spec["dtype"], copy=False)
+
+
+def decode(spec, values):
+    """Stored column -> what the rest of the scripts work with: datetime64[s] for timestamps (a view);
+    everything else as stored, NUMERIC staying integer fixed point."""
+    if spec["kind"] == "timestamp":
+        return values.view("datetime64[s]")
+    return values
+
+# ----------------------------
+# Writing
+# ----------------------------
+class ColumnarWriter:
+    """Appends column batches to the column files of out_dir; close() writes the manifest.
+
+    The manifest is written last (and atomically), so a directory without one
+    is an unfinished write and open_columnar refuses it.
+    """
+
+    def __init__(self, out_dir, schema=None):
+        self.out_dir = out_dir
+        self.schema = schema or parse_schema()
+        self.tables = {}
+        self._files = {}
+        os.makedirs(out_dir, exist_ok=True)
+        manifest = os.path.join(out_dir, MANIFEST)
+        if os.path.exists(manifest):
+            os.remove(manifest)
+
+    def append(self, table, columns):
+        """Append {column: values} (every column of the table, equal lengths) to table."""
+        if table not in self.tables:
+            specs = [column_spec(table, column, self.schema[table][column]) for column in columns]
+            self.tables[table] = {"rows": 0, "columns": specs}
+            for spec in specs:
+                self._files[spec["file"]] = open(os.path.join(self.out_dir, spec["file"]), "wb")
+        entry = self.tables[table]
+        lengths = {len(values) for values in columns.values()}
+        if len(lengths) != 1:
+            raise ValueError(f"{table}: columns of different lengths {sorted(lengths)}")
+        for spec in entry["columns"]:
+            self._files[spec["file"]].write(encode(spec, columns[spec["name"]]).tobytes())
+        entry["rows"] += lengths.pop()
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._files.clear()
+        manifest = {"format": FORMAT_VERSION, "created": time.strftime("%Y-%m-%d %H:%M:%S"), "tables": self.tables}
+        tmp = os.path.join(self.out_dir, MANIFEST + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp, os.path.join(self.out_dir, MANIFEST))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            for f in self._files.values():
+                f.close()
+
+
+def order_chunk_columns(chunk):
+    """({orders column: values}, {joint_order_items column: values}) of a csvPopulator.OrderChunk."""
+    orders = {"id": chunk.order_ids, "customer_id": chunk.customer_ids, "timestamp": chunk.timestamps,
+              "total_price": chunk.totals, "pearls_earned": chunk.pearls_earned, "employee_id": chunk.employee_ids}
+    items = {"order_id": chunk.item_order_ids, "menu_item_id": chunk.item_menu_ids,
+             "line_number": chunk.item_line_numbers, "quantity": chunk.item_quantities,
+             "unit_price": chunk.item_unit_prices, "parent_line": chunk.item_parent_lines}
+    return orders, items
+
+
+def rows_to_columns(rows, columns):
+    """Row lists (as csvPopulator.py builds the small tables) -> {column: values}."""
+    return {column: [row[i] for row in rows] for i, column in enumerate(columns)}
+
+# ----------------------------
+# Reading
+# ----------------------------
+def read_manifest(columnar_dir):
+    path = os.path.join(columnar_dir, MANIFEST)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"no {MANIFEST} in {columnar_dir} (not a columnar dataset, or an unfinished write)")
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest["format"] != FORMAT_VERSION:
+        raise ValueError(f"{path}: format {manifest['format']}, expected {FORMAT_VERSION}")
+    return manifest
+
+
+def is_columnar(data_dir):
+    return os.path.exists(os.path.join(data_dir, MANIFEST))
+
+
+def open_columnar(columnar_dir, tables=None):
+    """{table: {column: read-only memory-mapped array}} for the given tables (default: all)."""
+    manifest = read_manifest(columnar_dir)
+    result = {}
+    for table, entry in manifest["tables"].items():
+        if tables is not None and table not in tables:
+            continue
+        result[table] = {}
+        for spec in entry["columns"]:
+            if entry["rows"]:
+                values = np.memmap(os.path.join(columnar_dir, spec["file"]), dtype=spec["dtype"], mode="r",
+                                   shape=(entry["rows"],))
+            else:
+                values = np.empty(0, dtype=spec["dtype"])  # mmap can't map an empty file
+            result[table][spec["name"]] = decode(spec, values)
+    return result
+
+def update_column(columnar_dir, table, column, values):
+    """Replace one column of a table with values (same number of rows), e.g. updated inventory quantities.
+
+    The new file replaces the old one atomically, so arrays already mapped
+    from it keep reading the old values.
+    """
+    entry = read_manifest(columnar_dir)["tables"][table]
+    spec = next(spec for spec in entry["columns"] if spec["name"] == column)
+    data = encode(spec, values)
+    if len(data) != entry["rows"]:
+        raise ValueError(f"{spec['file']}: {len(data):,} values for {entry['rows']:,} rows")
+    path = os.path.join(columnar_dir, spec["file"])
+    with open(path + ".tmp", "wb") as f:
+        f.write(data.tobytes())
+    os.replace(path + ".tmp", path)
+
+# ----------------------------
+# Conversion
+# ----------------------------
+def csv_to_columnar(data_dir, out_dir, max_rows=10):
+    """Convert the CSV files of data_dir, type-checked by validate_data.load_table on the way.
+
+    Each table is parsed in one go (as the validator does), so peak memory
+    is about one table's columns.
+    """
+    schema = parse_schema()
+    with ColumnarWriter(out_dir, schema) as writer:
+        for table, filename, columns in LOAD_ORDER:
+            t0 = time.perf_counter()
+            data = load_table(data_dir, table, filename, columns, schema, max_rows)
+            for column in columns:
+                if np.ma.is_masked(data[column]):
+                    raise ValueError(f"{filename}: {column} has empty (NULL) values, which the columnar form "
+                                     "can't store")
+            writer.append(table, {column: data[column] for column in columns})
+            print(f"{table:<26} {writer.tables[table]['rows']:>12,} rows {time.perf_counter() - t0:>8.2f}s")
+    return writer.tables
+
+
+def csv_values(spec, values):
+    """A stored column as the Python values csvPopulator.py writes."""
+    kind = spec["kind"]
+    if kind == "numeric":
+        return (values / 10 ** spec["scale"]).tolist()
+    if kind == "timestamp":
+        return [t.replace("T", " ") for t in np.datetime_as_string(values, unit="s").tolist()]
+    return values.tolist()
+
+
+def columnar_to_csv(columnar_dir, out_dir, compress=None, chunk_rows=1_000_000):
+    """Write the CSV files back out, chunk_rows rows at a time."""
+    from csvPopulator import open_csv
+
+    manifest = read_manifest(columnar_dir)
+    data = open_columnar(columnar_dir)
+    os.makedirs(out_dir, exist_ok=True)
+    for table, filename, _ in LOAD_ORDER:
+        specs = manifest["tables"][table]["columns"]
+        rows = manifest["tables"][table]["rows"]
+        with open_csv(os.path.join(out_dir, filename), compress) as f:
+            writer = csv.writer(f)
+            writer.writerow(CSV_HEADERS[filename])
+            for start in range(0, rows, chunk_rows):
+                columns = [csv_values(spec, data[table][spec["name"]][start:start + chunk_rows]) for spec in specs]
+                writer.writerows(zip(*columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert between the CSV and the columnar dataset forms.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    to_columnar = subparsers.add_parser("to-columnar", help="CSV files -> columnar directory")
+    to_columnar.add_argument("--data-dir", default=".", help="directory holding the CSV (or .csv.gz/.csv.zst) files")
+    to_columnar.add_argument("--out", default="columnar")
+    to_csv = subparsers.add_parser("to-csv", help="columnar directory -> CSV files")
+    to_csv.add_argument("--columnar-dir", default="columnar")
+    to_csv.add_argument("--out", default=".")
+    to_csv.add_argument("--compress", choices=["gzip", "zstd"], help="compress the CSV output")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    if args.command == "to-columnar":
+        tables = csv_to_columnar(args.data_dir, args.out)
+        size = sum(os.path.getsize(os.path.join(args.out, spec["file"]))
+                   for entry in tables.values() for spec in entry["columns"])
+        print(f"wrote {args.out} ({size / 2 ** 20:,.1f} MiB) in {time.perf_counter() - t0:.2f}s")
+    else:
+        columnar_to_csv(args.columnar_dir, args.out, args.compress)
+        print(f"wrote the CSV files to {args.out} in {time.perf_counter() - t0:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -27,21 +27,35 @@ phone_number VARCHAR(15) NOT NULL,
 pearls INT NOT NULL
 );
 
+-- orders is range partitioned by month on timestamp so date-bounded reports
+-- only scan the months they ask for. The primary key has to include the
+-- partition key, so it doesn't make id unique on its own; orders_partitions.sql
+-- (run right after this file) adds the order_ids table that does, and points
+-- joint_order_items.order_id at it, along with the partition functions.
 CREATE TABLE orders (
-id INT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+id INT GENERATED ALWAYS AS IDENTITY,
 customer_id INT,
 timestamp timestamp NOT NULL,
 total_price NUMERIC(10,2) NOT NULL,
 pearls_earned INT,
 employee_id INT NOT NULL,
+PRIMARY KEY (id, timestamp),
 CONSTRAINT fk_customer FOREIGN KEY (customer_id) REFERENCES customers(id),
 CONSTRAINT fk_employee FOREIGN KEY (employee_id) REFERENCES employees(id)
-);
+) PARTITION BY RANGE (timestamp);
+
+-- catches rows for months that have no partition yet; maintain_orders_partitions() moves them out
+CREATE TABLE orders_default PARTITION OF orders DEFAULT;
 
+-- one row per order line: the price is the menu price at the time of sale, and
+-- an add-on line points at the line_number of the drink it modifies (0 for drinks)
 CREATE TABLE joint_order_items (
 order_id INT NOT NULL,
 menu_item_id INT NOT NULL,
-CONSTRAINT fk_order_id FOREIGN KEY (order_id) REFERENCES orders(id),
+line_number INT NOT NULL,
+quantity INT NOT NULL DEFAULT 1,
+unit_price NUMERIC(10,2) NOT NULL,
+parent_line INT NOT NULL DEFAULT 0,
 CONSTRAINT fk_menu_item_id FOREIGN KEY (menu_item_id) REFERENCES menu_items(id)
 );
 
@@ -51,4 +65,39 @@ inventory_item_id INT NOT NULL,
 quantity_used INT NOT NULL,
 CONSTRAINT fk_menu_item_id FOREIGN KEY (menu_item_id) REFERENCES menu_items(id),
 CONSTRAINT fk_inventory_item_id FOREIGN KEY (inventory_item_id) REFERENCES inventory(id)
-);
\ No newline at end of file
+);
+
+-- ======================
+-- Indexes for the report queries in required_queries.py
+-- date range filters, GROUP BY DATE/HOUR/WEEK and per customer/employee totals (index-only scans)
+CREATE INDEX idx_orders_timestamp ON orders (timestamp) INCLUDE (customer_id, employee_id, total_price);
+CREATE INDEX idx_orders_customer_id ON orders (customer_id);
+CREATE INDEX idx_orders_employee_id ON orders (employee_id);
+-- order -> items joins, item popularity and per-item revenue (index-only scans)
+CREATE INDEX idx_joint_order_items_order_id ON joint_order_items (order_id);
+CREATE INDEX idx_joint_order_items_menu_item_id ON joint_order_items (menu_item_id) INCLUDE (quantity, unit_price);
+CREATE INDEX idx_joint_recipe_ingredients_menu_item_id ON joint_recipe_ingredients (menu_item_id);
+
+-- ======================
+-- Order totals from line items
+-- Sets total_price to SUM(quantity * unit_price) of the order's lines for the
+-- orders with from_id < id <= to_id, returning how many it changed. Orders
+-- without lines are left alone. setup_database.py reconcile calls it in id
+-- batches, one transaction each.
+CREATE OR REPLACE FUNCTION reconcile_order_totals(from_id INT, to_id INT)
+RETURNS INT AS $$
+DECLARE
+    changed INT;
+BEGIN
+    UPDATE orders o SET total_price = lines.total_price
+    FROM (
+        SELECT order_id, SUM(quantity * unit_price) AS total_price
+        FROM joint_order_items
+        WHERE order_id > from_id AND order_id <= to_id
+        GROUP BY order_id
+    ) lines
+    WHERE o.id = lines.order_id AND o.id > from_id AND o.id <= to_id AND o.total_price <> lines.total_price;
+    GET DIAGNOSTICS changed = ROW_COUNT;
+    RETURN changed;
+END;
+$$ LANGUAGE plpgsql;
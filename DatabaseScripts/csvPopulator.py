@@ -1,6 +1,21 @@
+import argparse
 import random
 import datetime
 import csv
+import gzip
+import os
+import resource
+import shutil
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import demand_model
+import snapshots
+from data_files import CSV_HEADERS, LOAD_ORDER, find_data_file, open_data_file
+from pipeline_metrics import add_metrics_args, finish_metrics, metrics_from_args
 
 # ----------------------------
 # Config
@@ -12,6 +27,9 @@ NUM_ORDERS = 20000
 NUM_CUSTOMERS = 2000
 NUM_EMPLOYEES = 15
 NUM_MANAGERS = 3
+CHUNK_SIZE = 100_000  # orders per NumPy batch
+# part of every snapshot id: bump it when a generator change alters the output for the same config
+GENERATOR_VERSION = 3
 
 # ----------------------------
 # Static data
@@ -76,95 +94,621 @@ def random_date(start, end):
     random_second = random.randrange(int_delta)
     return start + datetime.timedelta(seconds=random_second)
 
+def date_window(end_date=None):
+    """Return the (start, end) datetimes covering the last NUM_WEEKS weeks."""
+    if end_date is None:
+        end_date = datetime.datetime.now()
+    return end_date - datetime.timedelta(weeks=NUM_WEEKS), end_date
+
+def pick_peaks(start_date, end_date):
+    """Pick the PEAK_DAYS dates that get demand_model's peak-day volume and group orders."""
+    return [random_date(start_date, end_date).date() for _ in range(PEAK_DAYS)]
+
 # ----------------------------
 # Data generation
 # ----------------------------
-employees = []
-customers = []
-menu_items = []
-inventory = []
-orders = []
-joint_order_items = []
-joint_recipe_ingredients = []
-
-menu_item_id_map = {}
-inventory_item_id_map = {}
-
-# Employees
-for i in range(1, NUM_EMPLOYEES + 1):
-    employees.append([i, f"Employee{i}", f"employee{i}@teaone.com", (i <= NUM_MANAGERS)])
-
-# Customers
-for i in range(1, NUM_CUSTOMERS + 1):
-    phone_number = random.randint(1000000000, 9999999999)
-    pearls = random.randint(0, 200)
-    customers.append([i, f"Customer{i}", phone_number, pearls])
-
-# Menu Items
-id_counter = 1
-for (name, price, desc) in MENU_ITEMS:
-    menu_items.append([id_counter, name, price, desc, False])
-    menu_item_id_map[name] = id_counter
-    id_counter += 1
-for (name, price, desc) in ADDON_ITEMS:
-    menu_items.append([id_counter, name, price, desc, True])
-    menu_item_id_map[name] = id_counter
-    id_counter += 1
-
-# Inventory
-for j, name in enumerate(INVENTORY_ITEMS, 1):
-    quantity = random.randint(500, 2000)
-    restock_price = round(random.uniform(5, 50), 2)
-    inventory.append([j, name, quantity, restock_price])
-    inventory_item_id_map[name] = j
-
-# Recipes
-for (name, _, _) in MENU_ITEMS:
-    menu_id = menu_item_id_map[name]
-    needed_ingredients = random.sample(INVENTORY_ITEMS, random.randint(2, 5))
-    for ingr in needed_ingredients:
-        qty_used = random.randint(1, 3)
-        ingr_id = inventory_item_id_map[ingr]
-        joint_recipe_ingredients.append([menu_id, ingr_id, qty_used])
-
-# Orders + Joint Order Items
-start_date = datetime.datetime.now() - datetime.timedelta(weeks=NUM_WEEKS)
-end_date = datetime.datetime.now()
-
-peaks = [random_date(start_date, end_date).date() for _ in range(PEAK_DAYS)]
-for order_id in range(1, NUM_ORDERS + 1):
-    customer_id = random.randint(1, NUM_CUSTOMERS)
-    employee_id = random.randint(1, NUM_EMPLOYEES)
-    complete_time = random_date(start_date, end_date)
-    complete_date = complete_time.date()
-    complete_time = complete_time.strftime('%Y-%m-%d %H:%M:%S')
-    
-    items = random.sample(MENU_ITEMS, random.randint(1, 3))
-    if complete_date in peaks:
-        items = random.sample(MENU_ITEMS, random.randint(3, 9))
-    order_total = sum([price for (_, price, _) in items])
-    pearls_earned = int(order_total // 2)
-    
-    orders.append([order_id, customer_id, complete_time, round(order_total, 2), pearls_earned, employee_id])
-    
-    for (item, _, _) in items:
-        joint_order_items.append([order_id, menu_item_id_map[item]])
+ORDERS_HEADER = CSV_HEADERS["orders.csv"]
+JOINT_ORDER_ITEMS_HEADER = CSV_HEADERS["joint_order_items.csv"]
+
+def generate_employees():
+    return [[i, f"Employee{i}", f"employee{i}@teaone.com", (i <= NUM_MANAGERS)] for i in range(1, NUM_EMPLOYEES + 1)]
+
+def generate_customers():
+    customers = []
+    for i in range(1, NUM_CUSTOMERS + 1):
+        phone_number = random.randint(1000000000, 9999999999)
+        pearls = random.randint(0, 200)
+        customers.append([i, f"Customer{i}", phone_number, pearls])
+    return customers
+
+def generate_menu_items():
+    """Menu items then add-ons; returns (rows, {name: id})."""
+    menu_items = []
+    menu_item_id_map = {}
+    id_counter = 1
+    for (name, price, desc) in MENU_ITEMS:
+        menu_items.append([id_counter, name, price, desc, False])
+        menu_item_id_map[name] = id_counter
+        id_counter += 1
+    for (name, price, desc) in ADDON_ITEMS:
+        menu_items.append([id_counter, name, price, desc, True])
+        menu_item_id_map[name] = id_counter
+        id_counter += 1
+    return menu_items, menu_item_id_map
+
+def generate_inventory():
+    """Returns (rows, {name: id})."""
+    inventory = []
+    inventory_item_id_map = {}
+    for j, name in enumerate(INVENTORY_ITEMS, 1):
+        quantity = random.randint(500, 2000)
+        restock_price = round(random.uniform(5, 50), 2)
+        inventory.append([j, name, quantity, restock_price])
+        inventory_item_id_map[name] = j
+    return inventory, inventory_item_id_map
+
+def generate_recipes(menu_item_id_map, inventory_item_id_map):
+    joint_recipe_ingredients = []
+    for (name, _, _) in MENU_ITEMS:
+        menu_id = menu_item_id_map[name]
+        needed_ingredients = random.sample(INVENTORY_ITEMS, random.randint(2, 5))
+        for ingr in needed_ingredients:
+            qty_used = random.randint(1, 3)
+            ingr_id = inventory_item_id_map[ingr]
+            joint_recipe_ingredients.append([menu_id, ingr_id, qty_used])
+    return joint_recipe_ingredients
+
+def generate_static_tables():
+    """Build employees, customers, menu items, inventory and recipes.
+
+    The stages draw from `random` in this order; keep it so a --seed
+    reproduces the same files.
+    """
+    employees = generate_employees()
+    customers = generate_customers()
+    menu_items, menu_item_id_map = generate_menu_items()
+    inventory, inventory_item_id_map = generate_inventory()
+    joint_recipe_ingredients = generate_recipes(menu_item_id_map, inventory_item_id_map)
+    return employees, customers, menu_items, inventory, joint_recipe_ingredients, menu_item_id_map
+
+def generate_orders_loop(start_date, end_date, peaks, menu_item_id_map, num_orders=NUM_ORDERS):
+    """Original one-order-at-a-time generator, kept as the reference/baseline."""
+    orders = []
+    joint_order_items = []
+    for order_id in range(1, num_orders + 1):
+        customer_id = random.randint(1, NUM_CUSTOMERS)
+        employee_id = random.randint(1, NUM_EMPLOYEES)
+        complete_time = random_date(start_date, end_date)
+        complete_date = complete_time.date()
+        complete_time = complete_time.strftime('%Y-%m-%d %H:%M:%S')
+
+        items = random.sample(MENU_ITEMS, random.randint(1, 3))
+        if complete_date in peaks:
+            items = random.sample(MENU_ITEMS, random.randint(3, 9))
+        order_total = sum([price for (_, price, _) in items])
+        pearls_earned = int(order_total // 2)
+
+        orders.append([order_id, customer_id, complete_time, round(order_total, 2), pearls_earned, employee_id])
+
+        for line_number, (item, price, _) in enumerate(items, 1):
+            joint_order_items.append([order_id, menu_item_id_map[item], line_number, 1, price, 0])
+    return orders, joint_order_items
+
+# One batch of orders as parallel NumPy arrays. item_* arrays hold the
+# joint_order_items rows of the batch, grouped by order; an add-on line's
+# parent line is the line number of its drink (0 for drinks).
+OrderChunk = namedtuple("OrderChunk", [
+    "order_ids", "customer_ids", "timestamps", "totals", "pearls_earned",
+    "employee_ids", "item_order_ids", "item_menu_ids",
+    "item_line_numbers", "item_quantities", "item_unit_prices", "item_parent_lines",
+])
+
+def order_shards(num_orders, chunk_size):
+    """Split order ids 1..num_orders into (chunk_index, offset, size) id ranges."""
+    return [(chunk_index, offset, min(chunk_size, num_orders - offset))
+            for chunk_index, offset in enumerate(range(0, num_orders, chunk_size))]
+
+def order_totals_cents(item_positions, quantities, unit_cents, num_orders):
+    """Order totals in cents from line items in one pass: SUM(quantity * unit price) per order position."""
+    return np.rint(np.bincount(item_positions, weights=quantities * unit_cents, minlength=num_orders)).astype(np.int64)
+
+def order_addons(menu_item_id_map, addons=ADDON_ITEMS):
+    """The add-ons of addons that are on the menu (menu_item_id_map)."""
+    return [addon for addon in addons if addon[0] in menu_item_id_map]
+
+def generate_order_chunk(chunk_index, offset, n, start_date, end_date, peaks, menu_item_id_map, entropy,
+                         menu=MENU_ITEMS, addons=ADDON_ITEMS):
+    """Generate orders offset+1..offset+n as one OrderChunk, following demand_model.
+
+    The chunk draws from its own generator derived from (entropy, chunk_index),
+    so it comes out the same no matter which process generates it or in what order.
+    """
+    rng = np.random.default_rng(np.random.SeedSequence(entropy, spawn_key=(chunk_index,)))
+    addons = order_addons(menu_item_id_map, addons)
+    menu_ids = np.array([menu_item_id_map[name] for (name, _, _) in menu])
+    prices_cents = np.array([round(price * 100) for (_, price, _) in menu])
+    addon_ids = np.array([menu_item_id_map[name] for (name, _, _) in addons], dtype=np.int64)
+    addon_cents = np.array([round(price * 100) for (_, price, _) in addons], dtype=np.int64)
+    max_items = min(demand_model.MAX_DRINKS, len(menu))
+
+    order_ids = np.arange(offset + 1, offset + n + 1, dtype=np.int64)
+    customer_ids = rng.integers(1, NUM_CUSTOMERS, n, endpoint=True)
+    employee_ids = rng.integers(1, NUM_EMPLOYEES, n, endpoint=True)
+    timestamps = demand_model.sample_timestamps(rng, n, demand_model.hour_slots(start_date, end_date, peaks))
+
+    # drinks per order, with bigger group orders on peak days
+    is_peak = np.isin(timestamps.astype("datetime64[D]"), np.array(peaks, dtype="datetime64[D]"))
+    counts = demand_model.sample_drink_counts(rng, is_peak, max_items)
+
+    # sampling without replacement: a random permutation per order, keep the first `count`
+    picks = np.argsort(rng.random((n, len(menu))), axis=1)[:, :max_items]
+    keep = np.arange(max_items) < counts[:, None]
+    drink_ids = menu_ids[picks[keep]]
+
+    # order lines: each drink is followed by its add-ons, which point back at the drink's line
+    attached = demand_model.sample_addons(rng, len(drink_ids), addons)
+    drink_orders = np.repeat(np.arange(n), counts)
+    line_shape = (len(drink_ids), 1 + len(addons))
+    item_mask = np.concatenate([np.ones((len(drink_ids), 1), dtype=bool), attached], axis=1)
+    item_ids = np.concatenate([drink_ids[:, None], np.broadcast_to(addon_ids, attached.shape)], axis=1)[item_mask]
+    unit_cents = np.concatenate([prices_cents[picks[keep]][:, None], np.broadcast_to(addon_cents, attached.shape)],
+                                axis=1)[item_mask]
+    is_drink = np.broadcast_to(np.arange(line_shape[1]) == 0, line_shape)[item_mask]
+    item_orders = np.repeat(drink_orders, item_mask.sum(axis=1))
+    items_per_order = np.bincount(item_orders, minlength=n)
+    line_numbers = np.arange(len(item_orders)) - (np.cumsum(items_per_order) - items_per_order)[item_orders] + 1
+    parent_lines = np.where(is_drink, 0, line_numbers[is_drink][np.cumsum(is_drink) - 1])
+    quantities = np.ones(len(item_orders), dtype=np.int64)
+    totals_cents = order_totals_cents(item_orders, quantities, unit_cents, n)
+
+    return OrderChunk(
+        order_ids=order_ids,
+        customer_ids=customer_ids,
+        timestamps=timestamps,
+        totals=totals_cents / 100,
+        pearls_earned=totals_cents // 200,
+        employee_ids=employee_ids,
+        item_order_ids=order_ids[item_orders],
+        item_menu_ids=item_ids,
+        item_line_numbers=line_numbers,
+        item_quantities=quantities,
+        item_unit_prices=unit_cents / 100,
+        item_parent_lines=parent_lines,
+    )
+
+def generate_order_chunks(start_date, end_date, peaks, menu_item_id_map, num_orders=NUM_ORDERS,
+                          chunk_size=CHUNK_SIZE, seed=None, menu=MENU_ITEMS, addons=ADDON_ITEMS):
+    """Yield orders as OrderChunks of up to chunk_size orders.
+
+    A seeded run gives the same orders for the same chunk_size, whether the
+    chunks are generated here or spread over worker processes.
+    """
+    entropy = np.random.SeedSequence(seed).entropy
+    for chunk_index, offset, n in order_shards(num_orders, chunk_size):
+        yield generate_order_chunk(chunk_index, offset, n, start_date, end_date, peaks, menu_item_id_map,
+                                   entropy, menu, addons)
+
+def count_revenue(chunks, revenue):
+    """Pass the chunks through, adding their order totals to revenue["cents"]."""
+    for chunk in chunks:
+        revenue["cents"] += int(np.rint(chunk.totals * 100).sum())
+        yield chunk
+
+def order_chunk_rows(chunk):
+    """Convert an OrderChunk into orders.csv and joint_order_items.csv rows."""
+    complete_times = [t.replace("T", " ") for t in np.datetime_as_string(chunk.timestamps, unit="s").tolist()]
+    order_rows = zip(chunk.order_ids.tolist(), chunk.customer_ids.tolist(), complete_times,
+                     chunk.totals.tolist(), chunk.pearls_earned.tolist(), chunk.employee_ids.tolist())
+    item_rows = zip(chunk.item_order_ids.tolist(), chunk.item_menu_ids.tolist(), chunk.item_line_numbers.tolist(),
+                    chunk.item_quantities.tolist(), chunk.item_unit_prices.tolist(), chunk.item_parent_lines.tolist())
+    return order_rows, item_rows
 
 # ----------------------------
 # Write CSV files
 # ----------------------------
-def write_csv(filename, header, rows):
-    with open(filename, "w", newline="", encoding="utf-8") as f:
+COMPRESSION_SUFFIXES = {None: "", "gzip": ".gz", "zstd": ".zst"}
+
+def open_csv(filename, compress=None, append=False):
+    """Open a CSV file for writing (or appending), optionally gzip or zstd compressed.
+
+    Appending to a compressed file adds a new gzip member / zstd frame, which
+    readers decompress as one continuous stream.
+    """
+    filename += COMPRESSION_SUFFIXES[compress]
+    mode = "at" if append else "wt"
+    if compress == "gzip":
+        return gzip.open(filename, mode, newline="", encoding="utf-8", compresslevel=6)
+    if compress == "zstd":
+        import zstandard  # optional dependency, only needed for --compress zstd
+        return zstandard.open(filename, mode, newline="", encoding="utf-8")
+    return open(filename, mode[0], newline="", encoding="utf-8")
+
+def write_csv(filename, header, rows, compress=None):
+    with open_csv(filename, compress) as f:
         writer = csv.writer(f)
         writer.writerow(header)
         writer.writerows(rows)
 
-write_csv("employees.csv", ["id", "name", "email", "is_manager"], employees)
-write_csv("customers.csv", ["id", "name", "phone_number", "pearls"], customers)
-write_csv("menu_items.csv", ["id", "name", "price", "description", "is_mod"], menu_items)
-write_csv("inventory.csv", ["id", "name", "quantity", "restock_price"], inventory)
-write_csv("orders.csv", ["id", "customer_id", "complete_time", "order_total_price", "pearls_earned", "employee_id"], orders)
-write_csv("joint_order_items.csv", ["order_id", "menu_item_id"], joint_order_items)
-write_csv("joint_recipe_ingredients.csv", ["menu_item_id", "inventory_item_id", "quantity_used"], joint_recipe_ingredients)
+def stream_orders_csv(chunks, compress=None, orders_filename="orders.csv",
+                      items_filename="joint_order_items.csv", header=True, append=False):
+    """Write orders.csv and joint_order_items.csv one chunk at a time.
+
+    Only the current chunk is held in memory, so peak memory depends on the
+    chunk size and not on the number of orders. Returns (orders, items) written.
+    """
+    num_orders = 0
+    num_items = 0
+    with open_csv(orders_filename, compress, append) as orders_file, \
+            open_csv(items_filename, compress, append) as items_file:
+        orders_writer = csv.writer(orders_file)
+        items_writer = csv.writer(items_file)
+        if header:
+            orders_writer.writerow(ORDERS_HEADER)
+            items_writer.writerow(JOINT_ORDER_ITEMS_HEADER)
+        for chunk in chunks:
+            order_rows, item_rows = order_chunk_rows(chunk)
+            orders_writer.writerows(order_rows)
+            items_writer.writerows(item_rows)
+            num_orders += len(chunk.order_ids)
+            num_items += len(chunk.item_order_ids)
+    return num_orders, num_items
+
+# ----------------------------
+# Parallel (sharded) generation
+# ----------------------------
+def part_filename(filename, chunk_index):
+    base, ext = os.path.splitext(filename)
+    return f"{base}.part{chunk_index:05d}{ext}"
+
+def write_order_part(task):
+    """Worker: generate one id-range shard and write it to its own part files."""
+    (chunk_index, offset, n), gen_args, compress, header = task
+    revenue = {"cents": 0}
+    chunks = count_revenue([generate_order_chunk(chunk_index, offset, n, *gen_args)], revenue)
+    part_orders, part_items = stream_orders_csv(chunks, compress, part_filename("orders.csv", chunk_index),
+                                                part_filename("joint_order_items.csv", chunk_index), header)
+    return part_orders, part_items, revenue["cents"]
+
+def merge_parts(filename, header, chunk_indexes, compress=None):
+    """Concatenate part files in shard order into filename, then delete them.
+
+    gzip members and zstd frames can be concatenated as-is, so compressed
+    parts are merged without recompressing.
+    """
+    write_csv(filename, header, [], compress)
+    suffix = COMPRESSION_SUFFIXES[compress]
+    with open(filename + suffix, "ab") as out:
+        for chunk_index in chunk_indexes:
+            part = part_filename(filename, chunk_index) + suffix
+            with open(part, "rb") as f:
+                shutil.copyfileobj(f, out)
+            os.remove(part)
+
+def write_orders_parallel(start_date, end_date, peaks, menu_item_id_map, num_orders, chunk_size, seed,
+                          workers, compress=None, keep_parts=False, revenue=None):
+    """Generate order shards in a process pool and merge them (or keep the part files).
+
+    Shards are fixed id ranges of chunk_size orders seeded from (seed, shard
+    index), so the output is the same for any number of workers and matches
+    the single-process stream for the same seed and chunk_size. The order
+    totals are added to revenue["cents"] if given.
+    """
+    entropy = np.random.SeedSequence(seed).entropy
+    shards = order_shards(num_orders, chunk_size)
+    gen_args = (start_date, end_date, peaks, menu_item_id_map, entropy)
+    tasks = [(shard, gen_args, compress, keep_parts) for shard in shards]
+
+    num_orders = 0
+    num_items = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for part_orders, part_items, part_cents in pool.map(write_order_part, tasks):
+            num_orders += part_orders
+            num_items += part_items
+            if revenue is not None:
+                revenue["cents"] += part_cents
+
+    if not keep_parts:
+        chunk_indexes = [chunk_index for (chunk_index, _, _) in shards]
+        merge_parts("orders.csv", ORDERS_HEADER, chunk_indexes, compress)
+        merge_parts("joint_order_items.csv", JOINT_ORDER_ITEMS_HEADER, chunk_indexes, compress)
+    return num_orders, num_items
+
+def generate_order_shard(task):
+    """Worker: one id-range shard as an OrderChunk (for writers that need the arrays, not CSV parts)."""
+    (chunk_index, offset, n), gen_args = task
+    return generate_order_chunk(chunk_index, offset, n, *gen_args)
+
+def generate_order_chunks_parallel(start_date, end_date, peaks, menu_item_id_map, num_orders, chunk_size, seed,
+                                   workers):
+    """Same chunks as generate_order_chunks, generated in a process pool and yielded in shard order."""
+    entropy = np.random.SeedSequence(seed).entropy
+    gen_args = (start_date, end_date, peaks, menu_item_id_map, entropy)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        tasks = [(shard, gen_args) for shard in order_shards(num_orders, chunk_size)]
+        yield from pool.map(generate_order_shard, tasks)
+
+# ----------------------------
+# Columnar output
+# ----------------------------
+def write_columnar(out_dir, static_tables, chunks):
+    """Write the static tables and the order chunks as columnar.py column files + manifest.
+
+    static_tables is {csv filename: rows}; orders are appended chunk by
+    chunk. Returns (orders, items) written.
+    """
+    import columnar
+
+    columns = {filename: cols for (_, filename, cols) in LOAD_ORDER}
+    tables = {filename: table for (table, filename, _) in LOAD_ORDER}
+    with columnar.ColumnarWriter(out_dir) as writer:
+        for filename, rows in static_tables.items():
+            writer.append(tables[filename], columnar.rows_to_columns(rows, columns[filename]))
+        for chunk in chunks:
+            orders, items = columnar.order_chunk_columns(chunk)
+            writer.append("orders", orders)
+            writer.append("joint_order_items", items)
+    return writer.tables["orders"]["rows"], writer.tables["joint_order_items"]["rows"]
+
+# ----------------------------
+# Incremental extension
+# ----------------------------
+ExistingOrders = namedtuple("ExistingOrders", ["count", "max_id", "first_time", "last_time"])
+
+def scan_orders_csv(path):
+    """Count, max id and first/last timestamp of an existing orders.csv (plain or compressed)."""
+    count = 0
+    max_id = 0
+    first_time = last_time = None
+    with open_data_file(path) as f:
+        reader = csv.reader(f)
+        next(reader)
+        for row in reader:
+            count += 1
+            max_id = max(max_id, int(row[0]))
+            # "YYYY-MM-DD HH:MM:SS" strings sort like the times they spell
+            if first_time is None or row[2] < first_time:
+                first_time = row[2]
+            if last_time is None or row[2] > last_time:
+                last_time = row[2]
+    if count == 0:
+        raise ValueError(f"{path} has no orders to extend")
+    return ExistingOrders(count, max_id, datetime.datetime.fromisoformat(first_time),
+                          datetime.datetime.fromisoformat(last_time))
+
+def extension_window(existing, days, num_orders=None):
+    """(start, end, number of orders) for the `days` days after the latest existing order.
+
+    Without num_orders the existing average orders per day is kept.
+    """
+    start = existing.last_time + datetime.timedelta(seconds=1)
+    end = start + datetime.timedelta(days=days)
+    if num_orders is None:
+        span_days = max((existing.last_time - existing.first_time).total_seconds() / 86400, 1)
+        num_orders = round(existing.count / span_days * days)
+    return start, end, num_orders
+
+def generate_extension_chunks(existing, start_date, end_date, menu_item_id_map, num_orders,
+                              chunk_size=CHUNK_SIZE, seed=None):
+    """Yield OrderChunks for ids max_id+1.. with timestamps in [start_date, end_date).
+
+    The seed is mixed with the first new id, so extending a seeded dataset
+    again with the same seed doesn't repeat the orders of the previous run.
+    """
+    entropy = np.random.SeedSequence(None if seed is None else [seed, existing.max_id]).entropy
+    for chunk_index, offset, n in order_shards(num_orders, chunk_size):
+        yield generate_order_chunk(chunk_index, existing.max_id + offset, n, start_date, end_date, [],
+                                   menu_item_id_map, entropy)
+
+def read_menu_item_id_map(data_dir="."):
+    with open_data_file(find_data_file(data_dir, "menu_items.csv")) as f:
+        reader = csv.reader(f)
+        next(reader)
+        return {row[1]: int(row[0]) for row in reader}
+
+def extend_orders_csv(days, num_orders=None, chunk_size=CHUNK_SIZE, seed=None):
+    """Append `days` more days of orders and order items to the CSV files in the current directory.
+
+    The files keep their compression; nothing else is rewritten. Returns
+    (orders, items) appended.
+    """
+    orders_path = find_data_file(".", "orders.csv")
+    suffix = orders_path[len(os.path.join(".", "orders.csv")):]
+    compress = {suffix: compress for compress, suffix in COMPRESSION_SUFFIXES.items()}[suffix]
+    existing = scan_orders_csv(orders_path)
+    start_date, end_date, num_orders = extension_window(existing, days, num_orders)
+    print(f"extending {existing.count:,} orders (ids up to {existing.max_id:,}, last at {existing.last_time}) "
+          f"with {num_orders:,} orders from {start_date} to {end_date}")
+    chunks = generate_extension_chunks(existing, start_date, end_date, read_menu_item_id_map(), num_orders,
+                                       chunk_size, seed)
+    return stream_orders_csv(chunks, compress, header=False, append=True)
+
+# ----------------------------
+# Snapshots
+# ----------------------------
+def snapshot_config(args):
+    """Everything that determines the generated files; its hash is the snapshot id.
+
+    --workers is left out (the output is the same for any worker count), and
+    the chunk size only matters to the numpy engine.
+    """
+    return {
+        "generator": GENERATOR_VERSION,
+        "engine": args.engine,
+        "orders": args.orders,
+        "chunk_size": args.chunk_size if args.engine == "numpy" else None,
+        "seed": args.seed,
+        "end_date": args.end_date.isoformat(),
+        "num_weeks": NUM_WEEKS,
+        "peak_days": PEAK_DAYS,
+        "sales_target": args.sales_target,
+        "customers": NUM_CUSTOMERS,
+        "employees": NUM_EMPLOYEES,
+        "managers": NUM_MANAGERS,
+        "menu_items": MENU_ITEMS,
+        "addon_items": ADDON_ITEMS,
+        "inventory_items": INVENTORY_ITEMS,
+        "format": "columnar" if args.columnar else "csv",
+        "compress": None if args.columnar else args.compress,
+    }
+
+def peak_rss_mib():
+    # ru_maxrss is reported in KiB on Linux; RUSAGE_CHILDREN covers --workers processes
+    return max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) / 1024
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate CSV files for all tables.")
+    parser.add_argument("--engine", choices=["numpy", "loop"], default="numpy",
+                        help="order generator: batched NumPy streamed to disk (default) or the original per-order loop")
+    parser.add_argument("--orders", type=int,
+                        help="number of orders to generate (default: as many as the demand model expects to "
+                             f"reach --sales-target; {NUM_ORDERS} with --engine loop; with --extend-days the "
+                             "existing orders per day)")
+    parser.add_argument("--sales-target", type=float, default=TOTAL_SALES_TARGET,
+                        help="expected revenue in dollars that the default order count is solved for "
+                             "(default: %(default).0f)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="orders per NumPy batch / write flush")
+    parser.add_argument("--seed", type=int, help="fixed seed for reproducible output")
+    parser.add_argument("--end-date", type=datetime.datetime.fromisoformat,
+                        help="last day of the order window (default: now); fix it together with --seed")
+    parser.add_argument("--compress", choices=["gzip", "zstd"], help="compress the CSV output")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="generate order shards (--chunk-size ids each) in this many processes")
+    parser.add_argument("--keep-parts", action="store_true",
+                        help="with --workers, leave one orders/joint_order_items part file per shard instead of merging")
+    parser.add_argument("--extend-days", type=int,
+                        help="append this many days of orders after the latest one in the existing CSV files "
+                             "(continuing the ids) instead of regenerating everything")
+    parser.add_argument("--columnar", metavar="DIR",
+                        help="write typed, memory-mappable column files (see columnar.py) into DIR instead of CSV")
+    parser.add_argument("--snapshot-dir", metavar="DIR",
+                        help="generate the CSV files into DIR/<snapshot id>, the hash of the config, seed and "
+                             "--end-date, and do nothing if that snapshot already exists")
+    add_metrics_args(parser)
+    args = parser.parse_args()
+    if args.columnar and (args.engine == "loop" or args.extend_days):
+        parser.error("--columnar works with the numpy engine and a full generation only")
+    if args.snapshot_dir and (args.seed is None or args.end_date is None or args.extend_days or args.keep_parts
+                              or args.columnar):
+        parser.error("--snapshot-dir needs --seed and --end-date, and can't be combined with --extend-days, "
+                     "--keep-parts or --columnar (snapshots are CSV, which setup_database.py load reads)")
+    return args
+
+def generate_dataset(args, metrics):
+    """Generate every table into the current directory; returns (orders, order items)."""
+    # same stage order as generate_static_tables (seeded random draws)
+    with metrics.stage("employees") as stage:
+        employees = generate_employees()
+        stage["rows"] = len(employees)
+    with metrics.stage("customers") as stage:
+        customers = generate_customers()
+        stage["rows"] = len(customers)
+    with metrics.stage("menu") as stage:
+        menu_items, menu_item_id_map = generate_menu_items()
+        stage["rows"] = len(menu_items)
+    with metrics.stage("inventory") as stage:
+        inventory, inventory_item_id_map = generate_inventory()
+        stage["rows"] = len(inventory)
+    with metrics.stage("recipes") as stage:
+        joint_recipe_ingredients = generate_recipes(menu_item_id_map, inventory_item_id_map)
+        stage["rows"] = len(joint_recipe_ingredients)
+
+    static_tables = {
+        "employees.csv": employees,
+        "customers.csv": customers,
+        "menu_items.csv": menu_items,
+        "inventory.csv": inventory,
+        "joint_recipe_ingredients.csv": joint_recipe_ingredients,
+    }
+    if not args.columnar:
+        with metrics.stage("write") as stage:
+            for filename, rows in static_tables.items():
+                write_csv(filename, CSV_HEADERS[filename], rows, args.compress)
+            stage["rows"] = sum(len(rows) for rows in static_tables.values())
+
+    # Orders + Joint Order Items: generated and written chunk by chunk, so one stage
+    with metrics.stage("orders") as stage:
+        start_date, end_date = date_window(args.end_date)
+        peaks = pick_peaks(start_date, end_date)
+        order_count = args.orders
+        if order_count is None and args.engine == "loop":
+            order_count = NUM_ORDERS
+        elif order_count is None:
+            order_count, expected, spread = demand_model.calibrate(
+                args.sales_target, start_date, end_date, peaks, MENU_ITEMS, order_addons(menu_item_id_map))
+            print(f"demand model: {order_count:,} orders for a ${args.sales_target:,.0f} sales target "
+                  f"(expected ${expected:,.0f}, standard deviation {spread:.2%})")
+        revenue = {"cents": 0}
+        if args.columnar:
+            if args.workers > 1:
+                chunks = generate_order_chunks_parallel(start_date, end_date, peaks, menu_item_id_map, order_count,
+                                                        args.chunk_size, args.seed, args.workers)
+            else:
+                chunks = generate_order_chunks(start_date, end_date, peaks, menu_item_id_map, order_count,
+                                               args.chunk_size, args.seed)
+            num_orders, num_items = write_columnar(args.columnar, static_tables, count_revenue(chunks, revenue))
+        elif args.engine == "loop":
+            orders, joint_order_items = generate_orders_loop(start_date, end_date, peaks, menu_item_id_map,
+                                                             order_count)
+            write_csv("orders.csv", ORDERS_HEADER, orders, args.compress)
+            write_csv("joint_order_items.csv", JOINT_ORDER_ITEMS_HEADER, joint_order_items, args.compress)
+            num_orders, num_items = len(orders), len(joint_order_items)
+            revenue["cents"] = sum(round(order[3] * 100) for order in orders)
+        elif args.workers > 1:
+            num_orders, num_items = write_orders_parallel(start_date, end_date, peaks, menu_item_id_map,
+                                                          order_count, args.chunk_size, args.seed, args.workers,
+                                                          args.compress, args.keep_parts, revenue)
+        else:
+            chunks = generate_order_chunks(start_date, end_date, peaks, menu_item_id_map, order_count,
+                                           args.chunk_size, args.seed)
+            num_orders, num_items = stream_orders_csv(count_revenue(chunks, revenue), args.compress)
+        stage["rows"] = num_orders + num_items
+    print(f"sales ${revenue['cents'] / 100:,.2f} ({revenue['cents'] / 100 / args.sales_target - 1:+.2%} "
+          f"against the ${args.sales_target:,.0f} target)")
+    return num_orders, num_items
+
+
+def main():
+    args = parse_args()
+    if args.seed is not None:
+        random.seed(args.seed)
+    metrics = metrics_from_args("csvPopulator", args)
+    t0 = time.perf_counter()
+
+    if args.extend_days:
+        with metrics.stage("orders") as stage:
+            num_orders, num_items = extend_orders_csv(args.extend_days, args.orders, args.chunk_size, args.seed)
+            stage["rows"] = num_orders + num_items
+        elapsed = time.perf_counter() - t0
+        print(f"appended {num_orders:,} orders / {num_items:,} order items in {elapsed:.2f}s")
+        finish_metrics(metrics, args)
+        return
+
+    if args.snapshot_dir:
+        config = snapshot_config(args)
+        snapshot = snapshots.snapshot_id(config)
+        path = os.path.join(args.snapshot_dir, snapshot)
+        existing = snapshots.read_snapshot(path)
+        if existing is not None:
+            changed = snapshots.changed_files(path, existing)
+            if changed:
+                raise SystemExit(f"snapshot {snapshot} at {path} was written into since it was generated "
+                                 f"({', '.join(changed)} changed); delete it to regenerate")
+            print(f"✅ Snapshot {snapshot} is already generated: {path}")
+            finish_metrics(metrics, args)
+            return
+        with snapshots.build_snapshot(path, snapshot, config):
+            num_orders, num_items = generate_dataset(args, metrics)
+    else:
+        num_orders, num_items = generate_dataset(args, metrics)
+
+    elapsed = time.perf_counter() - t0
+    print(f"{num_orders:,} orders / {num_items:,} order items in {elapsed:.2f}s "
+          f"({num_orders / elapsed:,.0f} orders/sec), peak RSS {peak_rss_mib():.0f} MiB")
+    finish_metrics(metrics, args)
+    if args.snapshot_dir:
+        print(f"snapshot {snapshot}: {path}")
+    print(f"✅ Done! {'Columnar' if args.columnar else 'CSV'} files generated for all tables.")
 
-print("✅ Done! CSV files generated for all tables.")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+# helpers for reading the csvPopulator.py output files (plain, gzip or zstd compressed)
+import gzip
+import os
+
+# tables in foreign-key order: (table, csv file from csvPopulator.py, table columns in csv column order)
+LOAD_ORDER = [
+    ("employees", "employees.csv", ["id", "name", "email", "is_manager"]),
+    ("customers", "customers.csv", ["id", "name", "phone_number", "pearls"]),
+    ("menu_items", "menu_items.csv", ["id", "name", "price", "description", "is_modification"]),
+    ("inventory", "inventory.csv", ["id", "name", "quantity", "restock_price"]),
+    ("orders", "orders.csv", ["id", "customer_id", "timestamp", "total_price", "pearls_earned", "employee_id"]),
+    ("joint_order_items", "joint_order_items.csv",
+     ["order_id", "menu_item_id", "line_number", "quantity", "unit_price", "parent_line"]),
+    ("joint_recipe_ingredients", "joint_recipe_ingredients.csv", ["menu_item_id", "inventory_item_id", "quantity_used"]),
+]
+
+# header row of each csvPopulator.py output file (same column order as LOAD_ORDER)
+CSV_HEADERS = {
+    "employees.csv": ["id", "name", "email", "is_manager"],
+    "customers.csv": ["id", "name", "phone_number", "pearls"],
+    "menu_items.csv": ["id", "name", "price", "description", "is_mod"],
+    "inventory.csv": ["id", "name", "quantity", "restock_price"],
+    "orders.csv": ["id", "customer_id", "complete_time", "order_total_price", "pearls_earned", "employee_id"],
+    "joint_order_items.csv": ["order_id", "menu_item_id", "line_number", "quantity", "unit_price", "parent_line"],
+    "joint_recipe_ingredients.csv": ["menu_item_id", "inventory_item_id", "quantity_used"],
+}
+
+
+def find_data_file(data_dir, filename):
+    """Find filename in data_dir, also accepting the .gz/.zst outputs of csvPopulator.py --compress."""
+    for suffix in ("", ".gz", ".zst"):
+        path = os.path.join(data_dir, filename + suffix)
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError(f"{filename} not found in {data_dir}")
+
+
+def open_data_file(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    if path.endswith(".zst"):
+        import zstandard  # optional dependency, only needed for .zst input
+        return zstandard.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, "r", encoding="utf-8", newline="")
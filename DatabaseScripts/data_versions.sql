@@ -0,0 +1,57 @@
+-- Per-table change counters for the report cache in report_cache.py.
+-- A statement-level trigger bumps a table's version on every INSERT/UPDATE/
+-- DELETE/TRUNCATE (COPY included), in the writing transaction, so a cached
+-- report is reused only while none of the tables it reads have changed.
+-- Each table's counter is split over 16 shard rows and a write bumps the
+-- shard of its backend (pg_backend_pid() % 16), so concurrent sessions
+-- writing orders don't all queue on one counter row until commit; readers
+-- sum the shards, and the sum still moves on every write.
+-- Run after sales_rollups.sql (the rollups are tracked too). Safe to re-run:
+--   python setup_database.py run data_versions.sql
+
+CREATE TABLE IF NOT EXISTS data_versions (
+table_name text NOT NULL,
+shard INT NOT NULL DEFAULT 0,
+version BIGINT NOT NULL DEFAULT 0,
+PRIMARY KEY (table_name, shard)
+);
+
+-- databases from before the counters were sharded: the old single row becomes shard 0
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM information_schema.columns
+                   WHERE table_name = 'data_versions' AND column_name = 'shard') THEN
+        ALTER TABLE data_versions ADD COLUMN shard INT NOT NULL DEFAULT 0;
+        ALTER TABLE data_versions DROP CONSTRAINT data_versions_pkey;
+        ALTER TABLE data_versions ADD PRIMARY KEY (table_name, shard);
+    END IF;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION bump_data_version()
+RETURNS trigger AS $$
+BEGIN
+    UPDATE data_versions SET version = version + 1
+    WHERE table_name = TG_TABLE_NAME AND shard = pg_backend_pid() % 16;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    tracked text;
+BEGIN
+    FOREACH tracked IN ARRAY ARRAY['menu_items', 'employees', 'inventory', 'customers', 'orders',
+                                   'joint_order_items', 'joint_recipe_ingredients',
+                                   'sales_hourly', 'sales_daily']
+    LOOP
+        INSERT INTO data_versions (table_name, shard)
+        SELECT tracked, shard FROM generate_series(0, 15) AS shard
+        ON CONFLICT DO NOTHING;
+        EXECUTE format('DROP TRIGGER IF EXISTS data_version_changed ON %I', tracked);
+        EXECUTE format('CREATE TRIGGER data_version_changed '
+                       'AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %I '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version()', tracked);
+    END LOOP;
+END;
+$$;
@@ -0,0 +1,313 @@
+# shared database access: connection settings, a retrying thread-safe connection pool, SQL file
+# statement splitting, prepared catalog queries and a concurrent query executor
+#
+#   python database.py [connection flags] reports --workers 8    run every report query in parallel
+#   python database.py [connection flags] reports --start 2025-01-01 --end 2025-04-01 --repeat 5
+
+import argparse
+import hashlib
+import os
+import random
+import re
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
+
+from required_queries import (PARAM_TYPES, QUERY_GROUPS, add_query_args, check_rollup_range, query_overrides,
+                              query_params)
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# ======================
+# Connection settings
+def read_password():
+    if os.environ.get("PGPASSWORD"):
+        return os.environ["PGPASSWORD"]
+    path = os.path.join(SCRIPT_DIR, "passwd.txt")
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            return f.read().strip()
+    return None
+
+
+def add_connection_args(parser):
+    parser.add_argument("--host", default="gang_80.rds.amazonaws.com")
+    parser.add_argument("--port", type=int, default=5432)
+    parser.add_argument("--dbname", default="gang_80_db")
+    parser.add_argument("--user", default="gang_80")
+
+
+def connection_settings(args):
+    return dict(host=args.host, port=args.port, dbname=args.dbname, user=args.user, password=read_password())
+
+
+def connect(args):
+    return psycopg2.connect(**connection_settings(args))
+
+# ======================
+# Retries
+def is_transient(error):
+    """True for errors worth retrying: dropped/refused connections, serialization failures, deadlocks."""
+    code = getattr(error, "pgcode", None)
+    if code is None:
+        # no SQLSTATE: the connection itself failed
+        return isinstance(error, psycopg2.OperationalError)
+    # 08 connection exception, 40 transaction rollback, shutdown / starting up, too many connections
+    return code[:2] in ("08", "40") or code in ("57P01", "57P02", "57P03", "53300")
+
+
+def with_retry(fn, retries=5, backoff=0.1):
+    """Call fn(), retrying transient errors with exponential backoff and jitter."""
+    for attempt in range(retries + 1):
+        try:
+            return fn()
+        except psycopg2.Error as e:
+            if attempt == retries or not is_transient(e):
+                raise
+            time.sleep(backoff * 2 ** attempt * (1 + random.random()))
+
+# ======================
+# Prepared catalog queries
+PLACEHOLDER = re.compile(r"%\((\w+)\)s")
+
+# connection -> names of the statements prepared on it; entries go away with the connection
+_prepared = weakref.WeakKeyDictionary()
+_prepared_lock = threading.Lock()
+
+
+def statement_name(sql):
+    return "q_" + hashlib.sha1(sql.encode("utf-8")).hexdigest()[:16]
+
+
+def to_positional(sql):
+    """Rewrite %(name)s placeholders as $1, $2, ... returning (sql, parameter names in $ order)."""
+    names = []
+
+    def number(match):
+        if match.group(1) not in names:
+            names.append(match.group(1))
+        return f"${names.index(match.group(1)) + 1}"
+
+    return PLACEHOLDER.sub(number, sql).rstrip().rstrip(";"), names
+
+
+def prepare(cur, query):
+    """PREPARE query on the cursor's connection unless it already is; returns (statement, parameter names)."""
+    sql, names = to_positional(query.sql)
+    name = statement_name(sql)
+    with _prepared_lock:
+        prepared = _prepared.setdefault(cur.connection, set())
+    if name not in prepared:
+        types = f" ({', '.join(PARAM_TYPES[n][0] for n in names)})" if names else ""
+        cur.execute(f"PREPARE {name}{types} AS {sql}")
+        prepared.add(name)
+    return name, names
+
+
+def execute_query(cur, query, overrides=None, prefix=""):
+    """Run a required_queries.py Query as a server-side prepared statement.
+
+    The statement is prepared the first time it runs on a connection and only
+    EXECUTEd after that, so repeated calls with other parameters (a different
+    date range, limit or item) skip parsing, and planning too once PostgreSQL
+    settles on a generic plan. prefix goes in front of the EXECUTE, e.g.
+    "EXPLAIN ANALYZE ".
+    """
+    params = query_params(query, overrides)
+    name, names = prepare(cur, query)
+    if names:
+        cur.execute(f"{prefix}EXECUTE {name} ({', '.join(['%s'] * len(names))})", [params[n] for n in names])
+    else:
+        cur.execute(f"{prefix}EXECUTE {name}")
+
+# ======================
+# Pool
+class DatabasePool:
+    """Thread-safe pool of up to maxconn connections.
+
+    connection() blocks while every connection is checked out (the psycopg2
+    pool raises instead), and run() retries a whole unit of work on a fresh
+    connection when it fails with a transient error. minconn defaults to
+    maxconn: the psycopg2 pool closes a returned connection once minconn are
+    idle, and with it the connection's prepared statements, so a smaller
+    minconn reconnects and re-prepares under bursty load.
+    """
+
+    def __init__(self, settings, minconn=None, maxconn=8, retries=5, backoff=0.1):
+        self.retries = retries
+        self.backoff = backoff
+        minconn = maxconn if minconn is None else minconn
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._pool = with_retry(lambda: ThreadedConnectionPool(minconn, maxconn, **settings), retries, backoff)
+
+    @classmethod
+    def from_args(cls, args, **kwargs):
+        return cls(connection_settings(args), **kwargs)
+
+    @contextmanager
+    def connection(self):
+        with self._slots:
+            conn = with_retry(self._pool.getconn, self.retries, self.backoff)
+            broken = False
+            try:
+                yield conn
+            except psycopg2.Error:
+                broken = bool(conn.closed)
+                if not broken:
+                    conn.rollback()
+                raise
+            finally:
+                self._pool.putconn(conn, close=broken)
+
+    def run(self, fn):
+        """Run fn(conn) in a transaction and commit; retried as a whole on transient errors."""
+        def attempt():
+            with self.connection() as conn:
+                result = fn(conn)
+                conn.commit()
+                return result
+        return with_retry(attempt, self.retries, self.backoff)
+
+    def fetchall(self, sql, params=None):
+        def query(conn):
+            with conn.cursor() as cur:
+                cur.execute(sql, params)
+                return cur.fetchall()
+        return self.run(query)
+
+    def fetch_query(self, catalog_query, overrides=None):
+        """Rows of a required_queries.py Query, run as a prepared statement (see execute_query)."""
+        def query(conn):
+            with conn.cursor() as cur:
+                execute_query(cur, catalog_query, overrides)
+                return cur.fetchall()
+        return self.run(query)
+
+    def close(self):
+        self._pool.closeall()
+
+
+def run_concurrently(pool, queries, workers=8, overrides=None):
+    """Run required_queries.py Query objects in parallel over the pool.
+
+    Returns [(name, rows, seconds)] in input order; total wall time is close
+    to the slowest query as long as workers and the pool size cover the list.
+    """
+    def timed(query):
+        t0 = time.perf_counter()
+        rows = pool.fetch_query(query, overrides)
+        return query.name, rows, time.perf_counter() - t0
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(timed, queries))
+
+# ======================
+# SQL files
+def split_sql(sql):
+    """Split a SQL script into statements on top-level semicolons.
+
+    Semicolons inside 'strings', "identifiers", -- and /* */ comments and
+    $tag$ dollar-quoted bodies (plpgsql functions) don't end a statement.
+    Comment-only pieces are dropped.
+    """
+    statements = []
+    start = 0
+    i = 0
+    n = len(sql)
+    has_code = False
+    while i < n:
+        c = sql[i]
+        if c == "-" and sql.startswith("--", i):
+            end = sql.find("\n", i)
+            i = n if end == -1 else end + 1
+            continue
+        if c == "/" and sql.startswith("/*", i):
+            depth = 1
+            i += 2
+            while i < n and depth:
+                if sql.startswith("/*", i):
+                    depth += 1
+                    i += 2
+                elif sql.startswith("*/", i):
+                    depth -= 1
+                    i += 2
+                else:
+                    i += 1
+            continue
+        if c in "'\"":
+            i += 1
+            while i < n:
+                if sql[i] == c:
+                    if sql.startswith(c * 2, i):  # doubled quote is an escaped quote
+                        i += 2
+                        continue
+                    break
+                i += 1
+            i += 1
+            has_code = True
+            continue
+        if c == "$":
+            end = sql.find("$", i + 1)
+            tag = sql[i:end + 1] if end != -1 else ""
+            if tag and (len(tag) == 2 or tag[1:-1].replace("_", "a").isalnum()) and not tag[1].isdigit():
+                close = sql.find(tag, end + 1)
+                i = n if close == -1 else close + len(tag)
+                has_code = True
+                continue
+        if c == ";":
+            if has_code:
+                statements.append(sql[start:i].strip())
+            start = i + 1
+            has_code = False
+        elif not c.isspace():
+            has_code = True
+        i += 1
+    if has_code and sql[start:].strip():
+        statements.append(sql[start:].strip())
+    return statements
+
+# ======================
+# Reports
+def run_reports(pool, workers, overrides=None, repeat=1):
+    """Run every report repeat times; runs after the first reuse the statements prepared by the first."""
+    queries = [query for _, group in QUERY_GROUPS for query in group]
+    for run in range(1, repeat + 1):
+        t0 = time.perf_counter()
+        results = run_concurrently(pool, queries, workers, overrides)
+        wall = time.perf_counter() - t0
+
+        if run == 1:
+            for name, rows, seconds in results:
+                print(f"{seconds * 1000:>9.1f} ms {len(rows):>5} rows  {name}")
+            print()
+        total = sum(seconds for _, _, seconds in results)
+        slowest = max(seconds for _, _, seconds in results)
+        print(f"run {run}: {len(results)} queries: wall {wall * 1000:.1f} ms, slowest {slowest * 1000:.1f} ms, "
+              f"sum of queries {total * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the report queries concurrently over a connection pool.")
+    add_connection_args(parser)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    reports_parser = subparsers.add_parser("reports", help="run every query in required_queries.py in parallel")
+    reports_parser.add_argument("--workers", type=int, default=8)
+    reports_parser.add_argument("--repeat", type=int, default=1, help="run the whole report set this many times")
+    add_query_args(reports_parser)
+    args = parser.parse_args()
+    check_rollup_range(reports_parser, args)
+
+    pool = DatabasePool.from_args(args, maxconn=args.workers)
+    try:
+        run_reports(pool, args.workers, query_overrides(args), args.repeat)
+    finally:
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
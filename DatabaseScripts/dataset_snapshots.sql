@@ -0,0 +1,15 @@
+-- Which dataset the tables hold, for setup_database.py load. Every load records
+-- the snapshot id of its files (csvPopulator.py --snapshot-dir, or a hash of
+-- the CSV files) and the data_versions total right after the COPYs. A later
+-- load of the same snapshot is skipped while that total is unchanged, i.e.
+-- nothing has written to the tables since (extend, the POS, manual edits).
+-- Run after data_versions.sql. Safe to re-run:
+--   python setup_database.py run dataset_snapshots.sql
+
+CREATE TABLE IF NOT EXISTS dataset_snapshots (
+id INT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+snapshot_id text NOT NULL,
+loaded_at timestamp NOT NULL DEFAULT LOCALTIMESTAMP,
+data_version BIGINT,
+config jsonb
+);
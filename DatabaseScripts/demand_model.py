@@ -0,0 +1,210 @@
+# demand model for the generated orders: hour-of-day and weekday curves, peak-day multipliers,
+# drinks per order and add-on / modifier attach rates. The expected value of an order follows in
+# closed form from the same parameters, so the number of orders that hits TOTAL_SALES_TARGET is
+# solved up front instead of by rerunning the generator.
+#
+#   python demand_model.py --end-date 2025-10-01        print the calibration and the expected curves
+
+import argparse
+import datetime
+import math
+
+import numpy as np
+
+# relative order volume per hour of the day; the shop is open 10:00-22:00 with a lunch rush and
+# an after-school peak
+HOUR_WEIGHTS = np.array([
+    0, 0, 0, 0, 0, 0, 0, 0, 0, 0,       # 00-09 closed
+    0.6, 1.0, 1.6, 1.5, 1.1, 1.3,       # 10-15
+    1.6, 1.4, 1.0, 1.1, 0.9, 0.5,       # 16-21
+    0, 0,                               # 22-23 closed
+])
+
+# relative order volume per weekday, Monday first
+WEEKDAY_WEIGHTS = np.array([0.85, 0.85, 0.9, 1.0, 1.2, 1.35, 1.05])
+
+# a peak day (game day) sees this many times the orders of the same weekday ...
+PEAK_DAY_VOLUME = 3.0
+# ... and bigger group orders: drinks per order are 1 + Poisson(mean), cut off at the menu size
+DRINKS_EXTRA_MEAN = 0.6
+PEAK_DRINKS_EXTRA_MEAN = 3.0
+MAX_DRINKS = 9
+
+# chance that a drink gets each topping (independently)
+ADDON_ATTACH_RATES = {
+    "Boba": 0.35,
+    "Crystal Boba": 0.08,
+    "Pudding": 0.06,
+    "Lychee Jelly": 0.06,
+    "Mango Popping Boba": 0.05,
+    "Strawberry Popping Boba": 0.05,
+    "Crema": 0.05,
+    "Coffee Jelly": 0.04,
+    "Honey Jelly": 0.04,
+    "Ice Cream": 0.03,
+}
+
+# modifiers that exclude each other: at most one per group and drink, with these chances
+ADDON_CHOICES = [
+    {"Less Ice": 0.20, "No Ice": 0.05},
+    {"Half Sweetness": 0.15, "Less Sweetness": 0.12, "Light Sweetness": 0.06, "No Sugar": 0.04},
+]
+
+# ----------------------------
+# When orders happen
+# ----------------------------
+def hour_slots(start_date, end_date, peaks=()):
+    """(slot start, slot seconds, weight) for every clock hour overlapping [start_date, end_date).
+
+    Edge hours are cut to the window, and their weight scaled by the part
+    that is inside, so every timestamp drawn from the slots is in the window.
+    """
+    start = np.datetime64(start_date.replace(microsecond=0), "s")
+    end = np.datetime64(end_date.replace(microsecond=0), "s")
+    hours = np.arange(start.astype("datetime64[h]"), end.astype("datetime64[h]") + 1)
+    slot_start = np.maximum(hours.astype("datetime64[s]"), start)
+    slot_end = np.minimum((hours + 1).astype("datetime64[s]"), end)
+    seconds = (slot_end - slot_start).astype(np.int64)
+    days = hours.astype("datetime64[D]")
+    weekday = (days.astype(np.int64) + 3) % 7  # 1970-01-01 was a Thursday
+    weight = HOUR_WEIGHTS[(hours - days).astype(np.int64)] * WEEKDAY_WEIGHTS[weekday] * seconds / 3600
+    weight = np.where(np.isin(days, np.array(list(peaks), dtype="datetime64[D]")), weight * PEAK_DAY_VOLUME, weight)
+    keep = seconds > 0
+    if not weight[keep].sum():
+        # a window that lies entirely in closed hours: fall back to uniform over its seconds
+        weight = seconds.astype(np.float64)
+    return slot_start[keep], seconds[keep], weight[keep]
+
+
+def sample_timestamps(rng, n, slots):
+    slot_start, seconds, weight = slots
+    slot = rng.choice(len(weight), n, p=weight / weight.sum())
+    return slot_start[slot] + (rng.random(n) * seconds[slot]).astype(np.int64)
+
+
+def peak_share(slots, peaks):
+    """Expected fraction of the orders that fall on peak days."""
+    slot_start, _, weight = slots
+    on_peak = np.isin(slot_start.astype("datetime64[D]"), np.array(list(peaks), dtype="datetime64[D]"))
+    return weight[on_peak].sum() / weight.sum()
+
+# ----------------------------
+# What is ordered
+# ----------------------------
+def drink_count_pmf(extra_mean, max_drinks):
+    """P(drinks = 1..max_drinks): 1 + Poisson(extra_mean), renormalized after the cut-off."""
+    k = np.arange(max_drinks)
+    pmf = np.exp(-extra_mean + k * math.log(extra_mean) - np.array([math.lgamma(i + 1) for i in k]))
+    return pmf / pmf.sum()
+
+
+def sample_drink_counts(rng, is_peak, max_drinks):
+    counts = np.empty(len(is_peak), dtype=np.int64)
+    u = rng.random(len(is_peak))
+    for mask, extra_mean in ((~is_peak, DRINKS_EXTRA_MEAN), (is_peak, PEAK_DRINKS_EXTRA_MEAN)):
+        cdf = np.cumsum(drink_count_pmf(extra_mean, max_drinks))
+        counts[mask] = np.minimum(np.searchsorted(cdf, u[mask], side="right"), max_drinks - 1) + 1
+    return counts
+
+
+def addon_options(addons):
+    """[(addon index, chance, choice group or None)] for the add-ons on offer (names not listed never attach)."""
+    index = {name: i for i, (name, _, _) in enumerate(addons)}
+    options = [(index[name], rate, None) for name, rate in ADDON_ATTACH_RATES.items() if name in index]
+    for group, choices in enumerate(ADDON_CHOICES):
+        options += [(index[name], rate, group) for name, rate in choices.items() if name in index]
+    return options
+
+
+def sample_addons(rng, num_drinks, addons):
+    """(num_drinks, len(addons)) bool matrix of the add-ons attached to each drink."""
+    attached = np.zeros((num_drinks, len(addons)), dtype=bool)
+    options = addon_options(addons)
+    toppings = [(i, rate) for i, rate, group in options if group is None]
+    if toppings:
+        columns, rates = zip(*toppings)
+        attached[:, list(columns)] = rng.random((num_drinks, len(rates))) < np.array(rates)
+    for group in range(len(ADDON_CHOICES)):
+        choices = [(i, rate) for i, rate, g in options if g == group]
+        if not choices:
+            continue
+        columns, rates = zip(*choices)
+        pick = np.searchsorted(np.cumsum(rates), rng.random(num_drinks), side="right")
+        chosen = pick < len(columns)
+        attached[np.flatnonzero(chosen), np.array(columns)[pick[chosen]]] = True
+    return attached
+
+# ----------------------------
+# Calibration
+# ----------------------------
+def order_value_moments(menu, addons, pmf):
+    """(mean, variance) of one order's total in cents for a drink-count distribution.
+
+    Drinks are distinct menu items (sampling without replacement), add-ons
+    attach per drink as in sample_addons.
+    """
+    prices = np.array([round(price * 100) for (_, price, _) in menu], dtype=np.float64)
+    addon_prices = np.array([round(price * 100) for (_, price, _) in addons], dtype=np.float64)
+    addon_mean = addon_var = 0.0
+    for group in [None] + list(range(len(ADDON_CHOICES))):
+        options = [(addon_prices[i], rate) for i, rate, g in addon_options(addons) if g == group]
+        if group is None:
+            addon_mean += sum(rate * p for p, rate in options)
+            addon_var += sum(rate * (1 - rate) * p * p for p, rate in options)
+        elif options:
+            mean = sum(rate * p for p, rate in options)
+            addon_mean += mean
+            addon_var += sum(rate * p * p for p, rate in options) - mean * mean
+    m = len(prices)
+    drinks = np.arange(1, len(pmf) + 1)
+    per_drink = prices.mean() + addon_mean
+    # sum of d of m prices drawn without replacement: d * var * (m - d) / (m - 1)
+    conditional_var = drinks * prices.var() * (m - drinks) / max(m - 1, 1) + drinks * addon_var
+    mean = float((pmf * drinks).sum() * per_drink)
+    variance = float((pmf * (conditional_var + (drinks * per_drink) ** 2)).sum() - mean ** 2)
+    return mean, variance
+
+
+def expected_order_value(start_date, end_date, peaks, menu, addons):
+    """(mean, variance) in cents of a random order in the window, peak days mixed in by their share."""
+    max_drinks = min(MAX_DRINKS, len(menu))
+    share = peak_share(hour_slots(start_date, end_date, peaks), peaks) if peaks else 0.0
+    normal = order_value_moments(menu, addons, drink_count_pmf(DRINKS_EXTRA_MEAN, max_drinks))
+    peak = order_value_moments(menu, addons, drink_count_pmf(PEAK_DRINKS_EXTRA_MEAN, max_drinks))
+    mean = (1 - share) * normal[0] + share * peak[0]
+    second_moment = (1 - share) * (normal[1] + normal[0] ** 2) + share * (peak[1] + peak[0] ** 2)
+    return mean, second_moment - mean ** 2
+
+
+def calibrate(target, start_date, end_date, peaks, menu, addons):
+    """(number of orders, expected revenue, relative standard deviation of the revenue) for a sales target."""
+    mean, variance = expected_order_value(start_date, end_date, peaks, menu, addons)
+    num_orders = max(1, round(target * 100 / mean))
+    return num_orders, num_orders * mean / 100, math.sqrt(variance / num_orders) / mean
+
+
+def main():
+    import csvPopulator
+
+    parser = argparse.ArgumentParser(description="Show the demand model calibration for the csvPopulator.py catalog.")
+    parser.add_argument("--target", type=float, default=csvPopulator.TOTAL_SALES_TARGET, help="sales target in dollars")
+    parser.add_argument("--end-date", type=datetime.datetime.fromisoformat, help="last day of the window (default: now)")
+    args = parser.parse_args()
+
+    start_date, end_date = csvPopulator.date_window(args.end_date)
+    peaks = csvPopulator.pick_peaks(start_date, end_date)
+    num_orders, revenue, spread = calibrate(args.target, start_date, end_date, peaks, csvPopulator.MENU_ITEMS,
+                                            csvPopulator.ADDON_ITEMS)
+    mean, _ = expected_order_value(start_date, end_date, peaks, csvPopulator.MENU_ITEMS, csvPopulator.ADDON_ITEMS)
+    print(f"{num_orders:,} orders x ${mean / 100:.2f} expected per order = ${revenue:,.0f} "
+          f"(target ${args.target:,.0f}, revenue standard deviation {spread:.2%})")
+    print(f"peak days {', '.join(str(day) for day in peaks)}")
+    _, _, weight = slots = hour_slots(start_date, end_date, peaks)
+    hours = (slots[0] - slots[0].astype("datetime64[D]")).astype("timedelta64[h]").astype(np.int64)
+    by_hour = np.bincount(hours, weights=weight, minlength=24) / weight.sum()
+    for hour in np.flatnonzero(by_hour):
+        print(f"    {hour:02d}:00  {by_hour[hour]:6.1%}  {'#' * round(by_hour[hour] * 200)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+# links generated sales to stock: per-day ingredient usage from joint_recipe_ingredients, a daily
+# stock time series with restock events, and (optionally) the final stock written back to the inventory
+# quantities (inventory.csv, plain or compressed, or the columnar.py column). A csvPopulator.py
+# --snapshot-dir snapshot is read-only: write the reports elsewhere with --out-dir.
+#
+#   python inventory_simulation.py --data-dir . --threshold 0.2 --update-inventory
+#   python inventory_simulation.py --data-dir snapshots/<id> --out-dir reports
+
+import argparse
+import csv
+import os
+import time
+
+import numpy as np
+
+import columnar
+import csvPopulator
+import snapshots
+from data_files import find_data_file, open_data_file
+from offline_analytics import load_dataset
+
+
+def usage_by_day(ds):
+    """(days, usage) where usage[d, j] is inventory item j+1 used on days[d].
+
+    Order item quantities are accumulated into a (day x menu item) count matrix
+    with one bincount over flattened coordinates, then multiplied by the (menu item x
+    inventory item) recipe matrix. Both matrices are tiny (days x 36, 36 x 25),
+    so the product is a dense matmul no matter how many orders there are.
+    """
+    num_menu = max(item_id for (item_id, _, _) in ds.menu_items)
+    num_inventory = max(item_id for (item_id, _, _) in ds.inventory)
+
+    order_days = ds.timestamps.astype("datetime64[D]")
+    first_day = order_days.min()
+    num_days = int((order_days.max() - first_day).astype(np.int64)) + 1
+    day_index = (order_days - first_day).astype(np.int64)
+
+    # orders.csv isn't necessarily in id order (extended or hand-edited datasets)
+    by_id_order = np.argsort(ds.order_ids, kind="stable")
+    sorted_ids = ds.order_ids[by_id_order]
+    position = np.minimum(np.searchsorted(sorted_ids, ds.item_order_ids), len(sorted_ids) - 1)
+    unknown = sorted_ids[position] != ds.item_order_ids
+    if unknown.any():
+        raise ValueError(f"{int(unknown.sum()):,} order items belong to orders missing from orders.csv "
+                         f"(first: order {ds.item_order_ids[unknown][0]})")
+    item_day = day_index[by_id_order[position]]
+    counts = np.bincount(item_day * num_menu + (ds.item_menu_ids - 1), weights=ds.item_quantities,
+                         minlength=num_days * num_menu).astype(np.int64).reshape(num_days, num_menu)
+
+    recipe = np.zeros((num_menu, num_inventory), dtype=np.int64)
+    for menu_item_id, inventory_item_id, quantity_used in ds.recipes:
+        recipe[menu_item_id - 1, inventory_item_id - 1] += quantity_used
+
+    days = first_day + np.arange(num_days)
+    return days, counts @ recipe
+
+
+def simulate_stock(usage, initial, threshold):
+    """Run stock forward one day at a time, restocking back to the initial level.
+
+    An item is restocked at the end of any day it closes below threshold *
+    its initial quantity. Returns (stock at end of each day, restock events as
+    (day index, item index, quantity, stockout) where stockout is the
+    unserved amount if the item ran out).
+    """
+    stock = initial.astype(np.int64).copy()
+    reorder_level = np.ceil(initial * threshold).astype(np.int64)
+    history = np.empty_like(usage)
+    restocks = []
+    for day in range(len(usage)):
+        stock -= usage[day]
+        low = np.flatnonzero(stock < reorder_level)
+        for item in low:
+            restocks.append((day, item, int(initial[item] - stock[item]), int(max(0, -stock[item]))))
+        stock[low] = initial[low]
+        history[day] = stock
+    return history, restocks
+
+
+def write_rows(path, header, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def update_inventory(data_dir, quantities):
+    """Write quantities into the inventory quantity column of data_dir, in the form the dataset is in."""
+    if columnar.is_columnar(data_dir):
+        columnar.update_column(data_dir, "inventory", "quantity", quantities)
+        return
+    path = find_data_file(data_dir, "inventory.csv")
+    with open_data_file(path) as f:
+        rows = list(csv.reader(f))
+    for row, quantity in zip(rows[1:], quantities):
+        row[2] = int(quantity)
+    # rewrite it with the same compression
+    filename = os.path.join(data_dir, "inventory.csv")
+    compress = {suffix: compress for compress, suffix in csvPopulator.COMPRESSION_SUFFIXES.items()}[path[len(filename):]]
+    csvPopulator.write_csv(filename, rows[0], rows[1:], compress)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate inventory depletion from the generated orders.")
+    parser.add_argument("--data-dir", default=".", help="directory holding the csvPopulator.py output")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="restock when an item closes a day below this fraction of its starting quantity")
+    parser.add_argument("--update-inventory", action="store_true",
+                        help="write the final stock into the inventory quantities of the dataset")
+    parser.add_argument("--out-dir", help="directory for inventory_daily.csv / inventory_restocks.csv "
+                                          "(default: --data-dir)")
+    args = parser.parse_args()
+    args.out_dir = args.out_dir or args.data_dir
+    # writing into a snapshot would leave it under an id that no longer matches its files
+    if snapshots.read_snapshot(args.data_dir) is not None:
+        if args.update_inventory:
+            parser.error(f"{args.data_dir} is a csvPopulator.py snapshot; copy it elsewhere before --update-inventory")
+        if os.path.realpath(args.out_dir) == os.path.realpath(args.data_dir):
+            parser.error(f"{args.data_dir} is a csvPopulator.py snapshot; write the reports elsewhere with --out-dir")
+
+    t0 = time.perf_counter()
+    ds = load_dataset(args.data_dir)
+    days, usage = usage_by_day(ds)
+    initial = np.array([quantity for (_, _, quantity) in ds.inventory])
+    history, restocks = simulate_stock(usage, initial, args.threshold)
+    elapsed = time.perf_counter() - t0
+
+    inventory_ids = [item_id for (item_id, _, _) in ds.inventory]
+    names = [name for (_, name, _) in ds.inventory]
+    day_strings = days.astype(str).tolist()
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    write_rows(os.path.join(args.out_dir, "inventory_daily.csv"),
+               ["day", "inventory_item_id", "used", "stock"],
+               ((day_strings[d], inventory_ids[j], int(usage[d, j]), int(history[d, j]))
+                for d in range(len(days)) for j in range(len(inventory_ids))))
+    write_rows(os.path.join(args.out_dir, "inventory_restocks.csv"),
+               ["day", "inventory_item_id", "quantity", "stockout"],
+               ((day_strings[d], inventory_ids[j], quantity, stockout) for (d, j, quantity, stockout) in restocks))
+
+    if args.update_inventory:
+        update_inventory(args.data_dir, history[-1])
+
+    print(f"simulated {len(days)} days x {len(inventory_ids)} inventory items from "
+          f"{len(ds.item_order_ids):,} order items in {elapsed:.2f}s, {len(restocks)} restocks")
+    print("lowest at end of period:")
+    for j in np.argsort(history[-1])[:5]:
+        print(f"    {names[j]:<20} {int(history[-1, j]):>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+# customer pearl balances kept by loyalty_ledger.sql: look balances up the way the register does
+# (customers.pearls by primary key), rebuild the ledger from the order history, and verify that
+# the incrementally maintained ledger matches a full recompute.
+#
+#   python loyalty_ledger.py [connection flags] balance 17 42     balance and breakdown per customer
+#   python loyalty_ledger.py [connection flags] backfill          one set-based rebuild from all orders
+#   python loyalty_ledger.py [connection flags] verify            ledger vs a full recompute (exit 1 on drift)
+
+import argparse
+import time
+
+import database
+
+BALANCE_SQL = (
+    "SELECT c.id, c.name, c.pearls, l.base_pearls, l.earned_pearls, l.order_count "
+    "FROM customers c LEFT JOIN loyalty_ledger l ON l.customer_id = c.id "
+    "WHERE c.id = %s;")
+
+# every customer / ledger row whose stored numbers differ from the recompute over all orders
+VERIFY_SQL = """
+WITH recomputed AS (
+    SELECT customer_id, SUM(pearls_earned) AS earned_pearls, COUNT(*) AS order_count
+    FROM orders WHERE customer_id IS NOT NULL GROUP BY customer_id
+)
+SELECT COALESCE(c.id, l.customer_id), c.pearls, l.base_pearls, l.earned_pearls, l.order_count,
+       COALESCE(r.earned_pearls, 0), COALESCE(r.order_count, 0)
+FROM customers c
+FULL JOIN loyalty_ledger l ON l.customer_id = c.id
+LEFT JOIN recomputed r ON r.customer_id = COALESCE(c.id, l.customer_id)
+WHERE c.id IS NULL OR l.customer_id IS NULL
+   OR l.earned_pearls <> COALESCE(r.earned_pearls, 0)
+   OR l.order_count <> COALESCE(r.order_count, 0)
+   OR c.pearls <> l.base_pearls + l.earned_pearls
+ORDER BY 1;
+"""
+
+# ----------------------------
+# Commands
+# ----------------------------
+def show_balances(conn, customer_ids):
+    with conn.cursor() as cur:
+        for customer_id in customer_ids:
+            t0 = time.perf_counter()
+            cur.execute(BALANCE_SQL, (customer_id,))
+            row = cur.fetchone()
+            elapsed_ms = (time.perf_counter() - t0) * 1000
+            if row is None:
+                print(f"customer {customer_id}: not found")
+                continue
+            _, name, pearls, base, earned, orders = row
+            print(f"customer {customer_id} ({name}): {pearls:,} pearls = {base or 0:,} base + {earned or 0:,} "
+                  f"earned over {orders or 0:,} orders ({elapsed_ms:.2f} ms)")
+    conn.rollback()
+
+
+def backfill(conn):
+    t0 = time.perf_counter()
+    with conn.cursor() as cur:
+        cur.execute("SELECT rebuild_loyalty_ledger();")
+        cur.execute("SELECT COUNT(*), COALESCE(SUM(earned_pearls), 0), COALESCE(SUM(order_count), 0) "
+                    "FROM loyalty_ledger;")
+        customers, earned, orders = cur.fetchone()
+    conn.commit()
+    print(f"rebuilt {customers:,} customers ({earned:,} pearls earned over {orders:,} orders) "
+          f"in {time.perf_counter() - t0:.2f}s")
+
+
+def verify(conn, max_rows=10):
+    """Print the rows where the ledger and the recompute disagree; returns how many there are."""
+    t0 = time.perf_counter()
+    with conn.cursor() as cur:
+        cur.execute(VERIFY_SQL)
+        mismatches = cur.fetchall()
+        cur.execute("SELECT COUNT(*) FROM customers;")
+        customers = cur.fetchone()[0]
+    conn.rollback()
+    for customer_id, pearls, base, earned, orders, expected_earned, expected_orders in mismatches[:max_rows]:
+        if pearls is None:
+            print(f"    customer {customer_id}: ledger row without a customer")
+        elif base is None:
+            print(f"    customer {customer_id}: no ledger row")
+        else:
+            print(f"    customer {customer_id}: pearls {pearls:,} (ledger {base + earned:,}), earned {earned:,} "
+                  f"(orders say {expected_earned:,}), orders {orders:,} (orders say {expected_orders:,})")
+    if len(mismatches) > max_rows:
+        print(f"    ... and {len(mismatches) - max_rows:,} more")
+    status = "ok" if not mismatches else f"{len(mismatches):,} customers differ"
+    print(f"{status}: {customers:,} customers checked against a full recompute in {time.perf_counter() - t0:.2f}s")
+    return len(mismatches)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Look up, rebuild or verify the customer loyalty ledger.")
+    database.add_connection_args(parser)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    balance_parser = subparsers.add_parser("balance", help="balance and breakdown of customers by id")
+    balance_parser.add_argument("customer_ids", type=int, nargs="+")
+    subparsers.add_parser("backfill", help="recompute the ledger from the full order history")
+    verify_parser = subparsers.add_parser("verify", help="compare the ledger with a full recompute")
+    verify_parser.add_argument("--max-rows", type=int, default=10, help="mismatching customers to print")
+    args = parser.parse_args()
+
+    conn = database.connect(args)
+    try:
+        if args.command == "balance":
+            show_balances(conn, args.customer_ids)
+        elif args.command == "backfill":
+            backfill(conn)
+        elif verify(conn, args.max_rows):
+            raise SystemExit(1)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
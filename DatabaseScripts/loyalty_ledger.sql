@@ -0,0 +1,175 @@
+-- Customer loyalty ledger: keeps customers.pearls equal to the customer's base
+-- pearls (the starting balance plus any direct edits, e.g. redemptions) plus
+-- the pearls_earned of all their orders, so the register reads a balance by
+-- primary key instead of summing the order history. Statement-level triggers
+-- on orders apply each INSERT/UPDATE/DELETE (COPY included) as one grouped
+-- delta per customer; voiding an order is deleting it (or zeroing its
+-- pearls_earned). rebuild_loyalty_ledger() recomputes the whole ledger in one
+-- set-based pass; loyalty_ledger.py verify checks it against a full recompute.
+-- Safe to re-run on an existing database; the first run takes each customer's
+-- current pearls as their base and adds their order history on top:
+--   python setup_database.py run loyalty_ledger.sql
+
+CREATE TABLE IF NOT EXISTS loyalty_ledger (
+customer_id INT PRIMARY KEY,
+base_pearls BIGINT NOT NULL DEFAULT 0,
+earned_pearls BIGINT NOT NULL DEFAULT 0,
+order_count INT NOT NULL DEFAULT 0
+);
+
+-- customers.pearls := base + earned for the given ledger rows. Marked as a sync
+-- for the rest of the statement, so loyalty_customers_trigger() doesn't book it
+-- as a direct edit.
+CREATE OR REPLACE FUNCTION sync_customer_pearls(customer_ids INT[] DEFAULT NULL)
+RETURNS void AS $$
+BEGIN
+    PERFORM set_config('loyalty_ledger.syncing', 'on', true);
+    UPDATE customers c SET pearls = l.base_pearls + l.earned_pearls
+    FROM loyalty_ledger l
+    WHERE c.id = l.customer_id AND c.pearls <> l.base_pearls + l.earned_pearls
+      AND (customer_ids IS NULL OR l.customer_id = ANY(customer_ids));
+    PERFORM set_config('loyalty_ledger.syncing', 'off', true);
+END;
+$$ LANGUAGE plpgsql;
+
+-- rebuild earned pearls and order counts from the full orders history (backfill / repair)
+CREATE OR REPLACE FUNCTION rebuild_loyalty_ledger()
+RETURNS void AS $$
+BEGIN
+    -- no order writes while the totals are recomputed, so no trigger delta is lost
+    LOCK TABLE orders IN SHARE MODE;
+    INSERT INTO loyalty_ledger (customer_id, base_pearls)
+    SELECT id, pearls FROM customers
+    ON CONFLICT (customer_id) DO NOTHING;
+    DELETE FROM loyalty_ledger l WHERE NOT EXISTS (SELECT 1 FROM customers c WHERE c.id = l.customer_id);
+
+    UPDATE loyalty_ledger l
+    SET earned_pearls = totals.earned_pearls, order_count = totals.order_count
+    FROM (
+        SELECT l.customer_id, COALESCE(o.earned_pearls, 0) AS earned_pearls, COALESCE(o.order_count, 0) AS order_count
+        FROM loyalty_ledger l
+        LEFT JOIN (
+            SELECT customer_id, SUM(pearls_earned) AS earned_pearls, COUNT(*)::INT AS order_count
+            FROM orders WHERE customer_id IS NOT NULL GROUP BY customer_id
+        ) o ON o.customer_id = l.customer_id
+    ) totals
+    WHERE l.customer_id = totals.customer_id
+      AND (l.earned_pearls, l.order_count) IS DISTINCT FROM (totals.earned_pearls, totals.order_count);
+
+    PERFORM sync_customer_pearls();
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION loyalty_orders_trigger()
+RETURNS trigger AS $$
+DECLARE
+    changed text;
+    touched INT[];
+BEGIN
+    -- new_orders / old_orders are the statement's transition tables
+    changed := CASE TG_OP
+        WHEN 'INSERT' THEN 'SELECT customer_id, pearls_earned, 1 AS sign FROM new_orders'
+        WHEN 'DELETE' THEN 'SELECT customer_id, pearls_earned, -1 AS sign FROM old_orders'
+        ELSE 'SELECT customer_id, pearls_earned, 1 AS sign FROM new_orders '
+             'UNION ALL SELECT customer_id, pearls_earned, -1 FROM old_orders'
+    END;
+
+    EXECUTE format($sql$
+        WITH delta AS (
+            SELECT customer_id, SUM(sign * COALESCE(pearls_earned, 0)) AS earned_pearls,
+                   SUM(sign)::INT AS order_count
+            FROM (%s) changed
+            WHERE customer_id IS NOT NULL
+            GROUP BY customer_id
+        ),
+        applied AS (
+            UPDATE loyalty_ledger l
+            SET earned_pearls = l.earned_pearls + delta.earned_pearls,
+                order_count = l.order_count + delta.order_count
+            FROM delta
+            WHERE l.customer_id = delta.customer_id AND (delta.earned_pearls <> 0 OR delta.order_count <> 0)
+            RETURNING l.customer_id
+        )
+        SELECT array_agg(customer_id) FROM applied
+    $sql$, changed) INTO touched;
+
+    IF touched IS NOT NULL THEN
+        PERFORM sync_customer_pearls(touched);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION loyalty_orders_truncate()
+RETURNS trigger AS $$
+BEGIN
+    UPDATE loyalty_ledger SET earned_pearls = 0, order_count = 0
+    WHERE earned_pearls <> 0 OR order_count <> 0;
+    PERFORM sync_customer_pearls();
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- new customers open a ledger row with their pearls as base, deleted ones close it,
+-- and direct edits of customers.pearls (redemptions, corrections) move the base
+CREATE OR REPLACE FUNCTION loyalty_customers_trigger()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO loyalty_ledger (customer_id, base_pearls)
+        SELECT id, pearls FROM new_customers
+        ON CONFLICT (customer_id) DO UPDATE
+        SET base_pearls = EXCLUDED.base_pearls, earned_pearls = 0, order_count = 0;
+    ELSIF TG_OP = 'DELETE' THEN
+        DELETE FROM loyalty_ledger l USING old_customers o WHERE l.customer_id = o.id;
+    ELSIF TG_OP = 'TRUNCATE' THEN
+        TRUNCATE loyalty_ledger;
+    ELSIF current_setting('loyalty_ledger.syncing', true) IS DISTINCT FROM 'on' THEN
+        UPDATE loyalty_ledger l SET base_pearls = l.base_pearls + n.pearls - o.pearls
+        FROM new_customers n JOIN old_customers o ON o.id = n.id
+        WHERE l.customer_id = n.id AND n.pearls <> o.pearls;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS loyalty_ledger_insert ON orders;
+CREATE TRIGGER loyalty_ledger_insert AFTER INSERT ON orders
+REFERENCING NEW TABLE AS new_orders
+FOR EACH STATEMENT EXECUTE FUNCTION loyalty_orders_trigger();
+
+DROP TRIGGER IF EXISTS loyalty_ledger_update ON orders;
+CREATE TRIGGER loyalty_ledger_update AFTER UPDATE ON orders
+REFERENCING OLD TABLE AS old_orders NEW TABLE AS new_orders
+FOR EACH STATEMENT EXECUTE FUNCTION loyalty_orders_trigger();
+
+DROP TRIGGER IF EXISTS loyalty_ledger_delete ON orders;
+CREATE TRIGGER loyalty_ledger_delete AFTER DELETE ON orders
+REFERENCING OLD TABLE AS old_orders
+FOR EACH STATEMENT EXECUTE FUNCTION loyalty_orders_trigger();
+
+DROP TRIGGER IF EXISTS loyalty_ledger_truncate ON orders;
+CREATE TRIGGER loyalty_ledger_truncate AFTER TRUNCATE ON orders
+FOR EACH STATEMENT EXECUTE FUNCTION loyalty_orders_truncate();
+
+DROP TRIGGER IF EXISTS loyalty_ledger_insert ON customers;
+CREATE TRIGGER loyalty_ledger_insert AFTER INSERT ON customers
+REFERENCING NEW TABLE AS new_customers
+FOR EACH STATEMENT EXECUTE FUNCTION loyalty_customers_trigger();
+
+DROP TRIGGER IF EXISTS loyalty_ledger_update ON customers;
+CREATE TRIGGER loyalty_ledger_update AFTER UPDATE ON customers
+REFERENCING OLD TABLE AS old_customers NEW TABLE AS new_customers
+FOR EACH STATEMENT EXECUTE FUNCTION loyalty_customers_trigger();
+
+DROP TRIGGER IF EXISTS loyalty_ledger_delete ON customers;
+CREATE TRIGGER loyalty_ledger_delete AFTER DELETE ON customers
+REFERENCING OLD TABLE AS old_customers
+FOR EACH STATEMENT EXECUTE FUNCTION loyalty_customers_trigger();
+
+DROP TRIGGER IF EXISTS loyalty_ledger_truncate ON customers;
+CREATE TRIGGER loyalty_ledger_truncate AFTER TRUNCATE ON customers
+FOR EACH STATEMENT EXECUTE FUNCTION loyalty_customers_trigger();
+
+-- backfill whatever is already in customers and orders
+SELECT rebuild_loyalty_ledger();
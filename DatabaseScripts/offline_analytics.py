@@ -0,0 +1,409 @@
+# offline versions of the queries in required_queries.py, computed with NumPy straight from the
+# csvPopulator.py CSV files (no database needed)
+#
+#   python offline_analytics.py --data-dir .                          print every report
+#   python offline_analytics.py --data-dir . check [connection flags]  cross-check against the SQL results
+
+import argparse
+import csv
+import datetime
+import sys
+import time
+from collections import namedtuple
+
+import numpy as np
+
+import columnar
+from data_files import find_data_file, open_data_file
+from required_queries import QUERY_GROUPS, add_query_args, check_rollup_range, query_overrides, query_params
+from required_queries import DEFAULT_END as SQL_DEFAULT_END, DEFAULT_START as SQL_DEFAULT_START
+
+try:
+    import database  # needs psycopg2, only used by the "check" command
+except ImportError:
+    database = None
+
+# the default range of the date-bounded queries in required_queries.py
+DEFAULT_START = np.datetime64(SQL_DEFAULT_START, "s")
+DEFAULT_END = np.datetime64(SQL_DEFAULT_END, "s")
+
+# ----------------------------
+# Loading
+# ----------------------------
+# Columnar copy of the generated dataset. Money is kept in integer cents so
+# sums are exact; small tables stay as Python lists.
+Dataset = namedtuple("Dataset", [
+    "order_ids", "customer_ids", "timestamps", "total_cents", "employee_ids",
+    "item_order_ids", "item_menu_ids", "item_quantities", "item_unit_cents",
+    "menu_items", "inventory", "recipes",
+])
+
+
+def read_small_csv(data_dir, filename):
+    with open_data_file(find_data_file(data_dir, filename)) as f:
+        reader = csv.reader(f)
+        next(reader)
+        return list(reader)
+
+
+def read_columns(data_dir, filename, usecols, dtype):
+    with open_data_file(find_data_file(data_dir, filename)) as f:
+        return np.loadtxt(f, delimiter=",", skiprows=1, usecols=usecols, dtype=dtype, ndmin=1)
+
+
+def load_dataset(data_dir):
+    """Load the csvPopulator.py outputs in data_dir (CSV or columnar.py form) into a Dataset."""
+    if columnar.is_columnar(data_dir):
+        return load_columnar_dataset(data_dir)
+    orders = read_columns(data_dir, "orders.csv", (0, 1, 3, 5), np.float64).reshape(-1, 4)
+    timestamps = read_columns(data_dir, "orders.csv", (2,), "datetime64[s]")
+    items = read_columns(data_dir, "joint_order_items.csv", (0, 1, 3, 4), np.float64).reshape(-1, 4)
+
+    menu_items = [(int(r[0]), r[1], float(r[2])) for r in read_small_csv(data_dir, "menu_items.csv")]
+    inventory = [(int(r[0]), r[1], int(r[2])) for r in read_small_csv(data_dir, "inventory.csv")]
+    recipes = [tuple(int(v) for v in r) for r in read_small_csv(data_dir, "joint_recipe_ingredients.csv")]
+
+    return Dataset(
+        order_ids=orders[:, 0].astype(np.int64),
+        customer_ids=orders[:, 1].astype(np.int64),
+        timestamps=timestamps,
+        total_cents=np.rint(orders[:, 2] * 100).astype(np.int64),
+        employee_ids=orders[:, 3].astype(np.int64),
+        item_order_ids=items[:, 0].astype(np.int64),
+        item_menu_ids=items[:, 1].astype(np.int64),
+        item_quantities=items[:, 2].astype(np.int64),
+        item_unit_cents=np.rint(items[:, 3] * 100).astype(np.int64),
+        menu_items=menu_items,
+        inventory=inventory,
+        recipes=recipes,
+    )
+
+def load_columnar_dataset(data_dir):
+    """Dataset over the memory-mapped columns of a columnar.py directory (no parsing, no copies)."""
+    tables = columnar.open_columnar(data_dir)
+    orders, items = tables["orders"], tables["joint_order_items"]
+    menu, inventory, recipes = tables["menu_items"], tables["inventory"], tables["joint_recipe_ingredients"]
+    return Dataset(
+        order_ids=orders["id"],
+        customer_ids=orders["customer_id"],
+        timestamps=orders["timestamp"],
+        total_cents=orders["total_price"],
+        employee_ids=orders["employee_id"],
+        item_order_ids=items["order_id"],
+        item_menu_ids=items["menu_item_id"],
+        item_quantities=items["quantity"],
+        item_unit_cents=items["unit_price"],
+        menu_items=list(zip(menu["id"].tolist(), menu["name"].tolist(), (menu["price"] / 100).tolist())),
+        inventory=list(zip(inventory["id"].tolist(), inventory["name"].tolist(), inventory["quantity"].tolist())),
+        recipes=list(zip(recipes["menu_item_id"].tolist(), recipes["inventory_item_id"].tolist(),
+                         recipes["quantity_used"].tolist())),
+    )
+
+# ----------------------------
+# Vectorized building blocks
+# ----------------------------
+def money(cents):
+    return round(int(cents) / 100, 2)
+
+
+def in_range(ds, start, end):
+    return (ds.timestamps >= start) & (ds.timestamps < end)
+
+
+def group_count(keys):
+    """(unique keys, count per key)"""
+    return np.unique(keys, return_counts=True)
+
+
+def group_sum(keys, values):
+    """(unique keys, sum of values per key)"""
+    uniques, inverse = np.unique(keys, return_inverse=True)
+    return uniques, np.bincount(inverse, weights=values, minlength=len(uniques)).astype(np.int64)
+
+
+def top_k(keys, values, k, descending=True):
+    """Indexes of the k best values (ties broken by key), best first."""
+    k = min(k, len(values))
+    if k == 0:
+        return np.array([], dtype=np.int64)
+    signed = -values if descending else values
+    if k < len(values):
+        # only sort what can make the cut: everything at or better than the k-th value
+        cutoff = np.partition(signed, k - 1)[k - 1]
+        candidates = np.flatnonzero(signed <= cutoff)
+    else:
+        candidates = np.arange(len(values))
+    order = np.lexsort((keys[candidates], signed[candidates]))
+    return candidates[order[:k]]
+
+
+def order_days(ds, mask=None):
+    days = ds.timestamps.astype("datetime64[D]")
+    return days if mask is None else days[mask]
+
+
+def iso_thursdays(days):
+    # the Thursday of a day's ISO week identifies that week (1970-01-01 was a Thursday)
+    as_int = days.astype(np.int64)
+    weekday = (as_int + 3) % 7  # Monday = 0
+    return as_int - weekday + 3
+
+
+def iso_week_numbers(days):
+    thursdays = iso_thursdays(days).astype("datetime64[D]")
+    year_start = thursdays.astype("datetime64[Y]").astype("datetime64[D]")
+    return (thursdays - year_start).astype(np.int64) // 7 + 1
+
+
+def to_date(day):
+    return day.astype(datetime.date)
+
+# ----------------------------
+# Queries (same names and result columns as required_queries.py)
+# ----------------------------
+def number_of_weeks(ds):
+    return [(len(np.unique(iso_thursdays(order_days(ds)))),)]
+
+
+def total_sales(ds):
+    return [(money(ds.total_cents.sum()),)]
+
+
+def number_of_peak_days(ds):
+    _, daily = group_sum(order_days(ds), ds.total_cents)
+    daily = daily / 100
+    threshold = daily.mean() + 2 * daily.std(ddof=1)
+    return [(int((daily > threshold).sum()),)]
+
+
+def number_of_menu_items(ds):
+    return [(len(ds.menu_items),)]
+
+
+def top_customers_by_orders(ds, start=DEFAULT_START, end=DEFAULT_END, limit=10):
+    customers, counts = group_count(ds.customer_ids[in_range(ds, start, end)])
+    return [(int(customers[i]), int(counts[i])) for i in top_k(customers, counts, limit)]
+
+
+def top_customers_by_spending(ds, start=DEFAULT_START, end=DEFAULT_END, limit=10):
+    mask = in_range(ds, start, end)
+    customers, cents = group_sum(ds.customer_ids[mask], ds.total_cents[mask])
+    return [(int(customers[i]), money(cents[i])) for i in top_k(customers, cents, limit)]
+
+
+def top_employees_by_orders(ds, limit=5):
+    employees, counts = group_count(ds.employee_ids)
+    return [(int(employees[i]), int(counts[i])) for i in top_k(employees, counts, limit)]
+
+
+def top_employees_by_revenue(ds, limit=5):
+    employees, cents = group_sum(ds.employee_ids, ds.total_cents)
+    return [(int(employees[i]), money(cents[i])) for i in top_k(employees, cents, limit)]
+
+
+def menu_item_popularity(ds, limit=10, descending=True):
+    items, counts = group_count(ds.item_menu_ids)
+    return [(int(items[i]), int(counts[i])) for i in top_k(items, counts, limit, descending)]
+
+
+def inventory_by_quantity(ds, limit=5, descending=False):
+    ids = np.array([row[0] for row in ds.inventory])
+    quantities = np.array([row[2] for row in ds.inventory])
+    return [(ds.inventory[i][1], ds.inventory[i][2]) for i in top_k(ids, quantities, limit, descending)]
+
+
+def average_order_value(ds):
+    return [(round(ds.total_cents.mean() / 100, 2),)]
+
+
+def busiest_days(ds, limit=5):
+    days, counts = group_count(order_days(ds))
+    return [(to_date(days[i]), int(counts[i])) for i in top_k(days.astype(np.int64), counts, limit)]
+
+
+def lowest_sales_days(ds, limit=5):
+    days, cents = group_sum(order_days(ds), ds.total_cents)
+    return [(to_date(days[i]), money(cents[i]))
+            for i in top_k(days.astype(np.int64), cents, limit, descending=False)]
+
+
+def menu_items_by_ingredient_count(ds, limit=5):
+    items, counts = group_count(np.array([r[0] for r in ds.recipes]))
+    return [(int(items[i]), int(counts[i])) for i in top_k(items, counts, limit)]
+
+
+def top_sales_months(ds, limit=5):
+    months = ds.timestamps.astype("datetime64[M]").astype(np.int64) % 12 + 1
+    month_numbers, cents = group_sum(months, ds.total_cents)
+    return [(int(month_numbers[i]), money(cents[i])) for i in top_k(month_numbers, cents, limit)]
+
+
+def top_revenue_menu_items(ds, limit=10):
+    # same as the SQL: quantity * unit price of every order line
+    item_cents = ds.item_quantities.astype(np.int64) * ds.item_unit_cents
+    names = {item_id: name for (item_id, name, _) in ds.menu_items}
+    items, cents = group_sum(ds.item_menu_ids, item_cents)
+    # the SQL groups by name; names are unique in the generated data
+    return [(names[int(items[i])], money(cents[i])) for i in top_k(items, cents, limit)]
+
+
+def top_recipe_inventory_items(ds, limit=10):
+    inventory_ids = np.array([r[1] for r in ds.recipes])
+    used = np.array([r[2] for r in ds.recipes])
+    ids, totals = group_sum(inventory_ids, used)
+    names = {inventory_id: name for (inventory_id, name, _) in ds.inventory}
+    return [(names[int(ids[i])], int(totals[i])) for i in top_k(ids, totals, limit)]
+
+
+def weekly_sales_history(ds, start=DEFAULT_START, end=DEFAULT_END):
+    weeks, counts = group_count(iso_week_numbers(order_days(ds, in_range(ds, start, end))))
+    return [(int(w), int(c)) for w, c in zip(weeks, counts)]
+
+
+def sales_by_hour(ds, start=DEFAULT_START, end=DEFAULT_END):
+    mask = in_range(ds, start, end)
+    hours = (ds.timestamps[mask].astype(np.int64) // 3600) % 24
+    counts = np.bincount(hours, minlength=24)
+    cents = np.bincount(hours, weights=ds.total_cents[mask], minlength=24).astype(np.int64)
+    return [(h, int(counts[h]), money(cents[h])) for h in range(24) if counts[h]]
+
+
+def peak_sales_days(ds, start=DEFAULT_START, end=DEFAULT_END, limit=10):
+    mask = in_range(ds, start, end)
+    days, cents = group_sum(order_days(ds, mask), ds.total_cents[mask])
+    return [(to_date(days[i]), money(cents[i])) for i in top_k(days.astype(np.int64), cents, limit)]
+
+
+def menu_item_inventory(ds, item_name="Classic Pearl Milk Tea"):
+    ids = [item_id for (item_id, name, _) in ds.menu_items if name == item_name]
+    count = sum(1 for r in ds.recipes if r[0] in ids)
+    return [(item_name, count)] if count else []
+
+
+# query name in required_queries.py -> offline implementation
+OFFLINE_QUERIES = {
+    "Number of weeks in the dataset": number_of_weeks,
+    "Total sales amount": total_sales,
+    "Number of peak days": number_of_peak_days,
+    "Number of menu items": number_of_menu_items,
+    "Top 10 customers by orders in a given time period": top_customers_by_orders,
+    "Top 10 customers by total spending in a given time period": top_customers_by_spending,
+    "Top 5 employees handling the most orders": top_employees_by_orders,
+    "Top 5 employees generating the most revenue": top_employees_by_revenue,
+    "Top 10 most popular menu items (by times ordered)": menu_item_popularity,
+    "Top 10 least popular menu items (by times ordered)":
+        lambda ds, **params: menu_item_popularity(ds, descending=False, **params),
+    "Top 5 inventory items running lowest": inventory_by_quantity,
+    "Top 5 inventory items most in stock":
+        lambda ds, **params: inventory_by_quantity(ds, descending=True, **params),
+    "Average order value": average_order_value,
+    "Top 5 busiest days by order count": busiest_days,
+    "Top 5 days with the lowest sales totals": lowest_sales_days,
+    "Top 5 menu items that use the most inventory items": menu_items_by_ingredient_count,
+    "Top 5 months with the highest sales": top_sales_months,
+    "Top 10 highest revenue-generating menu items": top_revenue_menu_items,
+    "Top 10 most frequently used inventory items in recipes": top_recipe_inventory_items,
+    "Special Query #1: Weekly Sales History": weekly_sales_history,
+    "Special Query #2: Realistic Sales History": sales_by_hour,
+    "Special Query #3: Peak Sales Day": peak_sales_days,
+    "Special Query #4: Menu Item Inventory": menu_item_inventory,
+}
+
+# ----------------------------
+# Cross-check against SQL
+# ----------------------------
+def normalize(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, (int, str, datetime.date)):
+        return value
+    return round(float(value), 2)
+
+
+def results_match(offline, sql):
+    """Compare two result sets the way ORDER BY ... LIMIT allows.
+
+    The ordering column (last) has to match row by row. Rows whose value ties
+    with the last row may legitimately differ between implementations, so the
+    other columns are only compared for rows strictly ahead of the cut-off.
+    """
+    offline = [tuple(normalize(v) for v in row) for row in offline]
+    sql = [tuple(normalize(v) for v in row) for row in sql]
+    if len(offline) != len(sql):
+        return False
+    if [row[-1] for row in offline] != [row[-1] for row in sql]:
+        return False
+    if not sql:
+        return True
+    boundary = sql[-1][-1]
+    return ({row for row in offline if row[-1] != boundary} ==
+            {row for row in sql if row[-1] != boundary})
+
+
+def offline_params(query, overrides=None):
+    """query_params() with timestamps as datetime64, ready for the offline functions."""
+    params = query_params(query, overrides)
+    return {name: np.datetime64(value, "s") if isinstance(value, datetime.datetime) else value
+            for name, value in params.items()}
+
+
+def check_against_database(ds, conn, overrides=None):
+    """Run every query both ways; returns the names of the queries that differ."""
+    mismatches = []
+    cur = conn.cursor()
+    for _, queries in QUERY_GROUPS:
+        for query in queries:
+            name = query.name
+            database.execute_query(cur, query, overrides)
+            expected = cur.fetchall()
+            actual = OFFLINE_QUERIES[name](ds, **offline_params(query, overrides))
+            ok = results_match(actual, expected)
+            print(f"{'ok' if ok else 'MISMATCH':<9} {name}")
+            if not ok:
+                print(f"          offline: {actual}\n          sql:     {expected}")
+                mismatches.append(name)
+    cur.close()
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer the required_queries.py reports from the generated CSVs.")
+    parser.add_argument("--data-dir", default=".",
+                        help="directory holding the csvPopulator.py output (CSV files or a columnar.py directory)")
+    add_query_args(parser)
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser("report", help="print every report (default)")
+    check_parser = subparsers.add_parser("check", help="compare every report with the SQL version")
+    if database is not None:
+        database.add_connection_args(check_parser)
+    args = parser.parse_args()
+    if args.command == "check":
+        check_rollup_range(check_parser, args)
+    overrides = query_overrides(args)
+
+    t0 = time.perf_counter()
+    ds = load_dataset(args.data_dir)
+    print(f"loaded {len(ds.order_ids):,} orders / {len(ds.item_order_ids):,} order items "
+          f"in {time.perf_counter() - t0:.2f}s\n")
+
+    if args.command == "check":
+        if database is None:
+            sys.exit("check needs psycopg2 (pip install psycopg2-binary)")
+        conn = database.connect(args)
+        mismatches = check_against_database(ds, conn, overrides)
+        conn.close()
+        if mismatches:
+            sys.exit(1)
+        return
+
+    t0 = time.perf_counter()
+    for _, queries in QUERY_GROUPS:
+        for query in queries:
+            print(f"\"{query.name}\"")
+            for row in OFFLINE_QUERIES[query.name](ds, **offline_params(query, overrides)):
+                print("   ", row)
+    print(f"\nall reports computed in {time.perf_counter() - t0:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
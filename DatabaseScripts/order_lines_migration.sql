@@ -0,0 +1,63 @@
+-- Migrates a database created before joint_order_items held order lines to the
+-- line-item layout in create_tables.sql (line number, quantity, unit price at
+-- the time of sale, parent line of add-ons) and the per-item revenue index.
+-- The sale prices of existing rows aren't known, so they get the current menu
+-- prices; lines are numbered in storage order, and each add-on is attached to
+-- the closest drink line before it in its order.
+-- Run once: python setup_database.py run order_lines_migration.sql
+
+CREATE OR REPLACE FUNCTION reconcile_order_totals(from_id INT, to_id INT)
+RETURNS INT AS $$
+DECLARE
+    changed INT;
+BEGIN
+    UPDATE orders o SET total_price = lines.total_price
+    FROM (
+        SELECT order_id, SUM(quantity * unit_price) AS total_price
+        FROM joint_order_items
+        WHERE order_id > from_id AND order_id <= to_id
+        GROUP BY order_id
+    ) lines
+    WHERE o.id = lines.order_id AND o.id > from_id AND o.id <= to_id AND o.total_price <> lines.total_price;
+    GET DIAGNOSTICS changed = ROW_COUNT;
+    RETURN changed;
+END;
+$$ LANGUAGE plpgsql;
+
+ALTER TABLE joint_order_items
+    ADD COLUMN line_number INT,
+    ADD COLUMN quantity INT NOT NULL DEFAULT 1,
+    ADD COLUMN unit_price NUMERIC(10,2),
+    ADD COLUMN parent_line INT NOT NULL DEFAULT 0;
+
+UPDATE joint_order_items joi
+SET line_number = numbered.line_number, unit_price = numbered.price
+FROM (
+    SELECT j.ctid AS row_id, mi.price,
+           row_number() OVER (PARTITION BY j.order_id ORDER BY j.ctid) AS line_number
+    FROM joint_order_items j
+    JOIN menu_items mi ON mi.id = j.menu_item_id
+) numbered
+WHERE joi.ctid = numbered.row_id;
+
+UPDATE joint_order_items joi
+SET parent_line = parents.parent_line
+FROM (
+    SELECT j.order_id, j.line_number, mi.is_modification,
+           MAX(j.line_number) FILTER (WHERE NOT mi.is_modification)
+               OVER (PARTITION BY j.order_id ORDER BY j.line_number) AS parent_line
+    FROM joint_order_items j
+    JOIN menu_items mi ON mi.id = j.menu_item_id
+) parents
+WHERE parents.is_modification AND parents.parent_line IS NOT NULL
+  AND joi.order_id = parents.order_id AND joi.line_number = parents.line_number;
+
+ALTER TABLE joint_order_items
+    ALTER COLUMN line_number SET NOT NULL,
+    ALTER COLUMN unit_price SET NOT NULL;
+
+-- per-item revenue as an index-only scan
+DROP INDEX IF EXISTS idx_joint_order_items_menu_item_id;
+CREATE INDEX idx_joint_order_items_menu_item_id ON joint_order_items (menu_item_id) INCLUDE (quantity, unit_price);
+
+ANALYZE joint_order_items;
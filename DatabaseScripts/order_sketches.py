@@ -0,0 +1,583 @@
+# streaming approximate analytics over the order feed: distinct customers per day (HyperLogLog),
+# item counts (Count-Min sketch) and top items / customers / employees (space-saving), each in
+# bounded memory and mergeable across shards and time windows. Orders are consumed a chunk at a
+# time, straight from the csvPopulator.py generator or from new rows in the database, and the
+# estimates are compared with the exact GROUP BY answers.
+#
+#   python order_sketches.py generate --orders 1000000 --workers 4 --seed 42
+#   python order_sketches.py database [connection flags] --follow 30    (e.g. while pos_load_test.py runs)
+
+import argparse
+import datetime
+import heapq
+import math
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import csvPopulator
+
+try:
+    import database  # needs psycopg2, only used by the "database" command
+except ImportError:
+    database = None
+
+# ----------------------------
+# Hashing
+# ----------------------------
+GOLDEN = 0x9E3779B97F4A7C15
+
+
+def hash64(values, seed=0):
+    """splitmix64 of integer values (vectorized), different for every seed."""
+    x = np.asarray(values).astype(np.uint64) + np.uint64((seed + 1) * GOLDEN % 2 ** 64)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def bit_length(x):
+    """Bit length of uint64 values, exact (log2 is only taken of 32-bit halves)."""
+    high = (x >> np.uint64(32)).astype(np.float64)
+    low = (x & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    with np.errstate(divide="ignore"):
+        high_bits = np.where(high > 0, np.floor(np.log2(high)) + 33, 0)
+        low_bits = np.where(low > 0, np.floor(np.log2(low)) + 1, 0)
+    return np.where(high > 0, high_bits, low_bits).astype(np.int64)
+
+# ----------------------------
+# HyperLogLog
+# ----------------------------
+class HyperLogLog:
+    """Distinct count in 2**precision one-byte registers; standard error about 1.04 / sqrt(2**precision)."""
+
+    def __init__(self, precision=12, seed=0):
+        self.precision = precision
+        self.seed = seed
+        self.registers = np.zeros(2 ** precision, dtype=np.uint8)
+
+    def positions(self, values):
+        """(register index, rank) of each value: first `precision` hash bits pick the register,
+        the rank is the position of the first 1 bit in the rest."""
+        hashes = hash64(values, self.seed)
+        rest_bits = 64 - self.precision
+        index = (hashes >> np.uint64(rest_bits)).astype(np.int64)
+        rest = hashes & np.uint64(2 ** rest_bits - 1)
+        return index, (rest_bits - bit_length(rest) + 1).astype(np.uint8)
+
+    def add(self, values):
+        index, rank = self.positions(values)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other):
+        if (other.precision, other.seed) != (self.precision, self.seed):
+            raise ValueError("can only merge HyperLogLogs with the same precision and seed")
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def count(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.exp2(-self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            return m * math.log(m / zeros)  # linear counting for small cardinalities
+        return estimate
+
+    def standard_error(self):
+        return 1.04 / math.sqrt(len(self.registers))
+
+
+class DailyDistinct:
+    """One HyperLogLog per day; any range of days is the merge of its days' sketches."""
+
+    def __init__(self, precision=12, seed=0):
+        self.precision = precision
+        self.seed = seed
+        self.days = {}
+
+    def add(self, days, values):
+        """Add values[i] to the sketch of days[i] (datetime64[D]); hashes once, one scatter for all days."""
+        if not len(values):
+            return
+        index, rank = HyperLogLog(self.precision, self.seed).positions(values)
+        unique_days, day_index = np.unique(days, return_inverse=True)
+        block = np.zeros((len(unique_days), 2 ** self.precision), dtype=np.uint8)
+        np.maximum.at(block, (day_index, index), rank)
+        for day, registers in zip(unique_days.tolist(), block):
+            sketch = self.days.get(day)
+            if sketch is None:
+                sketch = self.days[day] = HyperLogLog(self.precision, self.seed)
+            np.maximum(sketch.registers, registers, out=sketch.registers)
+
+    def merge(self, other):
+        for day, sketch in other.days.items():
+            if day in self.days:
+                self.days[day].merge(sketch)
+            else:
+                self.days[day] = sketch
+
+    def window(self, start=None, end=None):
+        """Merged sketch of the days in [start, end] (None: open-ended)."""
+        merged = HyperLogLog(self.precision, self.seed)
+        for day, sketch in self.days.items():
+            if (start is None or day >= start) and (end is None or day <= end):
+                merged.merge(sketch)
+        return merged
+
+    def prune(self, before):
+        """Drop the days before `before`, to keep a live feed to a fixed retention."""
+        for day in [day for day in self.days if day < before]:
+            del self.days[day]
+
+# ----------------------------
+# Count-Min sketch
+# ----------------------------
+class CountMinSketch:
+    """depth x width counters; an estimate never undercounts and overcounts by at most
+    e / width * total with probability 1 - e**-depth."""
+
+    def __init__(self, width=2048, depth=5, seed=0):
+        self.width = width
+        self.depth = depth
+        self.seed = seed
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        self.total = 0
+
+    def columns(self, values):
+        return [(hash64(values, self.seed + 1 + row) % np.uint64(self.width)).astype(np.int64)
+                for row in range(self.depth)]
+
+    def add(self, values):
+        for row, cols in enumerate(self.columns(values)):
+            self.table[row] += np.bincount(cols, minlength=self.width)
+        self.total += len(values)
+
+    def estimate(self, values):
+        return np.min([self.table[row][cols] for row, cols in enumerate(self.columns(values))], axis=0)
+
+    def merge(self, other):
+        if (other.width, other.depth, other.seed) != (self.width, self.depth, self.seed):
+            raise ValueError("can only merge Count-Min sketches with the same shape and seed")
+        self.table += other.table
+        self.total += other.total
+
+    def error_bound(self):
+        """(additive error, probability it holds) for any single estimate."""
+        return math.e / self.width * self.total, 1 - math.exp(-self.depth)
+
+# ----------------------------
+# Space-saving top-k
+# ----------------------------
+class SpaceSaving:
+    """Top-k heavy hitters in k counters (Metwally et al.), fed pre-aggregated batches.
+
+    For every monitored key, count - error <= true count <= count, and any
+    key occurring more than total / k times is monitored. A min-heap with
+    lazy deletion finds the counter to evict.
+    """
+
+    def __init__(self, k=64):
+        self.k = k
+        self.counts = {}
+        self.errors = {}
+        self.total = 0
+        self._heap = []
+
+    def add(self, keys):
+        uniques, counts = np.unique(keys, return_counts=True)
+        for key, weight in zip(uniques.tolist(), counts.tolist()):
+            self.update(key, weight)
+        self.total += len(keys)
+
+    def update(self, key, weight):
+        if key in self.counts:
+            self.counts[key] += weight
+        elif len(self.counts) < self.k:
+            self.counts[key] = weight
+            self.errors[key] = 0
+        else:
+            floor, evicted = self._pop_min()
+            del self.counts[evicted], self.errors[evicted]
+            self.counts[key] = floor + weight
+            self.errors[key] = floor
+        heapq.heappush(self._heap, (self.counts[key], key))
+        if len(self._heap) > 4 * self.k:
+            self._rebuild_heap()
+
+    def _pop_min(self):
+        while True:
+            count, key = heapq.heappop(self._heap)
+            if self.counts.get(key) == count:
+                return count, key
+
+    def _rebuild_heap(self):
+        self._heap = [(count, key) for key, count in self.counts.items()]
+        heapq.heapify(self._heap)
+
+    def min_count(self):
+        """Upper bound on the count of any key that is not monitored."""
+        return min(self.counts.values()) if len(self.counts) >= self.k else 0
+
+    def merge(self, other):
+        """Mergeable-summaries merge: a key missing from a full summary may have up to its min count."""
+        floor, other_floor = self.min_count(), other.min_count()
+        counts, errors = {}, {}
+        for key in self.counts.keys() | other.counts.keys():
+            counts[key] = self.counts.get(key, floor) + other.counts.get(key, other_floor)
+            errors[key] = self.errors.get(key, floor) + other.errors.get(key, other_floor)
+        kept = sorted(counts, key=lambda key: (-counts[key], key))[:self.k]
+        self.counts = {key: counts[key] for key in kept}
+        self.errors = {key: errors[key] for key in kept}
+        self.total += other.total
+        self._rebuild_heap()
+
+    def top(self, n):
+        """[(key, count, error)] of the n largest counters."""
+        keys = sorted(self.counts, key=lambda key: (-self.counts[key], key))[:n]
+        return [(key, self.counts[key], self.errors[key]) for key in keys]
+
+    def guaranteed_top(self, n):
+        """The entries of top(n) that are surely in the true top n: their guaranteed count,
+        count - error, is at least the count of the next counter, which bounds every key
+        outside top(n). Near-uniform keys give fewer than n."""
+        ranked = self.top(n + 1)
+        threshold = ranked[n][1] if len(ranked) > n else self.min_count()
+        return [(key, count, error) for key, count, error in ranked[:n] if count - error >= threshold]
+
+# space-saving counts are off by at most total / k, so k = 1 / error keeps them within error * total
+TOP_ERROR = 0.0001
+
+
+def top_k_for_error(error):
+    return math.ceil(1 / error)
+
+# ----------------------------
+# The order feed
+# ----------------------------
+class OrderSketches:
+    """Every sketch of the order feed; add_chunk() takes a csvPopulator.OrderChunk."""
+
+    def __init__(self, hll_precision=12, cms_width=2048, cms_depth=5, top_k=top_k_for_error(TOP_ERROR), seed=0):
+        self.orders = 0
+        self.last_id = 0
+        self.daily_customers = DailyDistinct(hll_precision, seed)
+        self.item_counts = CountMinSketch(cms_width, cms_depth, seed)
+        self.top_items = SpaceSaving(top_k)
+        self.top_customers = SpaceSaving(top_k)
+        self.top_employees = SpaceSaving(top_k)
+
+    def add_orders(self, order_ids, customer_ids, employee_ids, timestamps, item_menu_ids):
+        self.orders += len(order_ids)
+        if len(order_ids):
+            self.last_id = max(self.last_id, int(np.max(order_ids)))
+        self.daily_customers.add(timestamps.astype("datetime64[D]"), customer_ids)
+        self.item_counts.add(item_menu_ids)
+        self.top_items.add(item_menu_ids)
+        self.top_customers.add(customer_ids)
+        self.top_employees.add(employee_ids)
+
+    def add_chunk(self, chunk):
+        self.add_orders(chunk.order_ids, chunk.customer_ids, chunk.employee_ids, chunk.timestamps,
+                        chunk.item_menu_ids)
+
+    def merge(self, other):
+        self.orders += other.orders
+        self.last_id = max(self.last_id, other.last_id)
+        self.daily_customers.merge(other.daily_customers)
+        self.item_counts.merge(other.item_counts)
+        self.top_items.merge(other.top_items)
+        self.top_customers.merge(other.top_customers)
+        self.top_employees.merge(other.top_employees)
+
+    def memory_bytes(self):
+        """Rough footprint: registers and counters (a space-saving entry counted as ~3 small Python objects)."""
+        hll = sum(sketch.registers.nbytes for sketch in self.daily_customers.days.values())
+        top = sum(len(s.counts) for s in (self.top_items, self.top_customers, self.top_employees)) * 3 * 64
+        return hll + self.item_counts.table.nbytes + top
+
+
+class ExactCounts:
+    """The exact answers for the same feed, to measure the sketches against (not bounded in memory)."""
+
+    def __init__(self):
+        self.items = np.zeros(0, dtype=np.int64)
+        self.customers = np.zeros(0, dtype=np.int64)
+        self.employees = np.zeros(0, dtype=np.int64)
+        self.day_customers = np.zeros(0, dtype=np.int64)  # unique day * 2**32 + customer id
+
+    @staticmethod
+    def _add_counts(counts, keys):
+        return ExactCounts._sum(counts, np.bincount(keys))
+
+    @staticmethod
+    def _sum(a, b):
+        total = np.zeros(max(len(a), len(b)), dtype=np.int64)
+        total[:len(a)] += a
+        total[:len(b)] += b
+        return total
+
+    def add_orders(self, order_ids, customer_ids, employee_ids, timestamps, item_menu_ids):
+        self.items = self._add_counts(self.items, item_menu_ids)
+        self.customers = self._add_counts(self.customers, customer_ids)
+        self.employees = self._add_counts(self.employees, employee_ids)
+        days = timestamps.astype("datetime64[D]").astype(np.int64)
+        self.day_customers = np.union1d(self.day_customers, days * 2 ** 32 + customer_ids)
+
+    def add_chunk(self, chunk):
+        self.add_orders(chunk.order_ids, chunk.customer_ids, chunk.employee_ids, chunk.timestamps,
+                        chunk.item_menu_ids)
+
+    def merge(self, other):
+        for name in ("items", "customers", "employees"):
+            setattr(self, name, self._sum(getattr(self, name), getattr(other, name)))
+        self.day_customers = np.union1d(self.day_customers, other.day_customers)
+
+    def answers(self):
+        days, distinct = np.unique(self.day_customers // 2 ** 32, return_counts=True)
+        return {
+            "items": {key: int(count) for key, count in enumerate(self.items) if count},
+            "customers": {key: int(count) for key, count in enumerate(self.customers) if count},
+            "employees": {key: int(count) for key, count in enumerate(self.employees) if count},
+            "daily_customers": dict(zip(days.astype("datetime64[D]").tolist(), distinct.tolist())),
+            "distinct_customers": len(np.unique(self.day_customers % 2 ** 32)),
+        }
+
+# ----------------------------
+# Sources
+# ----------------------------
+def sketch_shard(task):
+    """Worker: generate one id-range shard of orders and sketch it (plus the exact counts)."""
+    (chunk_index, offset, n), gen_args, sketch_args = task
+    chunk = csvPopulator.generate_order_chunk(chunk_index, offset, n, *gen_args)
+    sketches, exact = OrderSketches(*sketch_args), ExactCounts()
+    sketches.add_chunk(chunk)
+    exact.add_chunk(chunk)
+    return sketches, exact
+
+
+def sketch_generated(num_orders, chunk_size, seed, end_date, workers, sketch_args):
+    """Sketch the csvPopulator.py order stream; with workers, one sketch per shard, merged in shard order."""
+    if seed is not None:
+        random.seed(seed)
+    _, menu_item_id_map = csvPopulator.generate_menu_items()
+    start_date, end_date = csvPopulator.date_window(end_date)
+    peaks = csvPopulator.pick_peaks(start_date, end_date)
+    sketches, exact = OrderSketches(*sketch_args), ExactCounts()
+    if workers > 1:
+        entropy = np.random.SeedSequence(seed).entropy
+        gen_args = (start_date, end_date, peaks, menu_item_id_map, entropy)
+        tasks = [(shard, gen_args, sketch_args) for shard in csvPopulator.order_shards(num_orders, chunk_size)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for shard_sketches, shard_exact in pool.map(sketch_shard, tasks):
+                sketches.merge(shard_sketches)
+                exact.merge(shard_exact)
+    else:
+        for chunk in csvPopulator.generate_order_chunks(start_date, end_date, peaks, menu_item_id_map, num_orders,
+                                                        chunk_size, seed):
+            sketches.add_chunk(chunk)
+            exact.add_chunk(chunk)
+    return sketches, exact.answers()
+
+
+def poll_orders(conn, after_id, limit, pending=()):
+    """(orders, xmin, xmax): up to limit orders with id > after_id (in id order) plus those of the
+    pending ids that exist now, and their items, as arrays (None if there are none), and the xmin /
+    xmax of the snapshot they were read in. The connection is REPEATABLE READ, so it is all one
+    snapshot.
+    """
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_snapshot_xmin(s)::text::bigint, pg_snapshot_xmax(s)::text::bigint "
+                    "FROM pg_current_snapshot() s;")
+        xmin, xmax = cur.fetchone()
+        cur.execute("SELECT id, customer_id, employee_id, timestamp FROM orders "
+                    "WHERE id = ANY(%s::int[]) OR id IN (SELECT id FROM orders WHERE id > %s ORDER BY id LIMIT %s) "
+                    "ORDER BY id;", (list(pending), after_id, limit))
+        rows = cur.fetchall()
+        if not rows:
+            conn.rollback()
+            return None, xmin, xmax
+        order_ids, customer_ids, employee_ids, timestamps = zip(*rows)
+        cur.execute("SELECT menu_item_id FROM joint_order_items "
+                    "WHERE (order_id > %s AND order_id <= %s) OR order_id = ANY(%s::int[]);",
+                    (after_id, max(after_id, order_ids[-1]), list(pending)))
+        item_menu_ids = [row[0] for row in cur.fetchall()]
+    conn.rollback()
+    return ((np.array(order_ids), np.array(customer_ids), np.array(employee_ids),
+             np.array(timestamps, dtype="datetime64[s]"), np.array(item_menu_ids, dtype=np.int64)), xmin, xmax)
+
+
+def sketch_database(conn, batch_size, follow, sketch_args):
+    """Consume orders from the database in id order; with follow > 0, keep polling for new inserts
+    until none have arrived for `follow` seconds. Returns (sketches, pending ids).
+
+    Ids are handed out before commit, so under concurrent inserts an order
+    can commit after a higher id was read. The ids skipped below the last
+    one read stay pending and are polled again until they show up. The poll
+    after a skip records its snapshot xmax: once the snapshot xmin has
+    passed it, every transaction that could still commit the id has ended,
+    so an id still missing (rolled back, or deleted) is dropped. What is
+    pending at the end is left out of the exact answers, so both sides
+    count the same orders.
+    """
+    sketches = OrderSketches(*sketch_args)
+    pending = np.zeros(0, dtype=np.int64)
+    horizons = np.zeros(0, dtype=np.int64)  # per pending id: that xmax, -1 until the next poll
+    idle_since = time.monotonic()
+    while True:
+        batch, xmin, xmax = poll_orders(conn, sketches.last_id, batch_size, pending.tolist())
+        if batch is not None:
+            missing = ~np.isin(pending, batch[0])
+            pending, horizons = pending[missing], horizons[missing]
+        waiting = (horizons < 0) | (horizons > xmin)
+        pending, horizons = pending[waiting], np.where(horizons[waiting] < 0, xmax, horizons[waiting])
+        if batch is not None:
+            new_ids = batch[0][batch[0] > sketches.last_id]
+            if len(new_ids):
+                skipped = np.setdiff1d(np.arange(sketches.last_id + 1, new_ids[-1]), new_ids)
+                pending = np.concatenate([pending, skipped])
+                horizons = np.concatenate([horizons, np.full(len(skipped), -1)])
+            sketches.add_orders(*batch)
+            idle_since = time.monotonic()
+        elif time.monotonic() - idle_since >= follow:
+            return sketches, pending
+        else:
+            time.sleep(0.5)
+
+
+# the GROUP BYs behind the customer / employee / popularity reports in required_queries.py,
+# bounded to the orders the sketches have seen: ids up to the last one, less the pending ones
+EXACT_SQL = {
+    "items": "SELECT menu_item_id, COUNT(*) FROM joint_order_items "
+             "WHERE order_id <= %(last_id)s AND order_id <> ALL(%(pending)s::int[]) GROUP BY menu_item_id;",
+    "customers": "SELECT customer_id, COUNT(*) FROM orders "
+                 "WHERE id <= %(last_id)s AND id <> ALL(%(pending)s::int[]) GROUP BY customer_id;",
+    "employees": "SELECT employee_id, COUNT(*) FROM orders "
+                 "WHERE id <= %(last_id)s AND id <> ALL(%(pending)s::int[]) GROUP BY employee_id;",
+    "daily_customers": "SELECT timestamp::date, COUNT(DISTINCT customer_id) FROM orders "
+                       "WHERE id <= %(last_id)s AND id <> ALL(%(pending)s::int[]) GROUP BY 1;",
+    "distinct_customers": "SELECT COUNT(DISTINCT customer_id) FROM orders "
+                          "WHERE id <= %(last_id)s AND id <> ALL(%(pending)s::int[]);",
+}
+
+
+def exact_from_database(conn, last_id, pending):
+    """The EXACT_SQL answers, all from one REPEATABLE READ snapshot."""
+    answers = {}
+    params = {"last_id": last_id, "pending": [int(order_id) for order_id in pending]}
+    with conn.cursor() as cur:
+        for name, sql in EXACT_SQL.items():
+            cur.execute(sql, params)
+            rows = cur.fetchall()
+            if name == "distinct_customers":
+                answers[name] = rows[0][0]
+            elif name == "daily_customers":
+                answers[name] = {np.datetime64(day, "D").tolist(): count for day, count in rows}
+            else:
+                answers[name] = dict(rows)
+    conn.rollback()
+    return answers
+
+# ----------------------------
+# Report
+# ----------------------------
+def print_comparison(sketches, exact, show=10):
+    """Each estimate next to the exact answer and the bound it should stay within."""
+    hll = sketches.daily_customers
+    expected = HyperLogLog(hll.precision).standard_error()
+    days = sorted(exact["daily_customers"])
+    errors = np.array([abs(hll.days[day].count() / exact["daily_customers"][day] - 1) if day in hll.days else 1.0
+                       for day in days])
+    print(f"distinct customers per day (HyperLogLog, {2 ** hll.precision} registers, "
+          f"standard error {expected:.2%}): {len(days)} days")
+    if len(days):
+        print(f"    relative error mean {errors.mean():.2%}, max {errors.max():.2%}, "
+              f"within 2 standard errors on {np.mean(errors <= 2 * expected):.0%} of days")
+    overall = hll.window().count()
+    print(f"    all days merged: {overall:,.0f} estimated vs {exact['distinct_customers']:,} exact "
+          f"({abs(overall / max(exact['distinct_customers'], 1) - 1):.2%} off)")
+
+    cms = sketches.item_counts
+    bound, probability = cms.error_bound()
+    keys = np.array(sorted(exact["items"]), dtype=np.int64)
+    if len(keys):
+        over = cms.estimate(keys) - np.array([exact["items"][key] for key in keys.tolist()])
+        print(f"item counts (Count-Min, {cms.depth} x {cms.width}): overcount max {over.max():,}, "
+              f"mean {over.mean():,.1f}; bound {bound:,.1f} with probability {probability:.1%}; "
+              f"never under: {bool((over >= 0).all())}")
+
+    for label, summary, answer in (("menu items", sketches.top_items, exact["items"]),
+                                   ("customers", sketches.top_customers, exact["customers"]),
+                                   ("employees", sketches.top_employees, exact["employees"])):
+        top = summary.top(show)
+        sure = summary.guaranteed_top(show)
+        exact_counts = sorted(answer.values(), reverse=True)
+        cutoff = exact_counts[min(show, len(exact_counts)) - 1] if exact_counts else 0
+        held = all(count - error <= answer.get(key, 0) <= count for key, count, error in top)
+        worst = max((count - answer.get(key, 0) for key, count, _ in top), default=0)
+        print(f"top {show} {label} (space-saving, k={summary.k}): {len(sure)} guaranteed, "
+              f"{sum(answer.get(key, 0) >= cutoff for key, _, _ in sure)} of them in the exact top {show}; "
+              f"max overcount {worst:,}, max error bound {max((e for _, _, e in top), default=0):,}, "
+              f"bounds held: {held}")
+        for key, count, error in sure[:3]:
+            print(f"    {key:>8}: {count:,} (exact {answer.get(key, 0):,}, error <= {error:,})")
+        if len(sure) < show:
+            print(f"    the other counters are within the error bound of each other; with {len(answer):,} "
+                  f"distinct keys, --top-k {len(answer):,} counts them exactly")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bounded-memory sketches over the order feed vs the exact answers.")
+    parser.add_argument("--hll-precision", type=int, default=12, help="HyperLogLog registers = 2**precision")
+    parser.add_argument("--cms-width", type=int, default=2048)
+    parser.add_argument("--cms-depth", type=int, default=5)
+    parser.add_argument("--top-error", type=float, default=TOP_ERROR,
+                        help="space-saving error bound as a fraction of the total; sizes the summaries")
+    parser.add_argument("--top-k", type=int,
+                        help="space-saving counters per summary (default: 1 / --top-error; only keys above "
+                             "total / k are sure to be kept)")
+    parser.add_argument("--show", type=int, default=10, help="top-n to compare with the exact ranking")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    generate_parser = subparsers.add_parser("generate", help="sketch orders straight from the csvPopulator.py generator")
+    generate_parser.add_argument("--orders", type=int, default=csvPopulator.NUM_ORDERS)
+    generate_parser.add_argument("--chunk-size", type=int, default=csvPopulator.CHUNK_SIZE)
+    generate_parser.add_argument("--seed", type=int)
+    generate_parser.add_argument("--end-date", type=datetime.datetime.fromisoformat)
+    generate_parser.add_argument("--workers", type=int, default=1, help="sketch shards in processes and merge them")
+    database_parser = subparsers.add_parser("database", help="sketch the orders in the database (and new inserts)")
+    database_parser.add_argument("--batch-size", type=int, default=50000)
+    database_parser.add_argument("--follow", type=float, default=0,
+                                 help="keep polling for new orders until none arrive for this many seconds")
+    if database is not None:
+        database.add_connection_args(database_parser)
+    args = parser.parse_args()
+    sketch_args = (args.hll_precision, args.cms_width, args.cms_depth, args.top_k or top_k_for_error(args.top_error))
+
+    t0 = time.perf_counter()
+    if args.command == "generate":
+        sketches, exact = sketch_generated(args.orders, args.chunk_size, args.seed, args.end_date, args.workers,
+                                           sketch_args)
+        elapsed = time.perf_counter() - t0
+    else:
+        if database is None:
+            raise SystemExit("the database command needs psycopg2 (pip install psycopg2-binary)")
+        conn = database.connect(args)
+        # one snapshot per transaction: a poll's orders and items, and all of the exact answers
+        conn.set_session(isolation_level="REPEATABLE READ", readonly=True)
+        sketches, pending = sketch_database(conn, args.batch_size, args.follow, sketch_args)
+        elapsed = time.perf_counter() - t0
+        exact = exact_from_database(conn, sketches.last_id, pending)
+        conn.close()
+        if len(pending):
+            print(f"{len(pending):,} ids below the last one read were still missing at the last poll "
+                  f"(in flight, rolled back or deleted), left out of both sides")
+
+    what = "generated, sketched and counted exactly" if args.command == "generate" else "sketched"
+    print(f"{what} {sketches.orders:,} orders in {elapsed:.2f}s ({sketches.orders / max(elapsed, 1e-9):,.0f} "
+          f"orders/sec), sketches ~{sketches.memory_bytes() / 2 ** 10:,.0f} KiB\n")
+    print_comparison(sketches, exact, args.show)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+-- Monthly partition upkeep and order id integrity for the partitioned orders
+-- table. Both setup paths run this file: "create" right after create_tables.sql,
+-- and partition_orders_migration.sql expects it to have run first:
+--   python setup_database.py run orders_partitions.sql partition_orders_migration.sql
+-- Safe to re-run; on a database whose orders table is already partitioned it
+-- also installs order_ids and the partitions for the current window.
+
+CREATE OR REPLACE FUNCTION create_orders_partitions(from_ts timestamp, to_ts timestamp)
+RETURNS INT AS $$
+DECLARE
+    month_start date := date_trunc('month', from_ts);
+    created INT := 0;
+    part_name text;
+BEGIN
+    WHILE month_start <= to_ts LOOP
+        part_name := 'orders_' || to_char(month_start, 'YYYY_MM');
+        IF to_regclass(part_name) IS NULL THEN
+            EXECUTE format('CREATE TABLE %I PARTITION OF orders FOR VALUES FROM (%L) TO (%L)',
+                           part_name, month_start, (month_start + interval '1 month')::date);
+            created := created + 1;
+        END IF;
+        month_start := (month_start + interval '1 month')::date;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Creates partitions for the next months_ahead months and moves any rows that
+-- landed in orders_default into their own monthly partitions. Run it after bulk
+-- loads and from a daily/monthly job so new months always have a partition.
+CREATE OR REPLACE FUNCTION maintain_orders_partitions(months_ahead INT DEFAULT 3)
+RETURNS INT AS $$
+DECLARE
+    min_ts timestamp;
+    max_ts timestamp;
+    created INT;
+BEGIN
+    SELECT MIN(timestamp), MAX(timestamp) INTO min_ts, max_ts FROM orders_default;
+    IF min_ts IS NULL THEN
+        RETURN create_orders_partitions(now()::timestamp, now()::timestamp + make_interval(months => months_ahead));
+    END IF;
+
+    -- a partition can't be created while the default partition holds rows for its range
+    ALTER TABLE orders DETACH PARTITION orders_default;
+    created := create_orders_partitions(LEAST(min_ts, now()::timestamp),
+                                        GREATEST(max_ts, now()::timestamp + make_interval(months => months_ahead)));
+    -- a pure move: keep statement triggers (rollups, order_ids...) from counting these orders twice
+    ALTER TABLE orders DISABLE TRIGGER USER;
+    INSERT INTO orders OVERRIDING SYSTEM VALUE SELECT * FROM orders_default;
+    ALTER TABLE orders ENABLE TRIGGER USER;
+    TRUNCATE orders_default;
+    ALTER TABLE orders ATTACH PARTITION orders_default DEFAULT;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ======================
+-- Order ids
+-- The partitioned primary key is (id, timestamp), which neither makes orders.id
+-- unique nor can be referenced by joint_order_items.order_id. order_ids holds
+-- every order id under a plain primary key, kept in step by statement triggers
+-- on orders, and is the target of joint_order_items' foreign key: a duplicate
+-- order id fails its insert, and an order can't be deleted while it has lines.
+-- The price is one more index insert per order.
+CREATE OR REPLACE FUNCTION order_ids_trigger()
+RETURNS trigger AS $$
+BEGIN
+    -- new_orders / old_orders are the statement's transition tables
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO order_ids (id) SELECT id FROM new_orders;
+    ELSIF TG_OP = 'DELETE' THEN
+        DELETE FROM order_ids i USING old_orders o WHERE i.id = o.id;
+    ELSIF TG_OP = 'UPDATE' THEN
+        -- an identity id only changes through SET id = DEFAULT
+        DELETE FROM order_ids i USING old_orders o
+        WHERE i.id = o.id AND NOT EXISTS (SELECT 1 FROM new_orders n WHERE n.id = o.id);
+        INSERT INTO order_ids (id)
+        SELECT n.id FROM new_orders n WHERE NOT EXISTS (SELECT 1 FROM old_orders o WHERE o.id = n.id);
+    ELSE
+        DELETE FROM order_ids;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- creates / backfills order_ids from orders, installs its triggers and points
+-- joint_order_items.order_id at it; fails if orders already holds a duplicate id
+CREATE OR REPLACE FUNCTION install_order_ids()
+RETURNS void AS $$
+BEGIN
+    CREATE TABLE IF NOT EXISTS order_ids (id INT PRIMARY KEY);
+    LOCK TABLE orders IN SHARE MODE;
+    DELETE FROM order_ids i WHERE NOT EXISTS (SELECT 1 FROM orders o WHERE o.id = i.id);
+    INSERT INTO order_ids (id)
+    SELECT o.id FROM orders o WHERE NOT EXISTS (SELECT 1 FROM order_ids i WHERE i.id = o.id);
+
+    DROP TRIGGER IF EXISTS order_ids_insert ON orders;
+    CREATE TRIGGER order_ids_insert AFTER INSERT ON orders
+    REFERENCING NEW TABLE AS new_orders
+    FOR EACH STATEMENT EXECUTE FUNCTION order_ids_trigger();
+
+    DROP TRIGGER IF EXISTS order_ids_update ON orders;
+    CREATE TRIGGER order_ids_update AFTER UPDATE ON orders
+    REFERENCING OLD TABLE AS old_orders NEW TABLE AS new_orders
+    FOR EACH STATEMENT EXECUTE FUNCTION order_ids_trigger();
+
+    DROP TRIGGER IF EXISTS order_ids_delete ON orders;
+    CREATE TRIGGER order_ids_delete AFTER DELETE ON orders
+    REFERENCING OLD TABLE AS old_orders
+    FOR EACH STATEMENT EXECUTE FUNCTION order_ids_trigger();
+
+    DROP TRIGGER IF EXISTS order_ids_truncate ON orders;
+    CREATE TRIGGER order_ids_truncate AFTER TRUNCATE ON orders
+    FOR EACH STATEMENT EXECUTE FUNCTION order_ids_trigger();
+
+    ALTER TABLE joint_order_items DROP CONSTRAINT IF EXISTS fk_order_id;
+    ALTER TABLE joint_order_items ADD CONSTRAINT fk_order_id FOREIGN KEY (order_id) REFERENCES order_ids(id);
+END;
+$$ LANGUAGE plpgsql;
+
+-- partitioned orders only (the migration calls these itself once orders is rebuilt):
+-- order_ids, and partitions for the generated 52-week window and the next few months
+SELECT install_order_ids(),
+       create_orders_partitions((now() - interval '13 months')::timestamp, (now() + interval '3 months')::timestamp)
+WHERE EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('orders'));
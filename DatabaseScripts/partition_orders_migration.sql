@@ -0,0 +1,70 @@
+-- Migrates a database created with the old, unpartitioned orders table to the
+-- monthly partitioned layout and report indexes in create_tables.sql. The
+-- partition and order id functions come from orders_partitions.sql, so run both:
+--   python setup_database.py run orders_partitions.sql partition_orders_migration.sql
+-- Triggers other schema files installed on orders (sales rollups, data
+-- versions, loyalty ledger) are re-created on the new table after the copy,
+-- so the copied rows aren't counted twice.
+
+DO $$
+BEGIN
+    IF to_regproc('create_orders_partitions') IS NULL OR to_regproc('install_order_ids') IS NULL THEN
+        RAISE EXCEPTION 'run orders_partitions.sql before partition_orders_migration.sql';
+    END IF;
+END;
+$$;
+
+CREATE TEMP TABLE orders_triggers ON COMMIT DROP AS
+SELECT pg_get_triggerdef(oid) AS definition FROM pg_trigger
+WHERE tgrelid = 'orders'::regclass AND NOT tgisinternal;
+
+-- the partitioned primary key is (id, timestamp), so orders(id) can't be referenced anymore;
+-- install_order_ids() points the foreign key at order_ids instead
+ALTER TABLE joint_order_items DROP CONSTRAINT IF EXISTS fk_order_id;
+
+ALTER TABLE orders RENAME TO orders_unpartitioned;
+ALTER INDEX orders_pkey RENAME TO orders_unpartitioned_pkey;
+
+CREATE TABLE orders (
+id INT GENERATED ALWAYS AS IDENTITY,
+customer_id INT,
+timestamp timestamp NOT NULL,
+total_price NUMERIC(10,2) NOT NULL,
+pearls_earned INT,
+employee_id INT NOT NULL,
+PRIMARY KEY (id, timestamp),
+CONSTRAINT fk_customer FOREIGN KEY (customer_id) REFERENCES customers(id),
+CONSTRAINT fk_employee FOREIGN KEY (employee_id) REFERENCES employees(id)
+) PARTITION BY RANGE (timestamp);
+
+CREATE TABLE orders_default PARTITION OF orders DEFAULT;
+
+SELECT create_orders_partitions(MIN(timestamp), MAX(timestamp)) FROM orders_unpartitioned;
+
+INSERT INTO orders OVERRIDING SYSTEM VALUE
+SELECT id, customer_id, timestamp, total_price, pearls_earned, employee_id FROM orders_unpartitioned;
+SELECT setval(pg_get_serial_sequence('orders', 'id'), COALESCE(MAX(id), 0) + 1, false) FROM orders;
+DROP TABLE orders_unpartitioned;
+
+DO $$
+DECLARE
+    definition text;
+BEGIN
+    FOR definition IN SELECT t.definition FROM orders_triggers t LOOP
+        EXECUTE definition;
+    END LOOP;
+END;
+$$;
+SELECT install_order_ids();
+
+CREATE INDEX idx_orders_timestamp ON orders (timestamp) INCLUDE (customer_id, employee_id, total_price);
+CREATE INDEX idx_orders_customer_id ON orders (customer_id);
+CREATE INDEX idx_orders_employee_id ON orders (employee_id);
+CREATE INDEX IF NOT EXISTS idx_joint_order_items_order_id ON joint_order_items (order_id);
+CREATE INDEX IF NOT EXISTS idx_joint_order_items_menu_item_id ON joint_order_items (menu_item_id);
+CREATE INDEX IF NOT EXISTS idx_joint_recipe_ingredients_menu_item_id ON joint_recipe_ingredients (menu_item_id);
+
+SELECT maintain_orders_partitions();
+
+ANALYZE orders;
+ANALYZE joint_order_items;
@@ -0,0 +1,115 @@
+# stage-level instrumentation for the data pipeline scripts (csvPopulator.py,
+# populate_menu_items_script.py, setup_database.py): wall / CPU time, tracemalloc peak memory and
+# row counts per stage, written to a JSON metrics file, plus an optional cProfile dump per stage
+#
+#   with metrics.stage("orders") as stage:
+#       stage["rows"] = write_orders(...)
+
+import cProfile
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+def add_metrics_args(parser):
+    parser.add_argument("--metrics", help="write per-stage time, peak memory and row counts to this JSON file")
+    parser.add_argument("--profile-dir", help="also dump a cProfile .prof file per stage into this directory")
+    parser.add_argument("--no-trace-memory", action="store_true",
+                        help="skip tracemalloc (it slows allocation-heavy stages down)")
+
+
+class PipelineMetrics:
+    """Collects one record per stage.
+
+    Memory is the tracemalloc peak of the stage (Python and NumPy allocations
+    of this process; --workers child processes are not traced). Stages don't
+    nest.
+    """
+
+    def __init__(self, script, trace_memory=True, profile_dir=None):
+        self.script = script
+        self.trace_memory = trace_memory
+        self.profile_dir = os.path.abspath(profile_dir) if profile_dir else None  # scripts may chdir
+        self.stages = []
+        self.started = time.time()
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if profile_dir:
+            os.makedirs(profile_dir, exist_ok=True)
+
+    @classmethod
+    def from_args(cls, script, args):
+        return cls(script, not args.no_trace_memory, args.profile_dir)
+
+    @contextmanager
+    def stage(self, name):
+        """Time the block; set record["rows"] inside it to get rows/sec."""
+        record = {"stage": name, "rows": None}
+        profiler = cProfile.Profile() if self.profile_dir else None
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        cpu0 = time.process_time()
+        t0 = time.perf_counter()
+        if profiler:
+            profiler.enable()
+        try:
+            yield record
+        finally:
+            if profiler:
+                profiler.disable()
+                profiler.dump_stats(os.path.join(self.profile_dir, f"{self.script}.{name}.prof"))
+            record["seconds"] = time.perf_counter() - t0
+            record["cpu_seconds"] = time.process_time() - cpu0
+            if self.trace_memory:
+                record["peak_mib"] = (tracemalloc.get_traced_memory()[1] - base) / 2 ** 20
+            if record["rows"] and record["seconds"] > 0:
+                record["rows_per_sec"] = record["rows"] / record["seconds"]
+            self.stages.append(record)
+
+    def summary(self):
+        lines = [f"{'stage':<14} {'rows':>12} {'seconds':>9} {'cpu s':>9} {'peak MiB':>9}"]
+        for s in self.stages:
+            rows = f"{s['rows']:,}" if s["rows"] is not None else ""
+            peak = f"{s['peak_mib']:.1f}" if "peak_mib" in s else ""
+            lines.append(f"{s['stage']:<14} {rows:>12} {s['seconds']:>9.3f} {s['cpu_seconds']:>9.3f} {peak:>9}")
+        return "\n".join(lines)
+
+    def write(self, path):
+        report = {
+            "script": self.script,
+            "argv": sys.argv[1:],
+            "started": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.started)),
+            "total_seconds": sum(s["seconds"] for s in self.stages),
+            "trace_memory": self.trace_memory,
+            "stages": self.stages,
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+class NullMetrics:
+    """Stand-in when no metrics were asked for: stages cost nothing."""
+
+    @contextmanager
+    def stage(self, name):
+        yield {"stage": name, "rows": None}
+
+
+def metrics_from_args(script, args):
+    if args.metrics or args.profile_dir:
+        return PipelineMetrics.from_args(script, args)
+    return NullMetrics()
+
+
+def finish_metrics(metrics, args):
+    """Print the stage table and write the JSON file, if metrics were collected."""
+    if isinstance(metrics, NullMetrics):
+        return
+    print(metrics.summary())
+    if args.metrics:
+        metrics.write(args.metrics)
+        print(f"metrics written to {args.metrics}")
@@ -1,5 +1,13 @@
+import argparse
 import random
 import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import csvPopulator
+import demand_model
+from pipeline_metrics import NullMetrics, add_metrics_args, finish_metrics, metrics_from_args
 
 
 
@@ -61,9 +69,10 @@ INVENTORY_ITEMS = [
 
 # CONSTANTS
 NUM_WEEKS = 52
+CHUNK_SIZE = 100_000  # orders per shard with --workers / per streamed write
+BATCH_SIZE = 1000  # rows per multi-row INSERT with --format batch
 TOTAL_SALES_TARGET = 1_000_000  # ~ $1M target for team of 5
 PEAK_DAYS = 2
-NUM_ORDERS = 20000  # adjust until sales ~ 1M
 
 
 # HELPER FUNCTIONS
@@ -80,106 +89,284 @@ def random_date(start, end):
 
 # data generation
 NUM_CUSTOMERS = 2000
-customer_records = []
 NUM_EMPLOYEES = 15
 NUM_MANAGERS = 3
-employees_records = []
-menu_item_records = []
-inventory_records = []
-NUM_ORDERS = 20000
-order_records = []
-joint_order_item_records = []
-joint_recipe_ingredient_records = []
-
-# IDs start from 1
-menu_item_id_map = {}
-inventory_item_id_map = {}
+
+# table -> columns, matching create_tables.sql
+TABLE_COLUMNS = {
+    "employees": ["id", "name", "email", "is_manager"],
+    "customers": ["id", "name", "phone_number", "pearls"],
+    "menu_items": ["id", "name", "price", "is_modification", "description"],
+    "inventory": ["id", "name", "quantity", "restock_price"],
+    "joint_recipe_ingredients": ["menu_item_id", "inventory_item_id", "quantity_used"],
+    "orders": ["id", "customer_id", "timestamp", "total_price", "pearls_earned", "employee_id"],
+    "joint_order_items": ["order_id", "menu_item_id", "line_number", "quantity", "unit_price", "parent_line"],
+}
 
 # --- Insert Employees ---
-for i in range(1, NUM_EMPLOYEES + 1):
-    name = f"Employee{i}"
-    is_manager = (i<=NUM_MANAGERS)
-    employees_records.append(f"INSERT INTO employees (id, name, email, is_manager) VALUES ({i}, '{name}', {name}@teaone.com, {is_manager});")
+def generate_employee_rows():
+    employee_rows = []
+    for i in range(1, NUM_EMPLOYEES + 1):
+        name = f"Employee{i}"
+        is_manager = (i<=NUM_MANAGERS)
+        employee_rows.append((i, name, f"{name}@teaone.com", is_manager))
+    return employee_rows
 
 # --- Insert Customers ---
-for i in range(1, NUM_CUSTOMERS + 1):
-    name = f"Customer{i}"
-    phone_number = random.randint(1000000000, 9999999999)
-    employees_records.append(f"INSERT INTO employees (id, name, phone_number, pearls) VALUES ({i}, '{name}', {phone_number}, {is_manager});")
+def generate_customer_rows():
+    customer_rows = []
+    for i in range(1, NUM_CUSTOMERS + 1):
+        name = f"Customer{i}"
+        phone_number = random.randint(1000000000, 9999999999)
+        pearls = random.randint(0, 200)
+        customer_rows.append((i, name, str(phone_number), pearls))
+    return customer_rows
 
 # --- Insert Menu Items ---
-for i, (name, price, desc) in enumerate(MENU_ITEMS, start=1):
-    menu_item_records.append(f"INSERT INTO menu_items (id, name, price, is_mod, description) VALUES ({i}, '{name}', {price}, {False}, '{desc}');")
-    menu_item_id_map[name] = i
-for i, (name, price, desc) in enumerate(ADDON_ITEMS, start=len(MENU_ITEMS)+1):
-    menu_item_records.append(f"INSERT INTO menu_items (id, name, price, is_mod, description) VALUES ({i}, '{name}', {price}, {True}, '{desc}');")
-    menu_item_id_map[name] = i
+def generate_menu_item_rows():
+    """Returns (rows, {name: id}); IDs start from 1."""
+    menu_item_rows = []
+    menu_item_id_map = {}
+    for i, (name, price, desc) in enumerate(MENU_ITEMS, start=1):
+        menu_item_rows.append((i, name, price, False, desc))
+        menu_item_id_map[name] = i
+    for i, (name, price, desc) in enumerate(ADDON_ITEMS, start=len(MENU_ITEMS)+1):
+        menu_item_rows.append((i, name, price, True, desc))
+        menu_item_id_map[name] = i
+    return menu_item_rows, menu_item_id_map
 
 # --- Insert Inventory Items ---
-for j, name in enumerate(INVENTORY_ITEMS, 1):
-    quantity = random.randint(500, 2000)
-    restock_price = round(random.uniform(5, 50), 2)
-    inventory_records.append(f"INSERT INTO inventory (id, name, quantity, restock_price) VALUES ({j}, '{name}', {quantity}, {restock_price});")
-    inventory_item_id_map[name] = j
+def generate_inventory_rows():
+    """Returns (rows, {name: id})."""
+    inventory_rows = []
+    inventory_item_id_map = {}
+    for j, name in enumerate(INVENTORY_ITEMS, 1):
+        quantity = random.randint(500, 2000)
+        restock_price = round(random.uniform(5, 50), 2)
+        inventory_rows.append((j, name, quantity, restock_price))
+        inventory_item_id_map[name] = j
+    return inventory_rows, inventory_item_id_map
 
 # --- Define Recipes (menu_items -> inventory items) ---
-for (name, _, _) in MENU_ITEMS:  # main drinks only
-    menu_id = menu_item_id_map[name]
-    needed_ingredients = random.sample(INVENTORY_ITEMS, random.randint(2, 5))
-    for ingr in needed_ingredients:
-        qty_used = random.randint(1, 3)
-        ingr_id = inventory_item_id_map[ingr]
-        joint_recipe_ingredient_records.append(
-            f"INSERT INTO joint_recipe_ingredients (menu_item_id, inventory_item_id, quantity_used) VALUES ({menu_id}, {ingr_id}, {qty_used});"
-        )
+def generate_recipe_rows(menu_item_id_map, inventory_item_id_map):
+    joint_recipe_ingredient_rows = []
+    for (name, _, _) in MENU_ITEMS:  # main drinks only
+        menu_id = menu_item_id_map[name]
+        needed_ingredients = random.sample(INVENTORY_ITEMS, random.randint(2, 5))
+        for ingr in needed_ingredients:
+            qty_used = random.randint(1, 3)
+            ingr_id = inventory_item_id_map[ingr]
+            joint_recipe_ingredient_rows.append((menu_id, ingr_id, qty_used))
+    return joint_recipe_ingredient_rows
+
+def generate_static_rows(metrics=NullMetrics()):
+    """Build the employee, customer, menu, inventory and recipe rows as tuples, one metrics stage each.
+
+    The stages draw from `random` in this order; keep it so a --seed
+    reproduces the same file.
+    """
+    with metrics.stage("employees") as stage:
+        employee_rows = generate_employee_rows()
+        stage["rows"] = len(employee_rows)
+    with metrics.stage("customers") as stage:
+        customer_rows = generate_customer_rows()
+        stage["rows"] = len(customer_rows)
+    with metrics.stage("menu") as stage:
+        menu_item_rows, menu_item_id_map = generate_menu_item_rows()
+        stage["rows"] = len(menu_item_rows)
+    with metrics.stage("inventory") as stage:
+        inventory_rows, inventory_item_id_map = generate_inventory_rows()
+        stage["rows"] = len(inventory_rows)
+    with metrics.stage("recipes") as stage:
+        joint_recipe_ingredient_rows = generate_recipe_rows(menu_item_id_map, inventory_item_id_map)
+        stage["rows"] = len(joint_recipe_ingredient_rows)
+
+    static_sections = [
+        ("EMPLOYEES", "employees", employee_rows),
+        ("CUSTOMERS", "customers", customer_rows),
+        ("MENU ITEMS", "menu_items", menu_item_rows),
+        ("INVENTORY", "inventory", inventory_rows),
+        ("RECIPES", "joint_recipe_ingredients", joint_recipe_ingredient_rows),
+    ]
+    return static_sections, menu_item_id_map
 
 # --- Insert Orders ---
-start_date = datetime.datetime.now() - datetime.timedelta(weeks=NUM_WEEKS)
-end_date = datetime.datetime.now()
-
-for order_id in range(1, NUM_ORDERS + 1):
-    customer_id = random.randint(1, NUM_CUSTOMERS+1)
-    employee_id = random.randint(1, NUM_EMPLOYEES+1)
-    complete_time = random_date(start_date, end_date).strftime('%Y-%m-%d %H:%M:%S')
-    
-    # pick 1-3 items per order
-    items = random.sample(MENU_ITEMS, random.randint(1, 3))
-    order_total = sum([price for (_, price, _) in items])
-    pearls_earned = int(order_total // 2)
-    
-    order_records.append(
-        f"INSERT INTO orders (id, customer_id, complete_time, order_total_price, pearls_earned, employee_id) "
-        f"VALUES ({order_id}, {customer_id}, '{complete_time}', {order_total:.2f}, {pearls_earned}, {employee_id});"
-    )
-    
-    # link order -> items
-    for (item, _, _) in items:
-        item_id = menu_item_id_map[item]
-        joint_order_item_records.append(
-            f"INSERT INTO joint_order_item (order_id, menu_item_id) VALUES ({order_id}, {item_id});"
-        )
+def generate_order_rows(start_date, end_date, menu_item_id_map, num_orders):
+    """Original per-order loop; yields (order rows, order item rows) every CHUNK_SIZE orders."""
+    order_rows = []
+    joint_order_item_rows = []
+    for order_id in range(1, num_orders + 1):
+        customer_id = random.randint(1, NUM_CUSTOMERS)
+        employee_id = random.randint(1, NUM_EMPLOYEES)
+        complete_time = random_date(start_date, end_date).strftime('%Y-%m-%d %H:%M:%S')
+
+        # pick 1-3 items per order
+        items = random.sample(MENU_ITEMS, random.randint(1, 3))
+        order_total = sum([price for (_, price, _) in items])
+        pearls_earned = int(order_total // 2)
+
+        order_rows.append((order_id, customer_id, complete_time, round(order_total, 2), pearls_earned, employee_id))
+
+        # link order -> items, one line each at the current price
+        for line_number, (item, price, _) in enumerate(items, 1):
+            item_id = menu_item_id_map[item]
+            joint_order_item_rows.append((order_id, item_id, line_number, 1, price, 0))
+
+        if order_id % CHUNK_SIZE == 0:
+            yield order_rows, joint_order_item_rows
+            order_rows = []
+            joint_order_item_rows = []
+    if order_rows:
+        yield order_rows, joint_order_item_rows
+
+# ----------------------------
+# SQL rendering
+# ----------------------------
+def sql_literal(value):
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    return str(value)
+
+def copy_field(value):
+    # COPY text format: tab separated, backslash escapes
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+def render_section(fmt, table, rows, batch_size=BATCH_SIZE):
+    """Render rows for table as SQL text.
+
+    insert: one INSERT per row (original output)
+    batch:  multi-row INSERTs of batch_size rows inside BEGIN/COMMIT
+    copy:   a COPY ... FROM stdin data block, terminated by \.
+    """
+    columns = TABLE_COLUMNS[table]
+    if not rows:
+        return ""
+    if fmt == "copy":
+        lines = [f"COPY {table} ({', '.join(columns)}) FROM stdin;"]
+        lines.extend("\t".join(copy_field(v) for v in row) for row in rows)
+        lines.append("\\.")
+        return "\n".join(lines) + "\n"
+
+    # ids are GENERATED ALWAYS, so explicit ids need OVERRIDING SYSTEM VALUE
+    overriding = " OVERRIDING SYSTEM VALUE" if "id" in columns else ""
+    prefix = f"INSERT INTO {table} ({', '.join(columns)}){overriding} VALUES "
+    values = ["(" + ", ".join(sql_literal(v) for v in row) + ")" for row in rows]
+    if fmt == "insert":
+        return "\n".join(prefix + v + ";" for v in values) + "\n"
+    lines = ["BEGIN;"]
+    for start in range(0, len(values), batch_size):
+        lines.append(prefix + ",\n".join(values[start:start + batch_size]) + ";")
+    lines.append("COMMIT;")
+    return "\n".join(lines) + "\n"
+
+def render_orders(fmt, batch_size, order_rows, joint_order_item_rows):
+    return (render_section(fmt, "orders", order_rows, batch_size),
+            render_section(fmt, "joint_order_items", joint_order_item_rows, batch_size))
+
+def render_order_shard(task):
+    """Worker: generate one id-range shard of orders and render its SQL."""
+    (chunk_index, offset, n), gen_args, fmt, batch_size = task
+    chunk = csvPopulator.generate_order_chunk(chunk_index, offset, n, *gen_args, menu=MENU_ITEMS, addons=ADDON_ITEMS)
+    order_rows, joint_order_item_rows = csvPopulator.order_chunk_rows(chunk)
+    return render_orders(fmt, batch_size, list(order_rows), list(joint_order_item_rows))
+
+def render_orders_parallel(start_date, end_date, menu_item_id_map, num_orders, seed, workers, fmt, batch_size):
+    """Yield rendered order shards from a process pool, in shard order.
+
+    Shards are seeded from (seed, shard index), so the SQL is the same for
+    any number of workers.
+    """
+    entropy = np.random.SeedSequence(seed).entropy
+    gen_args = (start_date, end_date, [], menu_item_id_map, entropy)  # no peak days in this script
+    tasks = [(shard, gen_args, fmt, batch_size) for shard in csvPopulator.order_shards(num_orders, CHUNK_SIZE)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(render_order_shard, tasks)
+
+def calibrated_orders(start_date, end_date, sharded):
+    """Number of orders whose expected sales are TOTAL_SALES_TARGET, for the sharded (demand_model) or loop generator."""
+    if sharded:
+        num_orders, _, _ = demand_model.calibrate(TOTAL_SALES_TARGET, start_date, end_date, [], MENU_ITEMS,
+                                                  ADDON_ITEMS)
+        return num_orders
+    # loop: 1-3 distinct drinks, uniformly -> 2 drinks of the average price per order
+    mean_price = sum(price for (_, price, _) in MENU_ITEMS) / len(MENU_ITEMS)
+    return round(TOTAL_SALES_TARGET / (2 * mean_price))
 
 # ----------------------------
 # Write to .sql file
 # ----------------------------
-with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-    f.write("-- EMPLOYEES\n")
-    f.write("\n".join(employees_records) + "\n\n")
-    f.write("-- CUSTOMERS\n")
-    f.write("\n".join(customer_records) + "\n\n")
-    f.write("-- MENU ITEMS\n")
-    f.write("\n".join(menu_item_records) + "\n\n")
-    print('PASSED MENU ITEMS')
-    f.write("-- INVENTORY\n")
-    f.write("\n".join(inventory_records) + "\n\n")
-    
-    f.write("-- RECIPES\n")
-    f.write("\n".join(joint_recipe_ingredient_records) + "\n\n")
-    
-    f.write("-- ORDERS\n")
-    f.write("\n".join(order_records) + "\n\n")
-    
-    f.write("-- ORDER -> ITEMS\n")
-    f.write("\n".join(joint_order_item_records) + "\n\n")
-
-print(f"✅ Done! SQL data written to {OUTPUT_FILE}")
+def write_sql(static_sections, order_sections, fmt, num_orders, batch_size=BATCH_SIZE, metrics=NullMetrics()):
+    """Stream the seed file section by section; orders are written one chunk at a time.
+
+    Each chunk's orders are written before its order items so foreign keys
+    hold at every point of the replay. The static sections are the "write"
+    stage; order generation is lazy, so the "orders" stage covers
+    generating, rendering and writing them.
+    """
+    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
+        with metrics.stage("write") as stage:
+            for comment, table, rows in static_sections:
+                f.write(f"-- {comment}\n")
+                f.write(render_section(fmt, table, rows, batch_size) + "\n")
+            stage["rows"] = sum(len(rows) for _, _, rows in static_sections)
+        print('PASSED MENU ITEMS')
+
+        with metrics.stage("orders") as stage:
+            f.write("-- ORDERS / ORDER -> ITEMS\n")
+            for orders_sql, items_sql in order_sections:
+                f.write(orders_sql)
+                f.write(items_sql)
+            stage["rows"] = num_orders
+
+        f.write("\n-- IDENTITY SEQUENCES\n")
+        for table, columns in TABLE_COLUMNS.items():
+            if "id" in columns:
+                f.write(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT COALESCE(MAX(id), 0) + 1 FROM {table}), false);\n")
+
+def main():
+    parser = argparse.ArgumentParser(description=f"Generate {OUTPUT_FILE} seed data.")
+    parser.add_argument("--orders", type=int,
+                        help=f"number of orders to generate (default: as many as reach ${TOTAL_SALES_TARGET:,} "
+                             "of expected sales)")
+    parser.add_argument("--format", choices=["insert", "batch", "copy"], default="insert",
+                        help="one INSERT per row (default), multi-row INSERT batches in transactions, "
+                             "or psql COPY ... FROM stdin data blocks")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="rows per INSERT with --format batch")
+    parser.add_argument("--workers", type=int,
+                        help="generate orders in id-range shards over this many processes (seeded, reproducible)")
+    parser.add_argument("--seed", type=int, help="fixed seed for reproducible output")
+    parser.add_argument("--end-date", type=datetime.datetime.fromisoformat,
+                        help="last day of the order window (default: now)")
+    add_metrics_args(parser)
+    args = parser.parse_args()
+    if args.seed is not None:
+        random.seed(args.seed)
+    metrics = metrics_from_args("populate_menu_items_script", args)
+
+    static_sections, menu_item_id_map = generate_static_rows(metrics)
+
+    end_date = args.end_date or datetime.datetime.now()
+    start_date = end_date - datetime.timedelta(weeks=NUM_WEEKS)
+    num_orders = args.orders
+    if num_orders is None:
+        num_orders = calibrated_orders(start_date, end_date, bool(args.workers))
+        print(f"{num_orders:,} orders for ${TOTAL_SALES_TARGET:,} of expected sales")
+    if args.workers:
+        order_sections = render_orders_parallel(start_date, end_date, menu_item_id_map, num_orders, args.seed,
+                                                args.workers, args.format, args.batch_size)
+    else:
+        order_sections = (render_orders(args.format, args.batch_size, order_rows, joint_order_item_rows)
+                          for order_rows, joint_order_item_rows in
+                          generate_order_rows(start_date, end_date, menu_item_id_map, num_orders))
+
+    write_sql(static_sections, order_sections, args.format, num_orders, args.batch_size, metrics)
+    finish_metrics(metrics, args)
+
+    print(f"✅ Done! SQL data written to {OUTPUT_FILE}")
+
+if __name__ == "__main__":
+    main()
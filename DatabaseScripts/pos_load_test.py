@@ -0,0 +1,273 @@
+# point-of-sale write path load generator: replays orders drawn from the csvPopulator.py
+# distributions through concurrent workers, one transaction per sale, and reports throughput,
+# latency percentiles, deadlocks and serialization retries. It writes real rows (orders, order
+# items, inventory, pearls), so point it at a local / test database.
+#
+#   python pos_load_test.py [connection flags] --workers 8 --sales 5000 --inventory row
+#   python pos_load_test.py [connection flags] --workers 8 --sales 5000 --inventory batch --isolation serializable
+
+import argparse
+import datetime
+import random
+import threading
+import time
+from collections import defaultdict
+
+import psycopg2
+from psycopg2.extensions import (ISOLATION_LEVEL_READ_COMMITTED, ISOLATION_LEVEL_REPEATABLE_READ,
+                                 ISOLATION_LEVEL_SERIALIZABLE)
+
+import csvPopulator
+import database
+from benchmark_queries import percentile
+
+ISOLATION_LEVELS = {
+    "read-committed": ISOLATION_LEVEL_READ_COMMITTED,
+    "repeatable-read": ISOLATION_LEVEL_REPEATABLE_READ,
+    "serializable": ISOLATION_LEVEL_SERIALIZABLE,
+}
+
+DEADLOCK = "40P01"
+SERIALIZATION_FAILURE = "40001"
+
+# ----------------------------
+# Sales
+# ----------------------------
+def load_catalog(conn):
+    """Menu ids by name, prices by menu item id, recipes by menu item id, and the customer / employee ids
+    in the database."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT id, name, price FROM menu_items;")
+        menu_items = cur.fetchall()
+        menu_item_id_map = {name: item_id for item_id, name, _ in menu_items}
+        menu_prices = {item_id: price for item_id, _, price in menu_items}
+        cur.execute("SELECT menu_item_id, inventory_item_id, quantity_used FROM joint_recipe_ingredients;")
+        recipes = defaultdict(list)
+        for menu_item_id, inventory_item_id, quantity_used in cur.fetchall():
+            recipes[menu_item_id].append((inventory_item_id, quantity_used))
+        cur.execute("SELECT id FROM customers ORDER BY id;")
+        customer_ids = [row[0] for row in cur.fetchall()]
+        cur.execute("SELECT id FROM employees ORDER BY id;")
+        employee_ids = [row[0] for row in cur.fetchall()]
+    conn.rollback()
+    return menu_item_id_map, menu_prices, recipes, customer_ids, employee_ids
+
+
+def generate_sales(num_sales, menu_item_id_map, menu_prices, customer_ids, employee_ids, seed=None):
+    """Draw num_sales sales as (customer_id, employee_id, total, pearls, [order lines]).
+
+    An order line is (menu item id, line number, quantity, unit price, parent line).
+
+    Orders come from csvPopulator.generate_order_chunks (same drink counts,
+    add-ons and menu mix); its customer / employee numbers are mapped onto
+    the ids that exist in the database. Lines are priced at the database's
+    menu_items.price, and the total and pearls are summed from those lines,
+    as the register would.
+    """
+    menu = [item for item in csvPopulator.MENU_ITEMS if item[0] in menu_item_id_map]
+    end = datetime.datetime.now()
+    sales = []
+    for chunk in csvPopulator.generate_order_chunks(end - datetime.timedelta(days=1), end, [], menu_item_id_map,
+                                                    num_sales, seed=seed, menu=menu):
+        lines_by_order = defaultdict(list)
+        for order_id, menu_item_id, line, quantity, parent in zip(
+                chunk.item_order_ids.tolist(), chunk.item_menu_ids.tolist(), chunk.item_line_numbers.tolist(),
+                chunk.item_quantities.tolist(), chunk.item_parent_lines.tolist()):
+            lines_by_order[order_id].append((menu_item_id, line, quantity, menu_prices[menu_item_id], parent))
+        for order_id, customer, employee in zip(
+                chunk.order_ids.tolist(), chunk.customer_ids.tolist(), chunk.employee_ids.tolist()):
+            lines = lines_by_order[order_id]
+            # prices are Decimals, so the total is exact
+            total = sum(quantity * price for _, _, quantity, price, _ in lines)
+            sales.append((customer_ids[(customer - 1) % len(customer_ids)],
+                          employee_ids[(employee - 1) % len(employee_ids)],
+                          total, int(total * 100) // 200, lines))
+    return sales
+
+# ----------------------------
+# Inventory decrements
+# ----------------------------
+def ingredient_usage(lines, recipes):
+    """(inventory id, quantity) for every recipe row of every order line, in line order."""
+    return [(inventory_item_id, quantity_used * quantity)
+            for menu_item_id, _, quantity, _, _ in lines
+            for inventory_item_id, quantity_used in recipes.get(menu_item_id, [])]
+
+
+def decrement_rows(cur, usage):
+    """One UPDATE per recipe row, in whatever order the order's items come in (the naive write path)."""
+    for inventory_item_id, quantity in usage:
+        cur.execute("UPDATE inventory SET quantity = quantity - %s WHERE id = %s;", (quantity, inventory_item_id))
+
+
+def aggregate(usage):
+    totals = defaultdict(int)
+    for inventory_item_id, quantity in usage:
+        totals[inventory_item_id] += quantity
+    return sorted(totals.items())
+
+
+def decrement_aggregated(cur, usage):
+    """One UPDATE per distinct ingredient, in id order, so sales always lock rows in the same order."""
+    for inventory_item_id, quantity in aggregate(usage):
+        cur.execute("UPDATE inventory SET quantity = quantity - %s WHERE id = %s;", (quantity, inventory_item_id))
+
+
+def decrement_batch(cur, usage):
+    """All of the sale's ingredients in one UPDATE; the rows are locked in id order first."""
+    totals = aggregate(usage)
+    if not totals:
+        return
+    ids = [inventory_item_id for inventory_item_id, _ in totals]
+    quantities = [quantity for _, quantity in totals]
+    cur.execute("SELECT id FROM inventory WHERE id = ANY(%s) ORDER BY id FOR UPDATE;", (ids,))
+    cur.execute(
+        "UPDATE inventory SET quantity = inventory.quantity - used.quantity "
+        "FROM unnest(%s::int[], %s::int[]) AS used(id, quantity) WHERE inventory.id = used.id;",
+        (ids, quantities))
+
+
+INVENTORY_MODES = {
+    "row": decrement_rows,
+    "aggregated": decrement_aggregated,
+    "batch": decrement_batch,
+}
+
+# ----------------------------
+# Workers
+# ----------------------------
+def record_sale(cur, sale, recipes, decrement):
+    customer_id, employee_id, total, pearls, lines = sale
+    cur.execute(
+        "INSERT INTO orders (customer_id, timestamp, total_price, pearls_earned, employee_id) "
+        "VALUES (%s, LOCALTIMESTAMP, %s, %s, %s) RETURNING id;",
+        (customer_id, total, pearls, employee_id))
+    order_id = cur.fetchone()[0]
+    cur.execute(
+        "INSERT INTO joint_order_items (order_id, menu_item_id, line_number, quantity, unit_price, parent_line) "
+        "SELECT %s, * FROM unnest(%s::int[], %s::int[], %s::int[], %s::numeric[], %s::int[]);",
+        (order_id, *(list(column) for column in zip(*lines))))
+    # the customer's pearls are credited by the loyalty_ledger.sql trigger on orders
+    # inventory rows (cups, ice... are in most sales) after the order rows, so their row locks
+    # are held only from here to the commit
+    decrement(cur, ingredient_usage(lines, recipes))
+
+
+class LoadStats:
+    def __init__(self):
+        self.latencies_ms = []
+        self.deadlocks = 0
+        self.serialization_failures = 0
+        self.failures = 0
+        self.errors = 0
+        self.first_error = None
+        self.lock = threading.Lock()
+
+
+def run_worker(pool, sales, next_sale, recipes, decrement, isolation, retries, stats):
+    latencies = []
+    deadlocks = serialization_failures = failures = errors = 0
+    first_error = None
+    try:
+        with pool.connection() as conn:
+            conn.set_session(isolation_level=isolation)
+            cur = conn.cursor()
+            while True:
+                with next_sale["lock"]:
+                    index = next_sale["index"]
+                    next_sale["index"] += 1
+                if index >= len(sales):
+                    break
+                t0 = time.perf_counter()
+                for attempt in range(retries + 1):
+                    try:
+                        record_sale(cur, sales[index], recipes, decrement)
+                        conn.commit()
+                        latencies.append((time.perf_counter() - t0) * 1000)
+                        break
+                    except psycopg2.Error as e:
+                        conn.rollback()
+                        if e.pgcode == DEADLOCK:
+                            deadlocks += 1
+                        elif e.pgcode == SERIALIZATION_FAILURE:
+                            serialization_failures += 1
+                        else:
+                            # not worth retrying: the sale fails, the worker moves on to the next one
+                            errors += 1
+                            failures += 1
+                            first_error = first_error or str(e).strip()
+                            break
+                        if attempt == retries:
+                            failures += 1
+                        else:
+                            time.sleep(0.001 * 2 ** attempt * random.random())
+            cur.close()
+    finally:
+        # also when the connection itself breaks, so the sales so far still count
+        with stats.lock:
+            stats.latencies_ms.extend(latencies)
+            stats.deadlocks += deadlocks
+            stats.serialization_failures += serialization_failures
+            stats.failures += failures
+            stats.errors += errors
+            stats.first_error = stats.first_error or first_error
+
+
+def run_load(pool, sales, recipes, workers, mode, isolation, retries):
+    """Push every sale through workers threads; returns (LoadStats, wall seconds)."""
+    stats = LoadStats()
+    next_sale = {"index": 0, "lock": threading.Lock()}
+    threads = [threading.Thread(target=run_worker,
+                                args=(pool, sales, next_sale, recipes, INVENTORY_MODES[mode],
+                                      ISOLATION_LEVELS[isolation], retries, stats))
+               for _ in range(workers)]
+    t0 = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return stats, time.perf_counter() - t0
+
+
+def print_report(mode, workers, isolation, stats, wall):
+    committed = len(stats.latencies_ms)
+    print(f"inventory={mode} workers={workers} isolation={isolation}")
+    print(f"  {committed:,} sales committed in {wall:.2f}s: {committed / wall:,.1f} TPS")
+    if committed:
+        lat = stats.latencies_ms
+        print(f"  latency ms  p50 {percentile(lat, 50):.2f}  p95 {percentile(lat, 95):.2f}  "
+              f"p99 {percentile(lat, 99):.2f}  max {max(lat):.2f}")
+    print(f"  deadlocks {stats.deadlocks}, serialization retries {stats.serialization_failures}, "
+          f"gave up {stats.failures} (errors {stats.errors})")
+    if stats.first_error:
+        print(f"  first error: {stats.first_error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent point-of-sale write load against the database.")
+    database.add_connection_args(parser)
+    parser.add_argument("--workers", type=int, default=8, help="concurrent sessions")
+    parser.add_argument("--sales", type=int, default=2000, help="sales per inventory mode")
+    parser.add_argument("--inventory", choices=list(INVENTORY_MODES) + ["all"], default="row",
+                        help="how a sale decrements inventory; 'all' runs each mode in turn")
+    parser.add_argument("--isolation", choices=list(ISOLATION_LEVELS), default="read-committed")
+    parser.add_argument("--retries", type=int, default=10,
+                        help="attempts per sale after a deadlock or serialization failure")
+    parser.add_argument("--seed", type=int, help="fixed seed for the generated sales")
+    args = parser.parse_args()
+
+    pool = database.DatabasePool.from_args(args, maxconn=args.workers)
+    try:
+        with pool.connection() as conn:
+            menu_item_id_map, menu_prices, recipes, customer_ids, employee_ids = load_catalog(conn)
+        sales = generate_sales(args.sales, menu_item_id_map, menu_prices, customer_ids, employee_ids, args.seed)
+        modes = list(INVENTORY_MODES) if args.inventory == "all" else [args.inventory]
+        for mode in modes:
+            stats, wall = run_load(pool, sales, recipes, args.workers, mode, args.isolation, args.retries)
+            print_report(mode, args.workers, args.isolation, stats, wall)
+    finally:
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+# versioned result cache for the report queries in required_queries.py
+#
+# Entries are keyed by (query name, parameters, data version). The data version of a query is the
+# change counters (data_versions.sql) of the tables it reads, so new orders only invalidate the
+# reports that read orders (or the rollups), never e.g. the inventory or recipe reports.
+#
+#   python report_cache.py [connection flags] --repeat 5 --ttl 300    run the reports through the cache
+
+import argparse
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from required_queries import QUERY_GROUPS, add_query_args, check_rollup_range, query_overrides, query_params
+
+TABLE_REFERENCE = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)", re.IGNORECASE)
+
+
+def query_tables(query):
+    """Names following FROM / JOIN in the query (CTE names included; untracked names are ignored)."""
+    return sorted({name.lower() for name in TABLE_REFERENCE.findall(query.sql)})
+
+
+class ReportCache:
+    """LRU + TTL cache of report rows in front of a database.DatabasePool.
+
+    fetch_query() has the same signature as DatabasePool.fetch_query, so the
+    cache can be passed anywhere a pool runs catalog queries (e.g.
+    database.run_concurrently). Versions are re-read at most every
+    version_interval seconds; 0 checks them on every call.
+    """
+
+    def __init__(self, pool, max_entries=256, ttl=300.0, version_interval=0.0):
+        self.pool = pool
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version_interval = version_interval
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.seconds_saved = 0.0
+        self._entries = OrderedDict()  # (name, params) -> (version, rows, stored at, query seconds)
+        self._versions = {}
+        self._versions_read = None
+        self._lock = threading.Lock()
+
+    def data_versions(self):
+        """{table: change counter}, read from data_versions at most every version_interval seconds."""
+        now = time.monotonic()
+        with self._lock:
+            if self._versions_read is not None and now - self._versions_read < self.version_interval:
+                return self._versions
+
+        def read(conn):
+            with conn.cursor() as cur:
+                # a table's counter is the sum of its shard rows
+                cur.execute("SELECT table_name, SUM(version)::bigint FROM data_versions GROUP BY table_name")
+                return dict(cur.fetchall())
+        versions = self.pool.run(read)
+        with self._lock:
+            self._versions = versions
+            self._versions_read = now
+        return versions
+
+    def fetch_query(self, query, overrides=None):
+        params = query_params(query, overrides)
+        key = (query.name, tuple(sorted(params.items())))
+        versions = self.data_versions()
+        version = tuple((table, versions[table]) for table in query_tables(query) if table in versions)
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                cached_version, rows, stored, seconds = entry
+                if cached_version != version:
+                    self.invalidations += 1
+                    del self._entries[key]
+                elif now - stored > self.ttl:
+                    self.expirations += 1
+                    del self._entries[key]
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    self.seconds_saved += seconds
+                    return rows
+            self.misses += 1
+
+        t0 = time.perf_counter()
+        rows = self.pool.fetch_query(query, params)
+        seconds = time.perf_counter() - t0
+
+        with self._lock:
+            self._entries[key] = (version, rows, time.monotonic(), seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return rows
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions_read = None
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "expirations": self.expirations,
+                "evictions": self.evictions,
+                "seconds_saved": self.seconds_saved,
+            }
+
+
+def main():
+    import database  # needs psycopg2
+
+    parser = argparse.ArgumentParser(description="Run the report queries through the versioned result cache.")
+    database.add_connection_args(parser)
+    parser.add_argument("--repeat", type=int, default=5, help="run the whole report set this many times")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--max-entries", type=int, default=256)
+    parser.add_argument("--ttl", type=float, default=300.0, help="seconds an entry stays valid")
+    parser.add_argument("--version-interval", type=float, default=0.0,
+                        help="seconds between data_versions reads (0: every lookup)")
+    add_query_args(parser)
+    args = parser.parse_args()
+    check_rollup_range(parser, args)
+
+    pool = database.DatabasePool.from_args(args, maxconn=args.workers)
+    cache = ReportCache(pool, args.max_entries, args.ttl, args.version_interval)
+    queries = [query for _, group in QUERY_GROUPS for query in group]
+    try:
+        for run in range(1, args.repeat + 1):
+            t0 = time.perf_counter()
+            database.run_concurrently(cache, queries, args.workers, query_overrides(args))
+            print(f"run {run}: {len(queries)} queries in {(time.perf_counter() - t0) * 1000:.1f} ms")
+    finally:
+        pool.close()
+
+    stats = cache.stats()
+    print(f"\n{stats['hits']} hits / {stats['misses']} misses ({stats['hit_rate']:.0%}), "
+          f"{stats['invalidations']} invalidated, {stats['expirations']} expired, {stats['evictions']} evicted; "
+          f"{stats['seconds_saved'] * 1000:.1f} ms of query time saved")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,120 @@
 # python script to generate 15 SQL queries that can be run as an input file to verify the low-level design and interactions
+#
+# The queries form a catalog of named, parameterized queries: %(name)s placeholders take typed
+# parameters (see PARAM_TYPES) with per-query defaults. database.py runs them as server-side
+# prepared statements; write_queries() renders the defaults as literals for the text file.
+# Date ranges are half-open, start <= timestamp < end, in every query.
+
+import datetime
+from collections import namedtuple
 
 OUTPUT_FILE = "available_queries.txt"
 
+def parse_timestamp(value):
+    if isinstance(value, datetime.datetime):
+        return value
+    if isinstance(value, datetime.date):
+        return datetime.datetime.combine(value, datetime.time())
+    return datetime.datetime.fromisoformat(value)
+
+# parameter name -> (PostgreSQL type used in PREPARE, Python converter)
+PARAM_TYPES = {
+    "start": ("timestamp", parse_timestamp),
+    "end": ("timestamp", parse_timestamp),
+    "limit": ("int", int),
+    "item_name": ("text", str),
+}
+
+# the date range [start, end) the reports cover unless a caller asks for another one
+DEFAULT_START = datetime.datetime(2024, 10, 1, 0, 0, 0)
+DEFAULT_END = datetime.datetime(2025, 10, 2, 0, 0, 0)
+
+# name: report title, sql: text with %(param)s placeholders, defaults: {param: default value},
+# bucket: "day" / "hour" for queries that read a rollup, whose start and end must then be
+# bucket boundaries (a rollup row can't be split; see check_rollup_range)
+Query = namedtuple("Query", ["name", "sql", "defaults", "bucket"], defaults=[{}, None])
+
+BUCKET_FIELDS = {
+    "hour": {"minute": 0, "second": 0, "microsecond": 0},
+    "day": {"hour": 0, "minute": 0, "second": 0, "microsecond": 0},
+}
+
+
+def query_params(query, overrides=None):
+    """The query's parameters: its defaults updated with the overrides it takes, converted to their types.
+
+    Overrides for parameters the query doesn't have are ignored, so one set of
+    dashboard filters (e.g. a date range) can be applied to every query.
+    """
+    params = dict(query.defaults)
+    for name, value in (overrides or {}).items():
+        if name in params and value is not None:
+            params[name] = value
+    return {name: PARAM_TYPES[name][1](value) for name, value in params.items()}
+
+
+def sql_literal(value):
+    if isinstance(value, datetime.datetime):
+        return f"'{value:%Y-%m-%d %H:%M:%S}'::timestamp"
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    return str(value)
+
+
+def render_sql(query, overrides=None):
+    """The query as plain SQL with its parameters inlined as literals."""
+    params = query_params(query, overrides)
+    return query.sql % {name: sql_literal(value) for name, value in params.items()}
+
+
+def add_query_args(parser):
+    """Flags for the required_queries.py parameters; unset flags keep each query's default."""
+    parser.add_argument("--start", help="start of the date range (inclusive), e.g. 2025-01-01")
+    parser.add_argument("--end", help="end of the date range (exclusive), e.g. 2025-04-01")
+    parser.add_argument("--limit", type=int, help="row limit for the top-N reports")
+    parser.add_argument("--item-name", help="menu item for the menu item inventory report")
+
+
+def query_overrides(args):
+    return {"start": args.start, "end": args.end, "limit": args.limit, "item_name": args.item_name}
+
+
+def check_rollup_range(parser, args):
+    """parser.error() unless --start / --end fall on the bucket boundaries of every rollup query.
+
+    Only for tools that run the SQL: the offline reports count single orders
+    and take any range.
+    """
+    overrides = query_overrides(args)
+    for _, queries in QUERY_GROUPS:
+        for query in queries:
+            if not query.bucket:
+                continue
+            try:
+                params = query_params(query, overrides)
+            except ValueError as e:
+                parser.error(str(e))
+            for name in ("start", "end"):
+                if params[name] != params[name].replace(**BUCKET_FIELDS[query.bucket]):
+                    parser.error(f"--{name} {params[name]} is not on a {query.bucket} boundary, which "
+                                 f"\"{query.name}\" needs: it reads the {query.bucket} rollup")
+
+
 # verification queries
 # used to verify that database seeding contains the required amount of data
 ver_queries = [
     # number of weeks 
-    ("Number of weeks in the dataset",
+    Query("Number of weeks in the dataset",
      "SELECT COUNT(DISTINCT TO_CHAR(timestamp, 'IYYY-IW')) AS total_weeks "
-     "FROM orders;"
-    ),
+     "FROM orders;"),
 
     # amount of total sales
-    ("Total sales amount",
+    Query("Total sales amount",
      "SELECT SUM(total_price) AS total_sales "
-     "FROM orders;"
-    ),
+     "FROM orders;"),
 
     # number of peak days
-    ("Number of peak days",
+    Query("Number of peak days",
      "WITH daily_sales AS ( "
      "SELECT DATE(timestamp) AS order_date, "
      "SUM(total_price) AS total_sales FROM orders GROUP BY DATE(timestamp)), "
@@ -30,174 +126,185 @@ ver_queries = [
      ") "
      "SELECT COUNT(*) AS num_peak_days "
      "FROM daily_sales, stats "
-     "WHERE daily_sales.total_sales > stats.avg_sales + 2 * stats.stddev_sales;"
-    ),
+     "WHERE daily_sales.total_sales > stats.avg_sales + 2 * stats.stddev_sales;"),
 
     # number of menu items
-    ("Number of menu items",
+    Query("Number of menu items",
      "SELECT COUNT(*) AS total_menu_items "
-     "FROM menu_items;"
-    )
+     "FROM menu_items;")
 ]
 
 # 15 required queries with descriptions
 req_queries = [
-    ("Top 10 customers by orders in a given time period",
+    Query("Top 10 customers by orders in a given time period",
      "SELECT customer_id, COUNT(*) AS order_count "
      "FROM orders "
-     "WHERE timestamp BETWEEN '2024-10-01 00:00:00'::timestamp AND '2025-10-01 23:59:59'::timestamp "
+     "WHERE timestamp >= %(start)s AND timestamp < %(end)s "
      "GROUP BY customer_id "
      "ORDER BY order_count DESC "
-     "LIMIT 10;"),
+     "LIMIT %(limit)s;", {"start": DEFAULT_START, "end": DEFAULT_END, "limit": 10}),
 
-    ("Top 10 customers by total spending in a given time period",
+    Query("Top 10 customers by total spending in a given time period",
      "SELECT customer_id, SUM(total_price) AS total_spent "
      "FROM orders "
-     "WHERE timestamp BETWEEN '2024-10-01 00:00:00'::timestamp AND '2025-10-01 23:59:59'::timestamp "
+     "WHERE timestamp >= %(start)s AND timestamp < %(end)s "
      "GROUP BY customer_id "
      "ORDER BY total_spent DESC "
-     "LIMIT 10;"),
+     "LIMIT %(limit)s;", {"start": DEFAULT_START, "end": DEFAULT_END, "limit": 10}),
 
-     ("Top 5 employees handling the most orders", 
+     Query("Top 5 employees handling the most orders",
      "SELECT employee_id, COUNT(*) AS handled_orders "
      "FROM orders "
      "GROUP BY employee_id "
      "ORDER BY handled_orders DESC "
-     "LIMIT 5;"),
+     "LIMIT %(limit)s;", {"limit": 5}),
 
-    ("Top 5 employees generating the most revenue", 
+    Query("Top 5 employees generating the most revenue",
      "SELECT employee_id, SUM(total_price) AS sales_generated "
      "FROM orders "
      "GROUP BY employee_id "
      "ORDER BY sales_generated DESC "
-     "LIMIT 5;"),
+     "LIMIT %(limit)s;", {"limit": 5}),
 
-    ("Top 10 most popular menu items (by times ordered)", 
+    Query("Top 10 most popular menu items (by times ordered)",
      "SELECT menu_item_id, COUNT(*) AS times_ordered "
      "FROM joint_order_items "
      "GROUP BY menu_item_id "
      "ORDER BY times_ordered DESC "
-     "LIMIT 10;"),
+     "LIMIT %(limit)s;", {"limit": 10}),
 
-    ("Top 10 least popular menu items (by times ordered)",
+    Query("Top 10 least popular menu items (by times ordered)",
      "SELECT menu_item_id, COUNT(*) AS times_ordered "
      "FROM joint_order_items "
      "GROUP BY menu_item_id "
      "ORDER BY times_ordered ASC "
-     "LIMIT 10;"),
+     "LIMIT %(limit)s;", {"limit": 10}),
 
-    ("Top 5 inventory items running lowest", 
-     "SELECT name, quantity FROM inventory ORDER BY quantity ASC LIMIT 5;"),
+    Query("Top 5 inventory items running lowest",
+     "SELECT name, quantity FROM inventory ORDER BY quantity ASC LIMIT %(limit)s;", {"limit": 5}),
 
-    ("Top 5 inventory items most in stock",
-     "SELECT name, quantity FROM inventory ORDER BY quantity DESC LIMIT 5;"),
+    Query("Top 5 inventory items most in stock",
+     "SELECT name, quantity FROM inventory ORDER BY quantity DESC LIMIT %(limit)s;", {"limit": 5}),
 
-    ("Average order value", 
+    Query("Average order value",
      "SELECT AVG(total_price) AS avg_order_value FROM orders;"),
 
-    ("Top 5 busiest days by order count",
-     "SELECT DATE(timestamp) AS order_date, COUNT(*) AS daily_orders "
-     "FROM orders "
-     "GROUP BY order_date "
+    Query("Top 5 busiest days by order count",
+     "SELECT day AS order_date, SUM(order_count) AS daily_orders "
+     "FROM sales_daily "
+     "GROUP BY day HAVING SUM(order_count) > 0 "
      "ORDER BY daily_orders DESC "
-     "LIMIT 5;"),
+     "LIMIT %(limit)s;", {"limit": 5}),
 
-    ("Top 5 days with the lowest sales totals",
-     "SELECT DATE(timestamp) AS order_date, SUM(total_price) AS daily_sales "
-     "FROM orders "
-     "GROUP BY order_date "
+    Query("Top 5 days with the lowest sales totals",
+     "SELECT day AS order_date, SUM(revenue) AS daily_sales "
+     "FROM sales_daily "
+     "GROUP BY day HAVING SUM(order_count) > 0 "
      "ORDER BY daily_sales ASC "
-     "LIMIT 5;"),
+     "LIMIT %(limit)s;", {"limit": 5}),
 
-    ("Top 5 menu items that use the most inventory items",
+    Query("Top 5 menu items that use the most inventory items",
      "SELECT menu_item_id, COUNT(inventory_item_id) AS inventory_count "
      "FROM joint_recipe_ingredients "
      "GROUP BY menu_item_id "
      "ORDER BY inventory_count DESC "
-     "LIMIT 5;"),
+     "LIMIT %(limit)s;", {"limit": 5}),
 
-    ("Top 5 months with the highest sales",
-     "SELECT MONTH(timestamp) AS order_month, SUM(total_price) AS monthly_sales "
-     "FROM orders "
+    Query("Top 5 months with the highest sales",
+     "SELECT EXTRACT(MONTH FROM day) AS order_month, SUM(revenue) AS monthly_sales "
+     "FROM sales_daily "
      "GROUP BY order_month "
      "ORDER BY monthly_sales DESC "
-     "LIMIT 5;"),
+     "LIMIT %(limit)s;", {"limit": 5}),
 
-     ("Top 10 highest revenue-generating menu items",
-     "SELECT mi.name, SUM(o.total_price) AS total_revenue "
-     "FROM joint_order_items joi "
+     Query("Top 10 highest revenue-generating menu items",
+     "SELECT mi.name, SUM(joi.revenue) AS total_revenue "
+     "FROM (SELECT menu_item_id, SUM(quantity * unit_price) AS revenue "
+     "      FROM joint_order_items GROUP BY menu_item_id) joi "
      "JOIN menu_items mi ON joi.menu_item_id = mi.id "
-     "JOIN orders o ON joi.order_id = o.id "
      "GROUP BY mi.name "
      "ORDER BY total_revenue DESC "
-     "LIMIT 10;"),
+     "LIMIT %(limit)s;", {"limit": 10}),
 
-     ("Top 10 most frequently used inventory items in recipes",
+     Query("Top 10 most frequently used inventory items in recipes",
       "SELECT i.name, SUM(jri.quantity_used) AS total_used "
       "FROM joint_recipe_ingredients jri "
       "JOIN inventory i ON jri.inventory_item_id = i.id "
       "GROUP BY i.name "
       "ORDER BY total_used DESC "
-      "LIMIT 10;"),
+      "LIMIT %(limit)s;", {"limit": 10}),
 ]
 
 # 4 special queries
+# the day/hour based reports read the sales_daily / sales_hourly rollups (sales_rollups.sql),
+# whose buckets are split over shard rows: always aggregate per day / hour
 special_queries = [
     # pseudocode: select count of orders grouped by week
     # about: given a specific week, how many orders were placed?
     # example: "week 1 has 98765 orders"
-    ("Special Query #1: Weekly Sales History",
-     "SELECT EXTRACT(WEEK FROM timestamp) AS week_number, COUNT(*) AS orders_count "
-     "FROM orders "
-     "WHERE timestamp BETWEEN '2024-10-01 00:00:00'::timestamp AND '2025-10-01 23:59:59'::timestamp "
+    Query("Special Query #1: Weekly Sales History",
+     "SELECT EXTRACT(WEEK FROM day) AS week_number, SUM(order_count) AS orders_count "
+     "FROM sales_daily "
+     "WHERE day >= %(start)s::date AND day < %(end)s::date "
      "GROUP BY week_number "
-     "ORDER BY week_number;"),
+     "ORDER BY week_number;", {"start": DEFAULT_START, "end": DEFAULT_END}, "day"),
 
     # pseudocode: select count of orders, sum of order total grouped by hour
     # about: given a specific hour of the day, how many orders were placed and what was the total sum of the orders?
     # example: e.g., "12pm has 12345 orders totaling $86753"
-    ("Special Query #2: Realistic Sales History",
-     "SELECT EXTRACT(HOUR FROM timestamp) AS order_hour, COUNT(*) AS orders_count, SUM(total_price) AS total_sales "
-     "FROM orders "
-     "WHERE timestamp BETWEEN '2024-10-01 00:00:00'::timestamp AND '2025-10-01 23:59:59'::timestamp "
+    Query("Special Query #2: Realistic Sales History",
+     "SELECT EXTRACT(HOUR FROM hour) AS order_hour, SUM(order_count) AS orders_count, SUM(revenue) AS total_sales "
+     "FROM sales_hourly "
+     "WHERE hour >= %(start)s AND hour < %(end)s "
      "GROUP BY order_hour "
-     "ORDER BY order_hour;"),
+     "ORDER BY order_hour;", {"start": DEFAULT_START, "end": DEFAULT_END}, "hour"),
 
     # pseudocode: select top 10 sums of order total grouped by day in descending order by order total
     # about: given a specific day, what was the sum of the top 10 order totals?
     # example: "30 August has $12345 of top sales"
-    ("Special Query #3: Peak Sales Day",
-     "SELECT DATE(timestamp) AS order_date, SUM(total_price) AS daily_total "
-     "FROM orders "
-     "WHERE timestamp BETWEEN '2024-10-01 00:00:00'::timestamp AND '2025-10-01 23:59:59'::timestamp "
-     "GROUP BY order_date "
+    Query("Special Query #3: Peak Sales Day",
+     "SELECT day AS order_date, SUM(revenue) AS daily_total "
+     "FROM sales_daily "
+     "WHERE day >= %(start)s::date AND day < %(end)s::date "
+     "GROUP BY day HAVING SUM(order_count) > 0 "
      "ORDER BY daily_total DESC "
-     "LIMIT 10;"),
+     "LIMIT %(limit)s;", {"start": DEFAULT_START, "end": DEFAULT_END, "limit": 10}, "day"),
 
     # pseudocode: select count of inventory items from inventory and menu grouped by menu item
     # about: given a specific menu item, how many items from the inventory does that menu item use?
     # example: "classic milk tea uses 12 items"
-    ("Special Query #4: Menu Item Inventory",
+    Query("Special Query #4: Menu Item Inventory",
      "SELECT mi.name AS menu_item, COUNT(jri.inventory_item_id) AS num_ingredients "
      "FROM menu_items mi "
      "JOIN joint_recipe_ingredients jri ON mi.id = jri.menu_item_id "
-     "WHERE mi.name = 'Classic Pearl Milk Tea' "
-     "GROUP BY mi.name;")
+     "WHERE mi.name = %(item_name)s "
+     "GROUP BY mi.name;", {"item_name": "Classic Pearl Milk Tea"})
+]
+
+# query groups in report order
+QUERY_GROUPS = [
+    ("verification", ver_queries),
+    ("required", req_queries),
+    ("special", special_queries),
 ]
 
 # Write the documentation text file
-with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-    f.write("-- VERIFICATION QUERIES (USED TO VERIFY THAT DATABASE SEEDING CONTAINS THE REQUIRED AMOUNT OF DATA)\n\n")
-    for description, sql in ver_queries:
-        f.write(f"\"{description}\"\n")
-        f.write(sql + "\n\n")
-    f.write("-- 15 REQUIRED QUERIES\n\n")
-    for description, sql in req_queries:
-        f.write(f"\"{description}\"\n")
-        f.write(sql + "\n\n")
-    f.write("\n-- 4 SPECIAL QUERIES\n\n")
-    for description, sql in special_queries:
-        f.write(f"\"{description}\"\n")
-        f.write(sql + "\n\n")
-
-print(f"Done! {len(ver_queries)} verification queries, {len(req_queries)} required queries, and {len(special_queries)} special queries written and documented in '{OUTPUT_FILE}'")
+def write_queries():
+    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
+        f.write("-- VERIFICATION QUERIES (USED TO VERIFY THAT DATABASE SEEDING CONTAINS THE REQUIRED AMOUNT OF DATA)\n\n")
+        for query in ver_queries:
+            f.write(f"\"{query.name}\"\n")
+            f.write(render_sql(query) + "\n\n")
+        f.write("-- 15 REQUIRED QUERIES\n\n")
+        for query in req_queries:
+            f.write(f"\"{query.name}\"\n")
+            f.write(render_sql(query) + "\n\n")
+        f.write("\n-- 4 SPECIAL QUERIES\n\n")
+        for query in special_queries:
+            f.write(f"\"{query.name}\"\n")
+            f.write(render_sql(query) + "\n\n")
+
+    print(f"Done! {len(ver_queries)} verification queries, {len(req_queries)} required queries, and {len(special_queries)} special queries written and documented in '{OUTPUT_FILE}'")
+
+if __name__ == "__main__":
+    write_queries()
@@ -0,0 +1,144 @@
+-- Hourly and daily sales rollups for the report queries in required_queries.py.
+-- Statement-level triggers on orders apply each INSERT/UPDATE/DELETE (COPY
+-- included) as one grouped delta, so reports cost time per hour/day bucket
+-- instead of per order. Like data_versions.sql, each bucket is split over 16
+-- shard rows and a write updates the shard of its backend (pg_backend_pid() % 16),
+-- so concurrent sales in the same hour don't all queue on one row lock until
+-- commit; readers sum the shards of a bucket. Safe to re-run on an existing database:
+--   python setup_database.py run sales_rollups.sql
+
+CREATE TABLE IF NOT EXISTS sales_hourly (
+hour timestamp NOT NULL,
+shard INT NOT NULL DEFAULT 0,
+order_count INT NOT NULL,
+revenue NUMERIC(14,2) NOT NULL,
+PRIMARY KEY (hour, shard)
+);
+
+CREATE TABLE IF NOT EXISTS sales_daily (
+day date NOT NULL,
+shard INT NOT NULL DEFAULT 0,
+order_count INT NOT NULL,
+revenue NUMERIC(14,2) NOT NULL,
+PRIMARY KEY (day, shard)
+);
+
+-- databases from before the rollups were sharded: the old rows become shard 0
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM information_schema.columns
+                   WHERE table_name = 'sales_hourly' AND column_name = 'shard') THEN
+        ALTER TABLE sales_hourly ADD COLUMN shard INT NOT NULL DEFAULT 0;
+        ALTER TABLE sales_hourly DROP CONSTRAINT sales_hourly_pkey;
+        ALTER TABLE sales_hourly ADD PRIMARY KEY (hour, shard);
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM information_schema.columns
+                   WHERE table_name = 'sales_daily' AND column_name = 'shard') THEN
+        ALTER TABLE sales_daily ADD COLUMN shard INT NOT NULL DEFAULT 0;
+        ALTER TABLE sales_daily DROP CONSTRAINT sales_daily_pkey;
+        ALTER TABLE sales_daily ADD PRIMARY KEY (day, shard);
+    END IF;
+END;
+$$;
+
+-- rebuild both rollups from the full orders history (backfill / repair)
+CREATE OR REPLACE FUNCTION rebuild_sales_rollups()
+RETURNS void AS $$
+BEGIN
+    TRUNCATE sales_hourly, sales_daily;
+    INSERT INTO sales_hourly (hour, order_count, revenue)
+    SELECT date_trunc('hour', timestamp), COUNT(*), SUM(total_price)
+    FROM orders GROUP BY 1;
+    INSERT INTO sales_daily (day, order_count, revenue)
+    SELECT hour::date, SUM(order_count), SUM(revenue)
+    FROM sales_hourly GROUP BY 1;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION sales_rollup_trigger()
+RETURNS trigger AS $$
+DECLARE
+    changed text;
+    backend_shard INT := pg_backend_pid() % 16;
+    emptied_hours timestamp[];
+    emptied_days date[];
+BEGIN
+    -- new_orders / old_orders are the statement's transition tables
+    changed := CASE TG_OP
+        WHEN 'INSERT' THEN 'SELECT timestamp, total_price, 1 AS sign FROM new_orders'
+        WHEN 'DELETE' THEN 'SELECT timestamp, total_price, -1 AS sign FROM old_orders'
+        ELSE 'SELECT timestamp, total_price, 1 AS sign FROM new_orders '
+             'UNION ALL SELECT timestamp, total_price, -1 FROM old_orders'
+    END;
+
+    EXECUTE format($sql$
+        WITH changed AS (%s),
+        delta AS (
+            SELECT date_trunc('hour', timestamp) AS hour, SUM(sign)::INT AS order_count,
+                   SUM(sign * total_price) AS revenue
+            FROM changed GROUP BY 1
+        ),
+        hourly AS (
+            INSERT INTO sales_hourly (hour, shard, order_count, revenue)
+            SELECT hour, $1, order_count, revenue FROM delta
+            ON CONFLICT (hour, shard) DO UPDATE
+            SET order_count = sales_hourly.order_count + EXCLUDED.order_count,
+                revenue = sales_hourly.revenue + EXCLUDED.revenue
+            RETURNING hour, order_count = 0 AND revenue = 0 AS emptied
+        ),
+        daily AS (
+            INSERT INTO sales_daily (day, shard, order_count, revenue)
+            SELECT hour::date, $1, SUM(order_count), SUM(revenue) FROM delta GROUP BY 1
+            ON CONFLICT (day, shard) DO UPDATE
+            SET order_count = sales_daily.order_count + EXCLUDED.order_count,
+                revenue = sales_daily.revenue + EXCLUDED.revenue
+            RETURNING day, order_count = 0 AND revenue = 0 AS emptied
+        )
+        SELECT (SELECT array_agg(hour) FROM hourly WHERE emptied),
+               (SELECT array_agg(day) FROM daily WHERE emptied)
+    $sql$, changed) INTO emptied_hours, emptied_days USING backend_shard;
+
+    -- drop the shard rows the upsert just brought to zero (any operation can, once a bucket's
+    -- shards have been written by different sessions); they are still locked by this transaction.
+    -- A row with revenue left (a price update) still counts.
+    IF emptied_hours IS NOT NULL THEN
+        DELETE FROM sales_hourly
+        WHERE hour = ANY(emptied_hours) AND shard = backend_shard AND order_count = 0 AND revenue = 0;
+    END IF;
+    IF emptied_days IS NOT NULL THEN
+        DELETE FROM sales_daily
+        WHERE day = ANY(emptied_days) AND shard = backend_shard AND order_count = 0 AND revenue = 0;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION sales_rollup_truncate()
+RETURNS trigger AS $$
+BEGIN
+    TRUNCATE sales_hourly, sales_daily;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS sales_rollup_insert ON orders;
+CREATE TRIGGER sales_rollup_insert AFTER INSERT ON orders
+REFERENCING NEW TABLE AS new_orders
+FOR EACH STATEMENT EXECUTE FUNCTION sales_rollup_trigger();
+
+DROP TRIGGER IF EXISTS sales_rollup_update ON orders;
+CREATE TRIGGER sales_rollup_update AFTER UPDATE ON orders
+REFERENCING OLD TABLE AS old_orders NEW TABLE AS new_orders
+FOR EACH STATEMENT EXECUTE FUNCTION sales_rollup_trigger();
+
+DROP TRIGGER IF EXISTS sales_rollup_delete ON orders;
+CREATE TRIGGER sales_rollup_delete AFTER DELETE ON orders
+REFERENCING OLD TABLE AS old_orders
+FOR EACH STATEMENT EXECUTE FUNCTION sales_rollup_trigger();
+
+DROP TRIGGER IF EXISTS sales_rollup_truncate ON orders;
+CREATE TRIGGER sales_rollup_truncate AFTER TRUNCATE ON orders
+FOR EACH STATEMENT EXECUTE FUNCTION sales_rollup_truncate();
+
+-- backfill whatever is already in orders
+SELECT rebuild_sales_rollups();
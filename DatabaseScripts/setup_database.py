@@ -1,34 +1,336 @@
 # Setup
-import psycopg2
+import argparse
+import csv
+import io
+import json
+import os
+import time
 
-with open("DatabaseScripts/passwd.txt", "r") as f:
-    password = f.read().strip()
+import columnar
+import csvPopulator
+import snapshots
+from data_files import LOAD_ORDER, find_data_file, open_data_file
+from database import add_connection_args, connect, split_sql
+from pipeline_metrics import NullMetrics, add_metrics_args, finish_metrics, metrics_from_args
+from validate_data import validate
 
-conn = psycopg2.connect(
-    host="gang_80.rds.amazonaws.com",
-    port=5432,
-    dbname="gang_80_db",
-    user="gang_80",
-    password=password
-)
-cur = conn.cursor()
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# schema files run by "create", in order
+SCHEMA_FILES = ["create_tables.sql", "orders_partitions.sql", "sales_rollups.sql", "data_versions.sql",
+                "dataset_snapshots.sql", "loyalty_ledger.sql"]
 
 # ======================
-# Test connection
-cur.execute("SELECT name FROM menu_items;")
-print(cur.fetchone())
+# Create tables
+def run_sql_file(conn, filename="create_tables.sql"):
+    cur = conn.cursor()
+
+    # Read SQL file
+    with open(os.path.join(SCRIPT_DIR, filename), "r") as f:
+        sql = f.read()
+
+    # Execute SQL commands one statement at a time so a failure names the statement
+    for number, statement in enumerate(split_sql(sql), 1):
+        try:
+            cur.execute(statement)
+        except Exception:
+            print(f"{filename}: statement {number} failed:\n{statement[:500]}")
+            raise
+    conn.commit()
+    cur.close()
 
 # ======================
-# Read SQL file
-with open("create_tables.sql", "r") as f:
-    sql = f.read()
+# Bulk load (COPY)
+def drop_constraints(cur, tables):
+    """Drop foreign keys and secondary indexes on tables, returning what is needed to recreate them."""
+    cur.execute(
+        "SELECT conrelid::regclass::text, conname, pg_get_constraintdef(oid) "
+        "FROM pg_constraint WHERE contype = 'f' AND conrelid::regclass::text = ANY(%s);",
+        (tables,))
+    foreign_keys = cur.fetchall()
+    # indexes that don't back a primary key / unique constraint
+    cur.execute(
+        "SELECT i.indexrelid::regclass::text, pg_get_indexdef(i.indexrelid) "
+        "FROM pg_index i "
+        "LEFT JOIN pg_constraint c ON c.conindid = i.indexrelid "
+        "WHERE i.indrelid::regclass::text = ANY(%s) AND c.oid IS NULL;",
+        (tables,))
+    indexes = cur.fetchall()
+
+    for table, name, _ in foreign_keys:
+        cur.execute(f'ALTER TABLE {table} DROP CONSTRAINT "{name}";')
+    for name, _ in indexes:
+        cur.execute(f"DROP INDEX {name};")
+    return foreign_keys, indexes
+
+def restore_constraints(cur, foreign_keys, indexes):
+    for _, definition in indexes:
+        # indexes on partitioned tables come back as "ON ONLY", which would skip the partitions
+        cur.execute(definition.replace(" ON ONLY ", " ON ", 1) + ";")
+    for table, name, definition in foreign_keys:
+        cur.execute(f'ALTER TABLE {table} ADD CONSTRAINT "{name}" {definition};')
+
+def copy_csv(cur, table, columns, path):
+    """Stream one CSV file into table with COPY ... FROM STDIN, returning the row count.
+
+    COPY always writes the id values from the file into GENERATED ALWAYS
+    identity columns (like INSERT ... OVERRIDING SYSTEM VALUE).
+    """
+    with open_data_file(path) as f:
+        cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, HEADER true)", f)
+    return cur.rowcount
+
+def orders_time_range(path, columns):
+    """(first, last) timestamp text in an orders CSV file, or None if it has no rows."""
+    column = columns.index("timestamp")
+    first = last = None
+    with open_data_file(path) as f:
+        reader = csv.reader(f)
+        next(reader)
+        for row in reader:
+            # "YYYY-MM-DD HH:MM:SS" sorts as text
+            timestamp = row[column]
+            if first is None or timestamp < first:
+                first = timestamp
+            if last is None or timestamp > last:
+                last = timestamp
+    return None if first is None else (first, last)
 
+def reset_identity(cur, table):
+    """Move the identity sequence past the loaded ids so new rows don't collide."""
+    cur.execute(
+        f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE(MAX(id), 0) + 1, false) FROM {table};")
 
-# Execute SQL commands
-cur.execute(sql)  # For multiple statements, use execute if single; otherwise, see below
+def load_tables(conn, data_dir, truncate=False, drop_keys=False, metrics=NullMetrics(), snapshot=None):
+    """COPY every csvPopulator.py output into its table in foreign-key order, in one transaction.
+
+    Each table is a "load:<table>" metrics stage (COPY, identity reset and
+    partition upkeep), followed by "constraints" and "vacuum". snapshot
+    (id, config) is recorded in dataset_snapshots in the same transaction.
+    """
+    tables = [table for (table, _, _) in LOAD_ORDER]
+    cur = conn.cursor()
+
+    if truncate:
+        # order_ids (orders_partitions.sql) goes with orders and the lines that reference it
+        cur.execute(f"TRUNCATE {', '.join(tables)}, order_ids;")
+    if drop_keys:
+        foreign_keys, indexes = drop_constraints(cur, tables)
+
+    for table, filename, columns in LOAD_ORDER:
+        path = find_data_file(data_dir, filename)
+        with metrics.stage(f"load:{table}") as stage:
+            if table == "orders":
+                # partitions for the file's months first, so COPY doesn't route them through orders_default
+                time_range = orders_time_range(path, columns)
+                created = 0
+                if time_range:
+                    cur.execute("SELECT create_orders_partitions(%s::timestamp, %s::timestamp);", time_range)
+                    created = cur.fetchone()[0]
+            t0 = time.perf_counter()
+            rows = stage["rows"] = copy_csv(cur, table, columns, path)
+            elapsed = time.perf_counter() - t0
+            if "id" in columns:
+                reset_identity(cur, table)
+            if table == "orders":
+                # partitions for the coming months (and moves anything that still landed in orders_default)
+                cur.execute("SELECT maintain_orders_partitions();")
+                created += cur.fetchone()[0]
+                if created:
+                    print(f"created {created} orders partitions")
+        print(f"{table:<26} {rows:>12,} rows {elapsed:>8.2f}s {rows / max(elapsed, 1e-9):>14,.0f} rows/sec")
+
+    if drop_keys:
+        t0 = time.perf_counter()
+        with metrics.stage("constraints"):
+            restore_constraints(cur, foreign_keys, indexes)
+        print(f"recreated {len(foreign_keys)} foreign keys and {len(indexes)} indexes in {time.perf_counter() - t0:.2f}s")
+
+    if snapshot is not None:
+        record_snapshot(cur, *snapshot)
+    conn.commit()
+    # VACUUM ANALYZE after commit: fresh statistics for the planner and a visibility
+    # map so the covering report indexes can be used for index-only scans
+    conn.autocommit = True
+    with metrics.stage("vacuum"):
+        for table in tables:
+            cur.execute(f"VACUUM ANALYZE {table};")
+    conn.autocommit = False
+    cur.close()
 
 # ======================
-# Cleanup
-conn.commit()
-cur.close()
-conn.close()
\ No newline at end of file
+# Dataset snapshots
+def table_exists(cur, table):
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL;", (table,))
+    return cur.fetchone()[0]
+
+def data_version_total(cur):
+    """Sum of the data_versions counters (None without data_versions.sql): changes on any write."""
+    if not table_exists(cur, "data_versions"):
+        return None
+    cur.execute("SELECT COALESCE(SUM(version), 0)::bigint FROM data_versions;")
+    return cur.fetchone()[0]
+
+def snapshot_loaded(conn, snapshot_id):
+    """True if the last load was snapshot_id and nothing has written to the tables since."""
+    cur = conn.cursor()
+    try:
+        if not table_exists(cur, "dataset_snapshots"):
+            return False
+        cur.execute("SELECT snapshot_id, data_version FROM dataset_snapshots ORDER BY id DESC LIMIT 1;")
+        last = cur.fetchone()
+        return last is not None and last == (snapshot_id, data_version_total(cur))
+    finally:
+        cur.close()
+        conn.rollback()
+
+def record_snapshot(cur, snapshot_id, config):
+    if not table_exists(cur, "dataset_snapshots"):
+        print("dataset_snapshots is missing (python setup_database.py run dataset_snapshots.sql); "
+              "the next load of this snapshot won't be skipped")
+        return
+    cur.execute("INSERT INTO dataset_snapshots (snapshot_id, data_version, config) VALUES (%s, %s, %s);",
+                (snapshot_id, data_version_total(cur), json.dumps(config) if config is not None else None))
+
+# ======================
+# Incremental extension
+def copy_rows(cur, table, columns, rows):
+    """COPY in-memory rows into table, returning the row count."""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    return cur.rowcount
+
+def extend_tables(conn, days, num_orders=None, chunk_size=csvPopulator.CHUNK_SIZE, seed=None,
+                  metrics=NullMetrics()):
+    """Generate `days` more days of orders after the latest one in the database and COPY them in.
+
+    Ids continue from MAX(orders.id); the count and first day come from the
+    sales_daily rollup, so nothing scans orders. The rollup triggers see the
+    new rows like any other COPY.
+    """
+    columns = {table: cols for (table, _, cols) in LOAD_ORDER}
+    cur = conn.cursor()
+    cur.execute("SELECT (SELECT SUM(order_count) FROM sales_daily), MAX(id), "
+                "(SELECT MIN(day) FROM sales_daily)::timestamp, MAX(timestamp) FROM orders;")
+    existing = csvPopulator.ExistingOrders(*cur.fetchone())
+    if not existing.count:
+        raise ValueError("orders is empty; load a full dataset before extending it")
+    cur.execute("SELECT name, id FROM menu_items;")
+    menu_item_id_map = dict(cur.fetchall())
+
+    start_date, end_date, num_orders = csvPopulator.extension_window(existing, days, num_orders)
+    print(f"extending {existing.count:,} orders (ids up to {existing.max_id:,}, last at {existing.last_time}) "
+          f"with {num_orders:,} orders from {start_date} to {end_date}")
+    cur.execute("SELECT create_orders_partitions(%s, %s);", (start_date, end_date))
+
+    t0 = time.perf_counter()
+    orders = items = 0
+    with metrics.stage("orders") as stage:
+        for chunk in csvPopulator.generate_extension_chunks(existing, start_date, end_date, menu_item_id_map,
+                                                            num_orders, chunk_size, seed):
+            order_rows, item_rows = csvPopulator.order_chunk_rows(chunk)
+            orders += copy_rows(cur, "orders", columns["orders"], order_rows)
+            items += copy_rows(cur, "joint_order_items", columns["joint_order_items"], item_rows)
+        reset_identity(cur, "orders")
+        conn.commit()
+        stage["rows"] = orders + items
+    cur.close()
+    print(f"appended {orders:,} orders / {items:,} order items in {time.perf_counter() - t0:.2f}s")
+
+# ======================
+# Order totals
+def reconcile_totals(conn, batch_size=100_000, metrics=NullMetrics()):
+    """Set orders.total_price to the sum of each order's lines (reconcile_order_totals in
+    create_tables.sql), one id range of batch_size orders per transaction."""
+    cur = conn.cursor()
+    cur.execute("SELECT COALESCE(MAX(id), 0) FROM orders;")
+    max_id = cur.fetchone()[0]
+    t0 = time.perf_counter()
+    changed = 0
+    with metrics.stage("reconcile") as stage:
+        for from_id in range(0, max_id, batch_size):
+            cur.execute("SELECT reconcile_order_totals(%s, %s);", (from_id, from_id + batch_size))
+            changed += cur.fetchone()[0]
+            conn.commit()
+        stage["rows"] = max_id
+    cur.close()
+    print(f"checked order ids up to {max_id:,} in batches of {batch_size:,}: {changed:,} totals corrected "
+          f"in {time.perf_counter() - t0:.2f}s")
+
+# ======================
+# Main
+def main():
+    parser = argparse.ArgumentParser(description="Create the database tables or bulk load generated data.")
+    add_connection_args(parser)
+    add_metrics_args(parser)
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser("create", help="run create_tables.sql and the other SCHEMA_FILES (default)")
+    run_parser = subparsers.add_parser("run", help="run other SQL files from this directory in order, e.g. a migration")
+    run_parser.add_argument("files", nargs="+")
+    load_parser = subparsers.add_parser("load", help="COPY the csvPopulator.py CSV files into the tables")
+    load_parser.add_argument("--data-dir", default=".", help="directory holding the CSV (or .csv.gz/.csv.zst) files")
+    load_parser.add_argument("--truncate", action="store_true", help="empty the tables before loading")
+    load_parser.add_argument("--drop-keys", action="store_true",
+                             help="drop foreign keys and secondary indexes during the load and recreate them after")
+    load_parser.add_argument("--validate", action="store_true",
+                             help="run validate_data.py on the files first and don't load if a check fails")
+    load_parser.add_argument("--force", action="store_true",
+                             help="load even if the database already holds this snapshot, unchanged")
+    extend_parser = subparsers.add_parser("extend", help="append the next --days days of generated orders")
+    extend_parser.add_argument("--days", type=int, default=7)
+    extend_parser.add_argument("--orders", type=int, help="orders to add (default: the existing orders per day)")
+    extend_parser.add_argument("--seed", type=int, help="fixed seed for the generated orders")
+    reconcile_parser = subparsers.add_parser("reconcile",
+                                             help="recompute orders.total_price from the order lines, in id batches")
+    reconcile_parser.add_argument("--batch-size", type=int, default=100_000, help="order ids per transaction")
+    args = parser.parse_args()
+    if args.command == "load" and columnar.is_columnar(args.data_dir):
+        parser.error(f"{args.data_dir} is a columnar.py directory, which load can't COPY; convert it first: "
+                     f"python columnar.py to-csv --columnar-dir {args.data_dir} --out <csv dir>")
+    metrics = metrics_from_args("setup_database", args)
+
+    conn = connect(args)
+
+    # Test connection
+    cur = conn.cursor()
+    cur.execute("SELECT version();")
+    print(cur.fetchone())
+    cur.close()
+
+    if args.command == "load":
+        with metrics.stage("snapshot"):
+            snapshot = snapshots.dataset_snapshot(args.data_dir)
+            loaded = not args.force and snapshot_loaded(conn, snapshot[0])
+        if loaded:
+            print(f"snapshot {snapshot[0]} is already loaded and unchanged, nothing to do (--force reloads)")
+        else:
+            if args.validate:
+                with metrics.stage("validate"):
+                    failures = validate(args.data_dir)
+                if failures:
+                    conn.close()
+                    raise SystemExit("validation failed, nothing loaded")
+            load_tables(conn, args.data_dir, args.truncate, args.drop_keys, metrics, snapshot)
+            print(f"loaded snapshot {snapshot[0]}")
+    elif args.command == "extend":
+        extend_tables(conn, args.days, args.orders, seed=args.seed, metrics=metrics)
+    elif args.command == "reconcile":
+        reconcile_totals(conn, args.batch_size, metrics)
+    elif args.command == "run":
+        for filename in args.files:
+            with metrics.stage(f"run:{filename}"):
+                run_sql_file(conn, filename)
+    else:
+        for filename in SCHEMA_FILES:
+            with metrics.stage(f"create:{filename}"):
+                run_sql_file(conn, filename)
+
+    # ======================
+    # Cleanup
+    conn.close()
+    finish_metrics(metrics, args)
+
+if __name__ == "__main__":
+    main()
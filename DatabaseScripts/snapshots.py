@@ -0,0 +1,91 @@
+# content-addressed dataset snapshots: a generator config (sizes, catalogs, seed, anchor date, output
+# format) hashes to a snapshot id, csvPopulator.py --snapshot-dir caches the generated files under
+# <snapshot dir>/<id>/, and setup_database.py load records the id it loaded (dataset_snapshots.sql)
+# so an unchanged dataset is neither regenerated nor reloaded.
+
+import datetime
+import hashlib
+import json
+import os
+import shutil
+from contextlib import contextmanager
+
+from data_files import LOAD_ORDER, find_data_file
+
+SNAPSHOT_FILE = "snapshot.json"
+
+
+def snapshot_id(config):
+    """First 16 hex digits of the SHA-256 of the canonical JSON of config."""
+    canonical = json.dumps(config, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+def read_snapshot(path):
+    """The snapshot.json of a finished snapshot directory, or None."""
+    try:
+        with open(os.path.join(path, SNAPSHOT_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def changed_files(path, snapshot):
+    """Names of the files in snapshot directory path that no longer match its snapshot.json:
+    added, removed or resized since the snapshot was built."""
+    recorded = snapshot["files"]
+    present = set(os.listdir(path)) - {SNAPSHOT_FILE}
+    return sorted(name for name in present | set(recorded)
+                  if name not in present or name not in recorded
+                  or os.path.getsize(os.path.join(path, name)) != recorded[name])
+
+
+@contextmanager
+def build_snapshot(path, snapshot, config):
+    """Run the generator inside a scratch directory next to path; on success write snapshot.json
+    and rename the directory into place, so path only ever holds a complete snapshot."""
+    scratch = f"{path}.tmp{os.getpid()}"
+    shutil.rmtree(scratch, ignore_errors=True)
+    os.makedirs(scratch)
+    cwd = os.getcwd()
+    os.chdir(scratch)
+    try:
+        yield scratch
+    except BaseException:
+        os.chdir(cwd)
+        shutil.rmtree(scratch, ignore_errors=True)
+        raise
+    os.chdir(cwd)
+    files = {name: os.path.getsize(os.path.join(scratch, name)) for name in sorted(os.listdir(scratch))}
+    with open(os.path.join(scratch, SNAPSHOT_FILE), "w", encoding="utf-8") as f:
+        json.dump({"id": snapshot, "created": datetime.datetime.now().isoformat(timespec="seconds"),
+                   "config": config, "files": files}, f, indent=2, default=str)
+    if os.path.exists(path):  # someone else finished the same snapshot first
+        shutil.rmtree(scratch)
+    else:
+        os.replace(scratch, path)
+
+
+def dataset_snapshot(data_dir):
+    """(snapshot id, config) of the CSV files in data_dir.
+
+    A csvPopulator.py snapshot directory answers from its snapshot.json
+    while its files are still the ones recorded there; anything else,
+    including a snapshot directory something has written into since, is
+    identified by a SHA-256 over the files themselves (config None).
+    """
+    snapshot = read_snapshot(data_dir)
+    if snapshot is not None:
+        changed = changed_files(data_dir, snapshot)
+        if not changed:
+            return snapshot["id"], snapshot["config"]
+        print(f"{data_dir} no longer matches snapshot {snapshot['id']} ({', '.join(changed)} changed), "
+              f"hashing its files instead")
+    digest = hashlib.sha256()
+    for _, filename, _ in LOAD_ORDER:
+        path = find_data_file(data_dir, filename)
+        digest.update(os.path.basename(path).encode("utf-8") + b"\0")
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()[:16], None
@@ -0,0 +1,312 @@
+# pre-load validator for the csvPopulator.py output: column types / lengths against
+# create_tables.sql, primary key uniqueness, foreign key membership, order lines and order totals,
+# each checked with a few vectorized NumPy passes. Stops at the first failed check (unless --all) and names the rows.
+#
+#   python validate_data.py --data-dir .
+#   python validate_data.py --data-dir . --all --max-rows 20
+
+import argparse
+import os
+import re
+import sys
+import time
+
+import numpy as np
+
+from data_files import LOAD_ORDER, find_data_file, open_data_file
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# (child table, column, parent table, column); the database checks the orders one through
+# order_ids (orders_partitions.sql), whose ids come from orders
+FOREIGN_KEYS = [
+    ("orders", "customer_id", "customers", "id"),
+    ("orders", "employee_id", "employees", "id"),
+    ("joint_order_items", "order_id", "orders", "id"),
+    ("joint_order_items", "menu_item_id", "menu_items", "id"),
+    ("joint_recipe_ingredients", "menu_item_id", "menu_items", "id"),
+    ("joint_recipe_ingredients", "inventory_item_id", "inventory", "id"),
+]
+
+PRIMARY_KEYS = [("employees", "id"), ("customers", "id"), ("menu_items", "id"), ("inventory", "id"), ("orders", "id")]
+
+INT32_MAX = 2 ** 31 - 1
+BOOL_VALUES = ["True", "False", "true", "false", "t", "f", "1", "0"]
+TRUE_VALUES = ["True", "true", "t", "1"]
+
+
+class ValidationError(Exception):
+    pass
+
+# ----------------------------
+# Schema
+# ----------------------------
+def parse_schema(path=os.path.join(SCRIPT_DIR, "create_tables.sql")):
+    """{table: {column: (type, size, not null)}} from the CREATE TABLE statements.
+
+    type is int, varchar, numeric, bool or timestamp; size is the VARCHAR
+    length or the NUMERIC (precision, scale).
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        sql = re.sub(r"--[^\n]*", "", f.read())
+    schema = {}
+    for table, body in re.findall(r"CREATE TABLE (\w+) \((.*?)\n\)", sql, re.S):
+        columns = {}
+        for line in body.splitlines():
+            match = re.match(r"(\w+) (INT|VARCHAR\((\d+)\)|NUMERIC\((\d+),(\d+)\)|bool(?:ean)?|timestamp)(.*)",
+                             line.strip(), re.I)
+            if not match or match.group(1).upper() in ("CONSTRAINT", "PRIMARY"):
+                continue
+            name, sql_type, length, precision, scale, rest = match.groups()
+            kind = sql_type.split("(")[0].lower().replace("boolean", "bool")
+            size = int(length) if length else (int(precision), int(scale)) if precision else None
+            not_null = any(word in rest.upper() for word in ("NOT NULL", "PRIMARY KEY", "IDENTITY"))
+            columns[name] = (kind, size, not_null)
+        schema[table] = columns
+    return schema
+
+# ----------------------------
+# Loading
+# ----------------------------
+def row_report(filename, rows, detail, message, max_rows):
+    """ValidationError naming the first max_rows of the offending row indexes (as file line numbers)."""
+    lines = [f"{filename}: {message} in {len(rows):,} rows"]
+    lines += [f"    line {row + 2}: {detail(row)}" for row in rows[:max_rows].tolist()]
+    return ValidationError("\n".join(lines))
+
+
+def load_text(path, usecols):
+    with open_data_file(path) as f:
+        return np.loadtxt(f, delimiter=",", skiprows=1, usecols=usecols, dtype=str, quotechar='"', ndmin=2)
+
+
+def load_numbers(path, usecols, filename, columns, nullable, max_rows):
+    """All numeric columns in one float64 pass, NaN for the empty (NULL) fields of nullable columns.
+
+    Files with empty fields or values that don't parse are re-read as text,
+    which either converts them or names the bad rows.
+    """
+    try:
+        with open_data_file(path) as f:
+            return np.loadtxt(f, delimiter=",", skiprows=1, usecols=usecols, dtype=np.float64, quotechar='"',
+                              ndmin=2)
+    except ValueError:
+        text = load_text(path, usecols)
+        for i, column in enumerate(columns):
+            values, inverse = np.unique(text[:, i], return_inverse=True)
+            bad_values = np.array([not is_number(v) and not (v == "" and column in nullable)
+                                   for v in values.tolist()])
+            bad = np.flatnonzero(bad_values[inverse])
+            if len(bad):
+                raise row_report(filename, bad, lambda row: f"{column} = {str(text[row, i])!r}",
+                                 f"{column} is not a number", max_rows)
+        return np.where(text == "", "nan", text).astype(np.float64)
+
+
+def is_number(value):
+    try:
+        float(value)
+        return True
+    except ValueError:
+        return False
+
+
+def load_table(data_dir, table, filename, csv_columns, schema, max_rows):
+    """{column: numpy array} for one CSV file, checking every value against its column type.
+
+    Nullable numeric columns with empty fields come back as masked arrays,
+    masked where the value is NULL.
+    """
+    path = find_data_file(data_dir, filename)
+    types = schema[table]
+    numeric = [c for c in csv_columns if types[c][0] in ("int", "numeric")]
+    stamps = [c for c in csv_columns if types[c][0] == "timestamp"]
+    text = [c for c in csv_columns if types[c][0] in ("varchar", "bool")]
+    data = {}
+
+    if numeric:
+        nullable = {c for c in numeric if not types[c][2]}
+        values = load_numbers(path, [csv_columns.index(c) for c in numeric], filename, numeric, nullable, max_rows)
+        for i, column in enumerate(numeric):
+            data[column] = check_number(filename, column, values[:, i], types[column], max_rows)
+    if stamps:
+        try:
+            with open_data_file(path) as f:
+                loaded = np.loadtxt(f, delimiter=",", skiprows=1, usecols=[csv_columns.index(c) for c in stamps],
+                                    dtype="datetime64[s]", quotechar='"', ndmin=2)
+        except ValueError as e:
+            raise ValidationError(f"{filename}: bad timestamp ({e})")
+        for i, column in enumerate(stamps):
+            data[column] = loaded[:, i]
+    if text:
+        loaded = load_text(path, [csv_columns.index(c) for c in text])
+        for i, column in enumerate(text):
+            data[column] = check_text(filename, column, loaded[:, i], types[column], max_rows)
+    return data
+
+
+def check_number(filename, column, values, column_type, max_rows):
+    kind, size, not_null = column_type
+    null = np.isnan(values)
+    raw, values = values, np.where(null, 0, values)
+    if kind == "int":
+        bad = (values != np.floor(values)) | (np.abs(values) > INT32_MAX)
+        problem = "is not a 32-bit integer"
+    else:
+        precision, scale = size
+        scaled = values * 10 ** scale
+        bad = (np.abs(scaled - np.rint(scaled)) > 1e-6) | (np.abs(values) >= 10 ** (precision - scale))
+        problem = f"does not fit NUMERIC({precision},{scale})"
+    if not_null:
+        bad |= null
+        problem += " or empty"
+    rows = np.flatnonzero(bad)
+    if len(rows):
+        raise row_report(filename, rows, lambda row: f"{column} = {'empty' if null[row] else raw[row]}", f"{column} {problem}",
+                         max_rows)
+    if kind == "int":
+        values = values.astype(np.int64)
+    else:
+        values = np.rint(values * 10 ** size[1]).astype(np.int64)  # NUMERIC kept as integer hundredths
+    return np.ma.masked_array(values, mask=null) if null.any() else values
+
+
+def check_text(filename, column, values, column_type, max_rows):
+    kind, size, not_null = column_type
+    if kind == "bool":
+        bad = ~np.isin(values, BOOL_VALUES)
+        problem = "is not a boolean"
+    else:
+        bad = np.char.str_len(values) > size
+        problem = f"is longer than VARCHAR({size})"
+    if not_null:
+        bad |= values == ""
+    rows = np.flatnonzero(bad)
+    if len(rows):
+        raise row_report(filename, rows, lambda row: f"{column} = {str(values[row])!r}",
+                         f"{column} {problem}{' or empty' if not_null else ''}", max_rows)
+    return values
+
+# ----------------------------
+# Cross-table checks
+# ----------------------------
+def check_unique(tables, table, column, max_rows):
+    values = tables[table][column]
+    uniques, counts = np.unique(values, return_counts=True)
+    duplicates = uniques[counts > 1]
+    if len(duplicates):
+        rows = np.flatnonzero(np.isin(values, duplicates))
+        raise row_report(f"{table}.csv", rows, lambda row: f"{column} = {values[row]}",
+                         f"duplicate {column}", max_rows)
+
+
+def check_foreign_key(tables, child, column, parent, parent_column, max_rows):
+    values = tables[child][column]
+    # NULLs reference nothing, as with a FOREIGN KEY
+    rows = np.flatnonzero(~np.isin(np.ma.getdata(values), tables[parent][parent_column]) & ~np.ma.getmaskarray(values))
+    if len(rows):
+        raise row_report(f"{child}.csv", rows, lambda row: f"{column} = {values[row]}",
+                         f"{column} not in {parent}.{parent_column}", max_rows)
+
+
+def check_order_lines(tables, max_rows):
+    """Line numbers are unique within an order, quantities positive, and parent_line is 0 for drinks
+    and 0 or the line number of a drink of the same order for add-ons."""
+    items, menu = tables["joint_order_items"], tables["menu_items"]
+    order_ids, lines, parents = items["order_id"], items["line_number"], items["parent_line"]
+    base = int(max(lines.max(initial=0), parents.max(initial=0))) + 1
+    keys = order_ids * base + lines
+    uniques, counts = np.unique(keys, return_counts=True)
+    duplicates = np.isin(keys, uniques[counts > 1])
+    # lines of unknown menu items are the foreign key check's business; they count as drinks here
+    is_modification = np.zeros(max(int(menu["id"].max()), int(items["menu_item_id"].max(initial=0))) + 1, dtype=bool)
+    is_modification[menu["id"]] = np.isin(menu["is_modification"], TRUE_VALUES)
+    line_is_modification = is_modification[items["menu_item_id"]]
+    bad_parent = np.where(line_is_modification,
+                          (parents != 0) & ~np.isin(order_ids * base + parents, keys[~line_is_modification]),
+                          parents != 0)
+    rows = np.flatnonzero(duplicates | bad_parent | (items["quantity"] < 1) | (items["unit_price"] < 0))
+    if len(rows):
+        raise row_report("joint_order_items.csv", rows,
+                         lambda row: f"order {order_ids[row]} line {lines[row]}: menu item {items['menu_item_id'][row]}, "
+                                     f"quantity {items['quantity'][row]}, unit price {items['unit_price'][row] / 100:.2f}, "
+                                     f"parent line {parents[row]}",
+                         "duplicate line, bad parent line, quantity or price", max_rows)
+
+
+def check_order_totals(tables, max_rows):
+    """order_total_price has to be the sum of quantity * unit_price over the order's lines (in cents)."""
+    orders, items = tables["orders"], tables["joint_order_items"]
+    if not len(orders["id"]):
+        # no orders to total; any items left over fail the foreign key check
+        return
+    by_id_order = np.argsort(orders["id"])
+    sorted_ids = orders["id"][by_id_order]
+    # items of unknown orders are the foreign key check's business; leave them out here
+    position = np.minimum(np.searchsorted(sorted_ids, items["order_id"]), len(sorted_ids) - 1)
+    known = sorted_ids[position] == items["order_id"]
+    item_cents = np.bincount(position[known], weights=items["quantity"][known] * items["unit_price"][known],
+                             minlength=len(sorted_ids)).astype(np.int64)
+    expected = np.empty_like(item_cents)
+    expected[by_id_order] = item_cents
+    rows = np.flatnonzero(expected != orders["total_price"])
+    if len(rows):
+        raise row_report("orders.csv", rows,
+                         lambda row: f"id {orders['id'][row]}: total {orders['total_price'][row] / 100:.2f}, "
+                                     f"items add up to {expected[row] / 100:.2f}",
+                         "order_total_price differs from its items", max_rows)
+
+
+def validate(data_dir, max_rows=10, keep_going=False):
+    """Run every check; returns the list of failures (stops at the first one unless keep_going)."""
+    schema = parse_schema()
+    failures = []
+
+    def run(name, needs, check, *args):
+        if failures and not keep_going:
+            return
+        if any(table not in tables for table in needs):
+            print(f"skipped {name} (needs {', '.join(needs)})")
+            return
+        t0 = time.perf_counter()
+        try:
+            check(*args)
+            print(f"ok      {name} ({time.perf_counter() - t0:.2f}s)")
+        except ValidationError as e:
+            print(f"FAILED  {name}\n{e}")
+            failures.append(name)
+
+    tables = {}
+
+    def load(table, filename, columns):
+        tables[table] = load_table(data_dir, table, filename, columns, schema, max_rows)
+
+    for table, filename, columns in LOAD_ORDER:
+        run(f"{filename} column types", [], load, table, filename, columns)
+    for table, column in PRIMARY_KEYS:
+        run(f"{table}.{column} unique", [table], check_unique, tables, table, column, max_rows)
+    for child, column, parent, parent_column in FOREIGN_KEYS:
+        run(f"{child}.{column} -> {parent}.{parent_column}", [child, parent], check_foreign_key,
+            tables, child, column, parent, parent_column, max_rows)
+    run("joint_order_items lines", ["joint_order_items", "menu_items"], check_order_lines, tables, max_rows)
+    run("orders.order_total_price = sum of line prices", ["orders", "joint_order_items"],
+        check_order_totals, tables, max_rows)
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate the csvPopulator.py CSV files before loading them.")
+    parser.add_argument("--data-dir", default=".", help="directory holding the CSV (or .csv.gz/.csv.zst) files")
+    parser.add_argument("--max-rows", type=int, default=10, help="offending rows to list per failed check")
+    parser.add_argument("--all", action="store_true", help="run every check instead of stopping at the first failure")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    failures = validate(args.data_dir, args.max_rows, args.all)
+    print(f"\n{'valid' if not failures else f'{len(failures)} checks failed'} in {time.perf_counter() - t0:.2f}s")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()